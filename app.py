@@ -7,8 +7,17 @@
 
 import streamlit as st
 import pandas as pd
+import collections
+import hashlib
+import importlib.util
+import threading
+import time
+import os
 from io import BytesIO
-from pack_form_labeler import PackFormLabeler
+from pack_form_cache import InputCache
+from pack_form_labeler import PackFormLabeler, export_bytes, merge_reports, write_labeled_workbook
+from pack_form_stats import LabelStats
+from pack_form_rules import DEFAULT_RULES_FILE
 import base64
 
 # 页面配置
@@ -66,8 +75,199 @@ def get_custom_css():
     </style>
     """
 
+# 每个进程只创建一次标签器，规则在各次会话和重新运行之间复用；
+# 规则包文件被修改后按新的修改时间创建新的标签器，正在运行的任务继续使用旧规则
+@st.cache_resource(max_entries=2)
+def get_labeler(rules_mtime):
+    return PackFormLabeler()
+
+def current_labeler():
+    """返回与当前规则包文件对应的标签器"""
+    return get_labeler(os.path.getmtime(DEFAULT_RULES_FILE))
+
+def get_upload_digest(uploaded_file):
+    """计算上传文件的内容哈希，同一次上传只计算一次"""
+    upload_id = getattr(uploaded_file, 'file_id', None) or f"{uploaded_file.name}:{uploaded_file.size}"
+    digests = st.session_state.setdefault('upload_digests', {})
+    if upload_id not in digests:
+        digests[upload_id] = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+    return digests[upload_id]
+
+# 解析后工作表的磁盘缓存目录，设置环境变量 PACK_FORM_INPUT_CACHE 后启用，
+# 同一文件在应用重启后再次上传时不再解析；默认只使用下面的内存缓存，上传的文件不落盘
+INPUT_CACHE_DIR = os.environ.get('PACK_FORM_INPUT_CACHE')
+
+@st.cache_resource
+def get_input_cache():
+    return InputCache(INPUT_CACHE_DIR)
+
+# 以下缓存以内容哈希为键，参数名以下划线开头的不参与缓存键的计算
+@st.cache_data(show_spinner=False, max_entries=8)
+def read_upload(digest, _data):
+    """解析上传的Excel文件的所有工作表，返回 {工作表名称: DataFrame}"""
+    if INPUT_CACHE_DIR:
+        return get_input_cache().read_excel(_data, sheet_name=None, digest=digest)
+    return pd.read_excel(BytesIO(_data), sheet_name=None)
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def count_empty_pack_forms(digest, _sheets):
+    """打标前各工作表Pack form列的空值数量 {工作表名称: 数量}"""
+    return {name: int(df['Pack form'].isna().sum()) for name, df in _sheets.items() if 'Pack form' in df.columns}
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def export_result(digest, ruleset, selection, output_format, _df_processed):
+    """生成打标结果的下载文件内容，每个结果和格式只生成一次"""
+    return export_bytes(_df_processed, output_format, sheet_name='Labeled Data')
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def export_workbook(digest, ruleset, selection, _results, _reports, _skipped):
+    """生成多工作表打标结果的工作簿：汇总表加各打标工作表，汇总使用打标时累计的报告"""
+    labeled_sheets = [(name, _results[name][0]) for name in selection]
+    sheet_reports = [(name, _reports[name]) for name in selection]
+    output = BytesIO()
+    write_labeled_workbook(output, labeled_sheets, sheet_reports, _skipped)
+    return output.getvalue()
+
+# 下载格式：显示名称 -> (格式, 文件扩展名, MIME类型)
+DOWNLOAD_FORMATS = {
+    'Excel (.xlsx)': ('xlsx', 'xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'CSV (.csv)': ('csv', 'csv', 'text/csv'),
+    'CSV 压缩 (.csv.gz)': ('csv.gz', 'csv.gz', 'application/gzip'),
+    'Parquet (.parquet)': ('parquet', 'parquet', 'application/octet-stream'),
+}
+
+def available_download_formats():
+    """Parquet需要安装pyarrow或fastparquet，未安装时不提供该选项"""
+    has_parquet = any(importlib.util.find_spec(name) for name in ('pyarrow', 'fastparquet'))
+    return [name for name, (output_format, _, _) in DOWNLOAD_FORMATS.items()
+            if output_format != 'parquet' or has_parquet]
+
+# 后台打标时每个分块的行数，每完成一块更新一次进度
+CHUNK_SIZE = 20000
+
+class LabelingJob:
+    """
+    后台分块打标任务
+    
+    在线程中按工作表、按分块调用PackFormLabeler，页面每次重新运行时读取进度；
+    任务对象保存在session_state中，页面刷新和控件交互不会中断任务。
+    结果为 {工作表名称: (处理后的DataFrame, 成功填充行数, 标准化行数)}，
+    reports为打标时逐块累计的 {工作表名称: 标准化报告}，显示统计时无需再扫描结果。
+    """
+    
+    def __init__(self, labeler, sheets, key, on_done=None):
+        """
+        Args:
+            labeler (PackFormLabeler): 标签器
+            sheets (dict): {工作表名称: DataFrame}
+            key (tuple): (文件内容哈希, 规则集指纹, 所选工作表)
+            on_done (callable): 可选，任务成功完成后在后台线程中以任务对象调用
+        """
+        self.key = key
+        self._on_done = on_done
+        self.total_rows = sum(len(df) for df in sheets.values())
+        self.done_rows = 0
+        self.current_sheet = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self.result = None
+        self.reports = None
+        self.error = None
+        self._cancel_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(labeler, sheets), daemon=True)
+        self._thread.start()
+    
+    def _run(self, labeler, sheets):
+        try:
+            sheet_results = {}
+            sheet_reports = {}
+            finished_rows = 0
+            for sheet_name, df_input in sheets.items():
+                self.current_sheet = sheet_name
+                results = []
+                stats = LabelStats()
+                for done_rows, result in labeler.iter_process_chunks(df_input, mode='dedup', chunk_size=CHUNK_SIZE,
+                                                                     stats=stats):
+                    if self._cancel_event.is_set():
+                        return
+                    results.append(result)
+                    self.done_rows = finished_rows + done_rows
+                sheet_results[sheet_name] = labeler.merge_chunk_results(df_input, results)
+                sheet_reports[sheet_name] = stats.report()
+                finished_rows += len(df_input)
+            self.reports = sheet_reports
+            self.result = sheet_results
+            if self._on_done is not None:
+                self._on_done(self)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished_at = time.time()
+    
+    def cancel(self):
+        """请求取消，当前分块处理完后停止"""
+        self._cancel_event.set()
+    
+    @property
+    def status(self):
+        if self.finished_at is None:
+            return 'running'
+        if self.error is not None:
+            return 'failed'
+        if self.result is None:
+            return 'cancelled'
+        return 'done'
+    
+    def rows_per_sec(self):
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return self.done_rows / elapsed if elapsed > 0 else 0.0
+    
+    def eta_seconds(self):
+        """按当前速度估算的剩余秒数，尚无进度时返回None"""
+        rate = self.rows_per_sec()
+        if rate <= 0:
+            return None
+        return (self.total_rows - self.done_rows) / rate
+
+class FinishedJobs:
+    """
+    已完成打标任务的LRU缓存，以 (文件内容哈希, 规则集指纹, 所选工作表) 为键
+
+    由st.cache_resource在进程内各会话间共享：同一文件和规则集再次打标时（包括页面刷新、
+    新会话或切换工作表后再切回）直接复用已完成任务的结果。后台线程写入，因此加锁。
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._jobs = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """返回键对应的已完成任务，没有时返回None"""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                self._jobs.move_to_end(key)
+            return job
+
+    def add(self, job):
+        """记录一个已完成的任务，超出上限时淘汰最久未使用的任务"""
+        with self._lock:
+            self._jobs[job.key] = job
+            self._jobs.move_to_end(job.key)
+            while len(self._jobs) > self.max_entries:
+                self._jobs.popitem(last=False)
+
+# 结果中保留了各工作表打标后的完整DataFrame，只保留最近的几个
+@st.cache_resource
+def get_finished_jobs():
+    return FinishedJobs(max_entries=8)
+
 # 主应用
 def main():
+    # 后台任务运行中时，页面末尾定时重新运行以刷新进度
+    poll_job = False
+    
     # 应用自定义CSS样式
     st.markdown(get_custom_css(), unsafe_allow_html=True)
     
@@ -124,34 +324,65 @@ def main():
     
     if uploaded_file is not None:
         try:
-            # 读取文件
-            df_input = pd.read_excel(uploaded_file)
+            # 读取文件（按内容哈希缓存，页面重新运行时不再重复解析）
+            digest = get_upload_digest(uploaded_file)
+            sheets = read_upload(digest, uploaded_file.getvalue())
+            
+            # 检查必要的列：包含必要列的工作表才能打标
+            required_columns = ['Pack form', 'Product']
+            skipped = {
+                name: [col for col in required_columns if col not in df.columns]
+                for name, df in sheets.items()
+            }
+            label_sheets = [name for name, missing_columns in skipped.items() if not missing_columns]
+            skipped = {name: missing_columns for name, missing_columns in skipped.items() if missing_columns}
             
             # 显示文件信息
             st.markdown('<div class="content-box">', unsafe_allow_html=True)
             st.subheader("文件信息")
             
+            if len(sheets) > 1:
+                st.info(f"工作簿共 {len(sheets)} 个工作表，其中 {len(label_sheets)} 个包含必要的列")
+            if len(label_sheets) > 1:
+                selection = st.multiselect("要处理的工作表", label_sheets, default=label_sheets)
+            else:
+                selection = label_sheets
+            selected_inputs = {name: sheets[name] for name in selection}
+            
             col1, col2, col3 = st.columns(3)
             with col1:
-                st.metric("总行数", len(df_input))
+                st.metric("总行数", sum(len(df) for df in selected_inputs.values()))
             with col2:
-                st.metric("总列数", len(df_input.columns))
+                if len(selection) > 1:
+                    st.metric("工作表数", len(selection))
+                else:
+                    first_sheet = sheets[selection[0]] if selection else next(iter(sheets.values()))
+                    st.metric("总列数", len(first_sheet.columns))
             with col3:
-                empty_count = df_input['Pack form'].isna().sum() if 'Pack form' in df_input.columns else 0
+                # 已打标的工作表直接使用打标时累计的原始空值数，否则每个上传文件只统计一次
+                job = st.session_state.get('label_job')
+                if job is not None and job.key[0] == digest and job.reports is not None \
+                        and all(name in job.reports for name in selection):
+                    empty_count = sum(job.reports[name]['originally_empty'] for name in selection)
+                else:
+                    empty_counts = count_empty_pack_forms(digest, sheets)
+                    empty_count = sum(empty_counts[name] for name in selection)
                 st.metric("Pack form空值", empty_count)
             
-            # 检查必要的列
-            required_columns = ['Pack form', 'Product']
-            missing_columns = [col for col in required_columns if col not in df_input.columns]
-            
-            if missing_columns:
+            if not label_sheets:
+                missing_columns = next(iter(skipped.values()))
                 st.error(f"文件缺少必要的列: {missing_columns}")
+            elif not selection:
+                st.warning("请至少选择一个工作表")
             else:
                 st.success("文件格式正确，包含所有必要的列")
                 
                 # 显示数据预览
                 st.subheader("数据预览 (前5行)")
-                st.dataframe(df_input.head(), use_container_width=True)
+                preview_sheet = selection[0]
+                if len(selection) > 1:
+                    preview_sheet = st.selectbox("预览工作表", selection, key='input_preview_sheet')
+                st.dataframe(selected_inputs[preview_sheet].head(), use_container_width=True)
                 
                 st.markdown("</div>", unsafe_allow_html=True)
                 
@@ -159,23 +390,56 @@ def main():
                 st.markdown('<div class="content-box">', unsafe_allow_html=True)
                 st.subheader("开始处理")
                 
-                if st.button("开始剂型打标", type="primary", use_container_width=True):
-                    with st.spinner("正在进行剂型智能打标，请稍候..."):
+                labeler = current_labeler()
+                ruleset = labeler.ruleset_fingerprint()
+                job_key = (digest, ruleset, tuple(selection))
+                job = st.session_state.get('label_job')
+                if job is not None and job.key != job_key:
+                    # 已上传了其他文件或更换了工作表，停止旧任务
+                    job.cancel()
+                    job = None
+                running = job is not None and job.status == 'running'
+                
+                if st.button("开始剂型打标", type="primary", use_container_width=True, disabled=running):
+                    # 同一文件、规则集和工作表已打标过时直接复用结果，否则启动后台任务
+                    finished_jobs = get_finished_jobs()
+                    job = finished_jobs.get(job_key)
+                    if job is None:
+                        job = LabelingJob(labeler, selected_inputs, job_key, on_done=finished_jobs.add)
+                    st.session_state['label_job'] = job
+                    running = job.status == 'running'
+                
+                # 任务保存在会话中，下载等操作引起的重新运行也继续显示进度和结果
+                if job is not None:
+                    if running:
+                        eta = job.eta_seconds()
+                        sheet_text = f"工作表 {job.current_sheet}，" if len(selection) > 1 and job.current_sheet else ""
+                        st.progress(
+                            job.done_rows / job.total_rows if job.total_rows else 0.0,
+                            text=(f"正在进行剂型智能打标: {sheet_text}{job.done_rows}/{job.total_rows} 行，"
+                                  f"{job.rows_per_sec():,.0f} 行/秒，"
+                                  f"预计剩余 {f'{eta:.0f} 秒' if eta is not None else '计算中'}")
+                        )
+                        if st.button("取消打标", use_container_width=True):
+                            job.cancel()
+                        poll_job = True
+                    elif job.status == 'cancelled':
+                        st.warning(f"打标已取消（已处理 {job.done_rows}/{job.total_rows} 行）")
+                    elif job.status == 'failed':
+                        st.error(f"处理过程中发生错误: {str(job.error)}")
+                    else:
                         try:
-                            # 创建标签器实例
-                            labeler = PackFormLabeler()
-                            
-                            # 处理数据
-                            df_processed, processed_count, standardization_count = labeler.process_dataframe(df_input)
+                            results = job.result
                             
                             # 显示处理结果
-                            st.success("剂型打标完成！")
+                            st.success(f"剂型打标完成！用时 {job.finished_at - job.started_at:.1f} 秒")
                             
-                            # 统计结果
-                            original_empty_count = (df_input['Pack form'].isna() | (df_input['Pack form'] == '')).sum()
-                            final_empty_count = (df_processed['Pack form'].isna() | (df_processed['Pack form'] == '')).sum()
-                            successfully_filled_count = original_empty_count - final_empty_count
-                            # standardization_count 已经从 process_dataframe 返回
+                            # 统计结果（多个工作表时为合计），由打标时累计的报告合并得到
+                            report = merge_reports([(name, job.reports[name]) for name in selection], max_examples=5)
+                            original_empty_count = report['originally_empty']
+                            final_empty_count = report['final_empty']
+                            successfully_filled_count = report['successfully_filled']
+                            standardization_count = report['standardization_applied']
                             
                             # 显示统计信息
                             col1, col2, col3, col4, col5 = st.columns(5)
@@ -200,37 +464,51 @@ def main():
                                 st.info(f"对 {standardization_count} 行已有剂型进行了标准化处理")
                                 
                                 # 显示标准化前后的对比
-                                standardization_examples = df_processed[df_processed['Standardization_Applied'] == True].head(5)
-                                if len(standardization_examples) > 0:
-                                    st.markdown("**标准化示例：**")
-                                    for idx, row in standardization_examples.iterrows():
-                                        st.markdown(f"• 行 {idx+1}: 标准化处理")
+                                st.markdown("**标准化示例：**")
+                                for example in report['standardization_examples']:
+                                    location = f"{example['file']} 行 {example['row']}" if len(results) > 1 else f"行 {example['row']}"
+                                    st.markdown(f"• {location}: 标准化为 {example['pack_form']}")
                             
                             # 显示剂型分布
                             st.subheader("剂型分布")
-                            pack_form_counts = df_processed['Pack form'].value_counts()
+                            pack_form_counts = pd.Series(
+                                report['pack_form_distribution'], dtype='int64'
+                            ).sort_values(ascending=False)
                             st.bar_chart(pack_form_counts)
                             
                             # 显示处理后的数据预览
                             st.subheader("处理结果预览 (前5行)")
-                            st.dataframe(df_processed.head(), use_container_width=True)
+                            result_sheet = selection[0]
+                            if len(selection) > 1:
+                                result_sheet = st.selectbox("预览工作表", selection, key='result_preview_sheet')
+                            st.dataframe(results[result_sheet][0].head(), use_container_width=True)
                             
                             # 下载结果
                             st.subheader("下载结果")
-                            output = BytesIO()
-                            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                                df_processed.to_excel(writer, index=False, sheet_name='Labeled Data')
-                            output.seek(0)
+                            if len(selection) > 1:
+                                # 多个工作表只能写入一个Excel工作簿，首个工作表为汇总表
+                                with st.spinner("正在生成下载文件..."):
+                                    output = export_workbook(digest, ruleset, tuple(selection), results, job.reports, skipped)
+                                output_format, extension, mime = DOWNLOAD_FORMATS['Excel (.xlsx)']
+                            else:
+                                format_name = st.radio("文件格式", available_download_formats(), horizontal=True)
+                                output_format, extension, mime = DOWNLOAD_FORMATS[format_name]
+                                with st.spinner("正在生成下载文件..."):
+                                    output = export_result(digest, ruleset, tuple(selection), output_format,
+                                                           results[selection[0]][0])
                             
                             st.download_button(
-                                label="下载打标后的Excel文件",
+                                label="下载打标后的文件",
                                 data=output,
-                                file_name="labeled_pack_forms.xlsx",
-                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                                file_name=f"labeled_pack_forms.{extension}",
+                                mime=mime,
                                 use_container_width=True
                             )
                             
-                            st.info("下载的文件包含：原始数据、填充和标准化后的Pack form列，以及新增的匹配信息列")
+                            if len(selection) > 1:
+                                st.info("下载的工作簿包含：汇总表（各工作表的填充和标准化统计），以及每个工作表的打标结果")
+                            else:
+                                st.info("下载的文件包含：原始数据、填充和标准化后的Pack form列，以及新增的匹配信息列")
                             
                         except Exception as e:
                             st.error(f"处理过程中发生错误: {str(e)}")
@@ -245,6 +523,10 @@ def main():
     st.markdown("**开发维护：海翼 IDC团队**")
     st.markdown("© 2025 剂型打标工具. All rights reserved.")
     st.markdown("</div>", unsafe_allow_html=True)
+    
+    if poll_job:
+        time.sleep(0.5)
+        st.rerun()
 
 if __name__ == "__main__":
     main()
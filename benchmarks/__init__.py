@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+"""剂型打标性能测试"""
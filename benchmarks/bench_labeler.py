@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+剂型打标性能测试
+分别测试detect_pack_form、standardize_pack_form、process_dataframe以及Excel读写的耗时，
+输出每秒处理行数、单行延迟p50/p99和峰值内存，并保存为JSON以便对比不同版本
+
+用法（在仓库根目录执行）:
+    python -m benchmarks.bench_labeler --rows 10000 100000 --output bench.json
+    python -m benchmarks.bench_labeler --rows 100000 --compare bench.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import generate_dataframe
+from pack_form_labeler import PackFormLabeler
+
+
+def time_per_row(func, values):
+    """
+    逐行调用并记录每次调用的耗时
+
+    Returns:
+        tuple: (总耗时秒数, 每行耗时纳秒列表)
+    """
+    latencies = []
+    clock = time.perf_counter_ns
+    start = time.perf_counter()
+    for value in values:
+        t0 = clock()
+        func(value)
+        latencies.append(clock() - t0)
+    return time.perf_counter() - start, latencies
+
+
+def peak_memory_mb(func):
+    """在tracemalloc下再运行一次，返回峰值内存（MB）"""
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 1024 / 1024, 2)
+
+
+def make_result(stage, variant, rows, seconds, latencies=None, peak_mb=None):
+    """整理单项测试结果"""
+    result = {
+        'stage': stage,
+        'variant': variant,
+        'rows': rows,
+        'seconds': round(seconds, 4),
+        'rows_per_sec': round(rows / seconds, 1) if seconds > 0 else None,
+        'p50_us': None,
+        'p99_us': None,
+        'peak_memory_mb': peak_mb,
+    }
+    if latencies:
+        result['p50_us'] = round(float(np.percentile(latencies, 50)) / 1000, 2)
+        result['p99_us'] = round(float(np.percentile(latencies, 99)) / 1000, 2)
+    return result
+
+
+def bench_size(rows, args):
+    """对一个数据规模运行全部测试"""
+    results = []
+    df = generate_dataframe(rows, seed=args.seed, duplicate_ratio=args.duplicate_ratio)
+    sample = df.head(args.latency_sample)
+
+    # detect_pack_form：逐行延迟
+    for engine in args.engines:
+        labeler = PackFormLabeler(engine=engine)
+        seconds, latencies = time_per_row(labeler.detect_pack_form, sample['Product'])
+        results.append(make_result('detect_pack_form', engine, len(sample), seconds, latencies))
+
+    # standardize_pack_form：逐行延迟
+    labeler = PackFormLabeler(engine=args.engines[0])
+    values = sample['Pack form'].dropna()
+    seconds, latencies = time_per_row(labeler.standardize_pack_form, values)
+    results.append(make_result('standardize_pack_form', 'index', len(values), seconds, latencies))
+
+    # process_dataframe：整表耗时和峰值内存
+    for mode in args.modes:
+        if mode == 'loop' and rows > args.loop_max_rows:
+            continue
+
+        def run(mode=mode):
+            labeler.cache_clear()
+            return labeler.process_dataframe(df, mode=mode)
+
+        start = time.perf_counter()
+        df_processed = run()[0]
+        seconds = time.perf_counter() - start
+        peak = peak_memory_mb(run) if args.memory else None
+        results.append(make_result('process_dataframe', mode, rows, seconds, peak_mb=peak))
+
+    # process_excel中的Excel读写
+    if rows <= args.excel_max_rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            input_file = os.path.join(tmp, 'input.xlsx')
+            output_file = os.path.join(tmp, 'output.xlsx')
+            df.to_excel(input_file, index=False)
+
+            start = time.perf_counter()
+            pd.read_excel(input_file)
+            seconds = time.perf_counter() - start
+            peak = peak_memory_mb(lambda: pd.read_excel(input_file)) if args.memory else None
+            results.append(make_result('excel_read', 'openpyxl', rows, seconds, peak_mb=peak))
+
+            start = time.perf_counter()
+            df_processed.to_excel(output_file, index=False)
+            seconds = time.perf_counter() - start
+            peak = peak_memory_mb(lambda: df_processed.to_excel(output_file, index=False)) if args.memory else None
+            results.append(make_result('excel_write', 'openpyxl', rows, seconds, peak_mb=peak))
+
+    return results
+
+
+def print_results(results, baseline=None):
+    """打印结果表格，提供基准时同时显示吞吐量变化"""
+    previous = {}
+    if baseline:
+        previous = {(r['stage'], r['variant'], r['rows']): r for r in baseline['results']}
+
+    print(f"{'stage':<24}{'variant':<12}{'rows':>10}{'rows/s':>14}{'p50 us':>10}{'p99 us':>10}{'peak MB':>10}{'vs base':>10}")
+    for r in results:
+        change = ''
+        old = previous.get((r['stage'], r['variant'], r['rows']))
+        if old and old['rows_per_sec'] and r['rows_per_sec']:
+            change = f"{r['rows_per_sec'] / old['rows_per_sec']:.2f}x"
+        print(
+            f"{r['stage']:<24}{r['variant']:<12}{r['rows']:>10}"
+            f"{r['rows_per_sec'] or 0:>14,.0f}"
+            f"{r['p50_us'] if r['p50_us'] is not None else '-':>10}"
+            f"{r['p99_us'] if r['p99_us'] is not None else '-':>10}"
+            f"{r['peak_memory_mb'] if r['peak_memory_mb'] is not None else '-':>10}"
+            f"{change:>10}"
+        )
+
+
+def build_arg_parser():
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(description='剂型打标性能测试')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000],
+                        help='测试数据行数，可指定多个（默认10000）')
+    parser.add_argument('--duplicate-ratio', type=float, default=0.5, help='重复标题比例（默认0.5）')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子（默认0）')
+    parser.add_argument('--engines', nargs='+', choices=PackFormLabeler.ENGINES,
+                        default=list(PackFormLabeler.ENGINES), help='测试的匹配引擎')
+    parser.add_argument('--modes', nargs='+', choices=PackFormLabeler.PROCESS_MODES,
+                        default=list(PackFormLabeler.PROCESS_MODES), help='测试的处理模式')
+    parser.add_argument('--latency-sample', type=int, default=20000,
+                        help='逐行延迟测试使用的行数上限（默认20000）')
+    parser.add_argument('--loop-max-rows', type=int, default=100000,
+                        help='超过该行数时跳过loop模式（默认100000）')
+    parser.add_argument('--excel-max-rows', type=int, default=200000,
+                        help='超过该行数时跳过Excel读写测试（默认200000）')
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help='不测量峰值内存（测量需要额外运行一次）')
+    parser.add_argument('-o', '--output', help='保存结果的JSON文件')
+    parser.add_argument('--compare', help='用于对比的历史结果JSON文件')
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    results = []
+    for rows in args.rows:
+        print(f"正在测试 {rows} 行...")
+        results.extend(bench_size(rows, args))
+
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'duplicate_ratio': args.duplicate_ratio,
+            'ruleset': PackFormLabeler().ruleset_fingerprint(),
+        },
+        'results': results,
+    }
+
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到: {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+性能回归门禁
+用固定随机种子生成的语料运行PackFormLabeler，把各处理阶段的吞吐量、逐行检测延迟和规则表的总开销
+与仓库中提交的基准文件对比，超出容差时以非零状态退出，并列出各阶段和各规则的变化
+
+不同机器的速度差异用一段固定的校准负载（与规则表无关的正则匹配）折算，
+基准机器与CI机器不同时也可以直接对比；完全离线运行，不需要额外依赖。
+
+用法（在仓库根目录执行）:
+    python -m benchmarks.perf_gate                      # 与 benchmarks/perf_baseline.json 对比
+    python -m benchmarks.perf_gate --tolerance 0.15
+    python -m benchmarks.perf_gate --update             # 确认为预期变化后更新基准
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import re
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.bench_labeler import time_per_row
+from benchmarks.synthetic import generate_dataframe
+from pack_form_labeler import PackFormLabeler
+from pack_form_metrics import RunMetrics
+from pack_form_profiler import profile_patterns
+from pack_form_stats import LabelStats
+
+# 提交到仓库的基准文件
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'perf_baseline.json')
+
+# 默认容差：吞吐量下降或延迟上升超过25%视为回归
+DEFAULT_TOLERANCE = 0.25
+
+# 参与门禁的处理模式（loop模式只用于对照，不在生产中使用）
+GATE_MODES = ('vectorized', 'dedup')
+
+# 单次耗时短于该值（秒）的阶段计时噪声过大，只报告变化，不判定为回归
+MIN_GATED_SECONDS = 0.02
+
+# 生成基准时使用的默认语料参数，对比时以基准文件中记录的为准
+CORPUS_DEFAULTS = {'rows': 20000, 'seed': 0, 'duplicate_ratio': 0.5, 'latency_sample': 5000}
+
+# 校准负载使用的正则，与规则表无关，规则修改不影响校准结果
+CALIBRATION_PATTERN = re.compile(r'\b(?:vitamin|capsules?|tablets?|gumm(?:y|ies))\b|\d+\s*(?:mg|iu|count)')
+
+
+def calibrate(texts, repeat=3):
+    """
+    运行固定的校准负载，返回最短耗时（秒），用于折算不同机器的速度差异
+
+    Args:
+        texts (list): 语料中的产品标题
+        repeat (int): 重复次数
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            CALIBRATION_PATTERN.findall(text.lower())
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def _best(values):
+    return min(values) if values else None
+
+
+def measure(corpus, engine='compiled', repeat=3, rules=None):
+    """
+    在固定语料上测量各项指标，每项取多次运行中的最好结果以降低噪声
+
+    Args:
+        corpus (dict): 语料参数（rows、seed、duplicate_ratio、latency_sample）
+        engine (str): 匹配引擎
+        repeat (int): 每项测量的重复次数
+        rules (str): 规则包路径，默认为随程序发布的规则包
+
+    Returns:
+        dict: {'meta': 运行环境, 'corpus': 语料参数, 'calibration_seconds': 校准耗时,
+               'metrics': {指标名称: {'value', 'unit', 'higher_is_better', 'gated'}},
+               'rules': {规则键: {'table', 'form', 'pattern', 'us_per_row', 'hit_rate'}}}
+    """
+    df = generate_dataframe(corpus['rows'], seed=corpus['seed'], duplicate_ratio=corpus['duplicate_ratio'])
+    texts = df['Product'].tolist()
+    sample = texts[:corpus['latency_sample']]
+
+    metrics = {}
+    # 校准负载穿插在各项测量之间运行，取最短耗时，避免一次偶然的变慢影响折算
+    calibration = [calibrate(texts)]
+
+    def recalibrate():
+        calibration.append(calibrate(texts, repeat=1))
+
+    def add(name, value, unit, higher_is_better, seconds=None):
+        if value is not None:
+            metrics[name] = {'value': round(value, 3), 'unit': unit, 'higher_is_better': higher_is_better,
+                             'gated': seconds is None or seconds >= MIN_GATED_SECONDS}
+
+    # 各处理模式的整表吞吐量和各阶段吞吐量，每次使用新的标签器，不受结果缓存影响
+    for mode in GATE_MODES:
+        totals = []
+        stages = {}
+        for _ in range(repeat):
+            recalibrate()
+            labeler = PackFormLabeler(engine=engine, rules=rules)
+            run_metrics = RunMetrics()
+            start = time.perf_counter()
+            labeler.process_dataframe(df, mode=mode, metrics=run_metrics, stats=LabelStats())
+            totals.append(time.perf_counter() - start)
+            for record in run_metrics.as_dict()['stages']:
+                if record['rows']:
+                    stages.setdefault(record['stage'], []).append((record['worker_seconds'], record['rows']))
+        add(f'process_dataframe/{mode}', len(df) / min(totals), 'rows/s', True, min(totals))
+        for stage, runs in stages.items():
+            seconds, rows = min(runs)
+            add(f'{mode}/{stage}', rows / seconds, 'rows/s', True, seconds)
+
+    # 逐行检测延迟
+    p50, p99 = [], []
+    for _ in range(repeat):
+        recalibrate()
+        labeler = PackFormLabeler(engine=engine, rules=rules)
+        _, latencies = time_per_row(labeler.detect_pack_form, sample)
+        p50.append(float(np.percentile(latencies, 50)) / 1000)
+        p99.append(float(np.percentile(latencies, 99)) / 1000)
+    add('detect_pack_form/p50_us', _best(p50), 'us', False)
+    add('detect_pack_form/p99_us', _best(p99), 'us', False)
+
+    # 规则表中每个模式逐条执行的开销（与pack_form_profiler一致）
+    rule_costs = {}
+    labeler = PackFormLabeler(engine=engine, rules=rules)
+    for _ in range(repeat):
+        recalibrate()
+        occurrences = {}
+        for record in profile_patterns(labeler, sample):
+            key = f"{record['table']}|{record['form']}|{record['pattern']}"
+            # 同一剂型中重复的模式加序号区分
+            occurrences[key] = occurrences.get(key, 0) + 1
+            if occurrences[key] > 1:
+                key = f"{key}#{occurrences[key]}"
+            us_per_row = record['total_ms'] * 1000 / len(sample)
+            entry = rule_costs.get(key)
+            if entry is None:
+                rule_costs[key] = entry = {
+                    'table': record['table'], 'form': record['form'], 'pattern': record['pattern'],
+                    'us_per_row': us_per_row, 'hit_rate': round(record['hit_rate'], 4),
+                }
+            entry['us_per_row'] = min(entry['us_per_row'], us_per_row)
+    for entry in rule_costs.values():
+        entry['us_per_row'] = round(entry['us_per_row'], 4)
+    add('rules/us_per_row', sum(entry['us_per_row'] for entry in rule_costs.values()), 'us', False)
+
+    return {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'engine': engine,
+            'ruleset': labeler.ruleset_fingerprint(),
+            'rules_version': labeler.rules_version,
+        },
+        'corpus': dict(corpus),
+        'calibration_seconds': round(min(calibration), 6),
+        'metrics': metrics,
+        'rules': rule_costs,
+    }
+
+
+def compare(baseline, current, tolerance, normalize=True):
+    """
+    对比各项指标
+
+    Args:
+        baseline (dict): 基准文件内容
+        current (dict): measure的结果
+        tolerance (float): 容差比例
+        normalize (bool): 是否按校准耗时折算机器速度差异
+
+    Returns:
+        tuple: (速度折算系数, [{'metric', 'unit', 'baseline', 'current', 'change', 'status'}])，
+            change为性能变化比例（正数为变快），status为'ok'、'regression'、'improved'、'new'、'missing'，
+            或'ungated'（计时过短的阶段超出容差，只报告不判定）
+    """
+    # 当前机器比基准机器慢时factor小于1，当前测量值按factor折算到基准机器
+    factor = baseline['calibration_seconds'] / current['calibration_seconds'] if normalize else 1.0
+    rows = []
+    for name in list(baseline['metrics']) + [m for m in current['metrics'] if m not in baseline['metrics']]:
+        old = baseline['metrics'].get(name)
+        new = current['metrics'].get(name)
+        if old is None or new is None:
+            record = old or new
+            rows.append({'metric': name, 'unit': record['unit'], 'baseline': old and old['value'],
+                         'current': new and new['value'], 'change': None,
+                         'status': 'new' if old is None else 'missing'})
+            continue
+        if new['higher_is_better']:
+            value = new['value'] / factor
+            change = value / old['value'] - 1
+        else:
+            value = new['value'] * factor
+            change = old['value'] / value - 1 if value else 0.0
+        status = 'ok'
+        if change < -tolerance:
+            status = 'regression' if old.get('gated', True) and new.get('gated', True) else 'ungated'
+        elif change > tolerance:
+            status = 'improved'
+        rows.append({'metric': name, 'unit': new['unit'], 'baseline': old['value'], 'current': round(value, 3),
+                     'change': change, 'status': status})
+    return factor, rows
+
+
+def diff_rules(baseline, current, factor=1.0, tolerance=DEFAULT_TOLERANCE, min_delta_us=0.05):
+    """
+    逐条对比规则的开销，找出新增、删除和明显变慢的模式
+
+    Args:
+        baseline (dict): 基准文件内容
+        current (dict): measure的结果
+        factor (float): compare返回的速度折算系数
+        tolerance (float): 容差比例
+        min_delta_us (float): 每行开销的增加量低于该值（微秒）时不报告，过滤计时噪声
+
+    Returns:
+        list: [{'change', 'table', 'form', 'pattern', 'baseline_us', 'current_us', 'delta_us', 'hit_rate'}]，
+            按每行开销的增加量降序
+    """
+    old_rules = baseline.get('rules', {})
+    new_rules = current['rules']
+    diffs = []
+    for key in set(old_rules) | set(new_rules):
+        old, new = old_rules.get(key), new_rules.get(key)
+        old_us = old['us_per_row'] if old else 0.0
+        new_us = new['us_per_row'] * factor if new else 0.0
+        delta = new_us - old_us
+        if old is None:
+            change = 'added'
+        elif new is None:
+            change = 'removed'
+        elif delta > min_delta_us and new_us > old_us * (1 + tolerance):
+            change = 'slower'
+        else:
+            continue
+        rule = new or old
+        diffs.append({
+            'change': change, 'table': rule['table'], 'form': rule['form'], 'pattern': rule['pattern'],
+            'baseline_us': old and old_us, 'current_us': new and round(new_us, 4),
+            'delta_us': round(delta, 4), 'hit_rate': rule['hit_rate'],
+        })
+    return sorted(diffs, key=lambda diff: diff['delta_us'], reverse=True)
+
+
+def print_comparison(rows, factor, baseline, current):
+    """打印各项指标的对比结果"""
+    print(f"基准: 规则集 {baseline['meta']['ruleset']} ({baseline['meta']['timestamp']}, {baseline['meta']['python']})")
+    print(f"当前: 规则集 {current['meta']['ruleset']}，速度折算系数 {factor:.3f}")
+    print(f"{'metric':<34}{'unit':>8}{'baseline':>14}{'current':>14}{'change':>10}  status")
+    for row in rows:
+        change = f"{row['change']:+.1%}" if row['change'] is not None else '-'
+        print(f"{row['metric']:<34}{row['unit']:>8}"
+              f"{row['baseline'] if row['baseline'] is not None else '-':>14}"
+              f"{row['current'] if row['current'] is not None else '-':>14}"
+              f"{change:>10}  {row['status']}")
+
+
+def print_rule_diff(diffs, top=20):
+    """打印规则变化，每行开销增加最多的在前"""
+    if not diffs:
+        print("\n规则表各模式的开销没有明显变化")
+        return
+    print(f"\n规则变化（每行开销，微秒；共 {len(diffs)} 项，显示前 {min(top, len(diffs))} 项）:")
+    for diff in diffs[:top]:
+        old = f"{diff['baseline_us']:.3f}" if diff['baseline_us'] is not None else '-'
+        new = f"{diff['current_us']:.3f}" if diff['current_us'] is not None else '-'
+        print(f"  {diff['change']:<8}{diff['table']}/{diff['form']:<12} {old:>8} -> {new:>8} "
+              f"({diff['delta_us']:+.3f})  命中率 {diff['hit_rate']:.1%}  {diff['pattern']}")
+
+
+def build_arg_parser():
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(description='剂型打标性能回归门禁')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='基准文件（默认 benchmarks/perf_baseline.json）')
+    parser.add_argument('--tolerance', type=float,
+                        help=f'容差比例，默认使用基准文件中记录的值（未记录时为{DEFAULT_TOLERANCE}）')
+    parser.add_argument('--update', action='store_true', help='重新测量并写入基准文件，不做对比')
+    parser.add_argument('--repeat', type=int, default=5, help='每项测量的重复次数，取最好结果（默认5）')
+    parser.add_argument('--engine', choices=PackFormLabeler.ENGINES, default='compiled',
+                        help='匹配引擎（默认compiled）')
+    parser.add_argument('--rules', help='要检查的规则包，默认 rules/pack_form_rules.json')
+    parser.add_argument('--rows', type=int, help='生成基准时的语料行数（对比时使用基准文件中的值）')
+    parser.add_argument('--seed', type=int, help='生成基准时的随机种子')
+    parser.add_argument('--no-normalize', dest='normalize', action='store_false',
+                        help='不按校准负载折算机器速度差异（基准与当前在同一台机器上时使用）')
+    parser.add_argument('--min-rule-delta-us', type=float, default=0.05,
+                        help='规则每行开销的增加量低于该值（微秒）时不报告（默认0.05）')
+    parser.add_argument('--top', type=int, default=20, help='显示的规则变化数量（默认20）')
+    parser.add_argument('-o', '--output', help='同时把本次测量结果保存为JSON')
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+
+    baseline = None
+    if not args.update:
+        if not os.path.exists(args.baseline):
+            print(f"基准文件不存在: {args.baseline}，请先运行 python -m benchmarks.perf_gate --update")
+            return 2
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    # 对比时必须使用与基准相同的语料
+    corpus = dict(CORPUS_DEFAULTS, **(baseline['corpus'] if baseline else {}))
+    if args.update:
+        corpus.update({key: value for key, value in (('rows', args.rows), ('seed', args.seed)) if value is not None})
+    print(f"正在测量: {corpus['rows']} 行语料，种子 {corpus['seed']}，重复 {args.repeat} 次...")
+    current = measure(corpus, engine=args.engine, repeat=args.repeat, rules=args.rules)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+
+    if args.update:
+        current['tolerance'] = args.tolerance if args.tolerance is not None else DEFAULT_TOLERANCE
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+        print(f"基准已更新: {args.baseline}")
+        return 0
+
+    tolerance = args.tolerance if args.tolerance is not None else baseline.get('tolerance', DEFAULT_TOLERANCE)
+    factor, rows = compare(baseline, current, tolerance, normalize=args.normalize)
+    print_comparison(rows, factor, baseline, current)
+    print_rule_diff(diff_rules(baseline, current, factor, tolerance, args.min_rule_delta_us), args.top)
+
+    regressions = [row['metric'] for row in rows if row['status'] == 'regression']
+    if regressions:
+        print(f"\n性能回归（超出容差 {tolerance:.0%}）: {', '.join(regressions)}")
+        return 1
+    print(f"\n性能检查通过（容差 {tolerance:.0%}）")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成测试数据
+按固定随机种子生成中英文混合的保健品标题，用于性能测试
+"""
+
+import random
+
+import pandas as pd
+
+BRANDS = [
+    'Nature Made', "Nature's Bounty", 'NOW Foods', 'Garden of Life', 'Solgar', 'Centrum',
+    'Olly', 'Vitafusion', 'Nordic Naturals', 'Doctor\'s Best', 'Jarrow Formulas', 'Thorne',
+    '汤臣倍健', '善存', '钙尔奇', '健安喜', '自然之宝', '康恩贝', '养生堂', '斯维诗'
+]
+
+INGREDIENTS = [
+    'Vitamin D3', 'Vitamin C', 'Vitamin B12', 'Magnesium Glycinate', 'Zinc', 'Iron',
+    'Omega-3 Fish Oil', 'Probiotics', 'Collagen Peptides', 'Melatonin', 'Ashwagandha',
+    'Turmeric Curcumin', 'Elderberry', 'Biotin', 'CoQ10', 'Lutein', 'Calcium Citrate',
+    'Apple Cider Vinegar', 'Multivitamin', 'Electrolytes', 'Creatine Monohydrate',
+    '维生素D3', '维生素C', '复合维生素', '钙镁锌', '鱼油', '益生菌', '胶原蛋白', '叶黄素',
+    '褪黑素', '辅酶Q10', '蛋白粉', '葡萄籽', '蔓越莓'
+]
+
+FORMS = [
+    'Capsules', 'Veggie Capsules', 'Caps', 'Tablets', 'Chewable Tablets', 'Caplets',
+    'Softgels', 'Soft Gels', 'Gummies', 'Gummy', 'Powder', 'Drink Mix', 'Liquid Drops',
+    'Tincture', 'Liquid', 'Syrup', 'Oil', 'Essential Oil', 'Spray', 'Cream', 'Lotion',
+    'Patch', 'Tea Bags', 'Sticks', 'Strips',
+    '胶囊', '软胶囊', '片剂', '咀嚼片', '软糖', '粉末', '冲剂', '口服液', '滴剂', '精华液',
+    '喷雾', '贴片', '茶包', '条装'
+]
+
+DESCRIPTORS = [
+    'Extra Strength', 'Non-GMO', 'Gluten Free', 'Vegan', 'Sugar Free', 'for Adults',
+    'for Kids', 'Immune Support', 'Sleep Support', 'Heart Health', 'Joint Support',
+    'Third-Party Tested', 'High Potency', 'Fast Absorption', 'Made in USA',
+    '成人', '儿童', '中老年', '增强免疫', '改善睡眠', '美白', '护眼', '进口', '正品'
+]
+
+STRENGTHS = ['1000 IU', '5000 IU', '500 mg', '250 mg', '100 mcg', '2000 mg', '10 Billion CFU', '']
+
+COUNTS = ['60 Count', '90 Count', '120 Count', '180 Ct', '30 Servings', '2 fl oz', '100粒', '60片', '30袋', '']
+
+# 已有Pack form列中常见的写法（含需要标准化的变体）
+PACK_FORM_VALUES = [
+    'Capsule', 'capsules', 'CAPS', 'Veggie Capsule', 'Tablet', 'tablets', 'Caplets', 'Chewable',
+    'Softgel', 'softgels', 'Gummy', 'gummies', 'Powder', 'POWDER', 'Liquid', 'Drops',
+    'Tincture', 'Oil', 'Fish Oil', 'Spray', 'Cream', 'Tea bags', 'Sticks', 'Others', 'Bundle'
+]
+
+
+def generate_title(rng):
+    """
+    生成一个产品标题
+
+    Args:
+        rng (random.Random): 随机数生成器
+
+    Returns:
+        str: 产品标题，约十分之一不包含剂型关键词
+    """
+    parts = [rng.choice(BRANDS), rng.choice(INGREDIENTS)]
+    strength = rng.choice(STRENGTHS)
+    if strength:
+        parts.append(strength)
+    if rng.random() < 0.9:
+        parts.append(rng.choice(FORMS))
+    # 部分标题同时出现两种剂型（如组合装）
+    if rng.random() < 0.08:
+        parts.append('+ ' + rng.choice(FORMS))
+    parts.extend(rng.sample(DESCRIPTORS, rng.randint(0, 3)))
+    count = rng.choice(COUNTS)
+    if count:
+        parts.append(count)
+    separator = rng.choice([' ', ', ', ' - ', ' '])
+    return separator.join(parts)
+
+
+def generate_titles(rows, seed=0, duplicate_ratio=0.5):
+    """
+    生成产品标题列表
+
+    Args:
+        rows (int): 标题数量
+        seed (int): 随机种子
+        duplicate_ratio (float): 重复标题所占比例，0表示全部不同
+
+    Returns:
+        list: 产品标题
+    """
+    rng = random.Random(seed)
+    unique_count = max(1, int(round(rows * (1.0 - duplicate_ratio))))
+    unique_titles = [generate_title(rng) for _ in range(min(unique_count, rows))]
+    titles = list(unique_titles)
+    while len(titles) < rows:
+        titles.append(rng.choice(unique_titles))
+    rng.shuffle(titles)
+    return titles
+
+
+def generate_dataframe(rows, seed=0, duplicate_ratio=0.5, empty_ratio=0.3):
+    """
+    生成包含Pack form和Product列的测试数据
+
+    Args:
+        rows (int): 行数
+        seed (int): 随机种子
+        duplicate_ratio (float): 重复标题所占比例
+        empty_ratio (float): Pack form列为空的比例
+
+    Returns:
+        pd.DataFrame: 测试数据
+    """
+    rng = random.Random(seed + 1)
+    titles = generate_titles(rows, seed=seed, duplicate_ratio=duplicate_ratio)
+    pack_forms = [
+        None if rng.random() < empty_ratio else rng.choice(PACK_FORM_VALUES)
+        for _ in range(rows)
+    ]
+    return pd.DataFrame({
+        'ASIN': [f'B0{rng.randrange(16 ** 8):08X}' for _ in range(rows)],
+        'Pack form': pack_forms,
+        'Product': titles,
+        'Price': [round(rng.uniform(5, 60), 2) for _ in range(rows)],
+    })
@@ -0,0 +1 @@
+# pytest从仓库根目录导入pack_form_*模块（各模块位于仓库根目录，没有打包）
@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+持久化缓存
+- LabelCache: 剂型打标结果，基于SQLite（WAL模式），按规则集指纹和产品标题哈希保存，可供多个进程共享
+- InputCache: 解析后的Excel工作表，按文件内容哈希保存为列式文件，同一文件再次处理时不再解析
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import warnings
+from io import BytesIO
+
+# SQLite单条语句的参数个数有上限，批量查询时分段执行
+_SQL_BATCH = 500
+# 输入缓存文件的格式版本，读取方式或文件结构变化时递增，旧文件不再命中并随淘汰清除
+_INPUT_CACHE_FORMAT = 1
+
+
+def text_key(text_lower):
+    """
+    计算产品标题的缓存键
+
+    检测结果只取决于标题的小写形式，因此以小写文本的哈希作为键。
+
+    Args:
+        text_lower (str): 已转换为小写的产品描述文本
+
+    Returns:
+        bytes: 16字节哈希
+    """
+    return hashlib.blake2b(text_lower.encode('utf-8'), digest_size=16).digest()
+
+
+class LabelCache:
+    """
+    按规则集指纹和标题哈希保存打标结果的磁盘缓存
+
+    每条记录为 (检测到的剂型数量, 分类结果, 匹配文本)，与PackFormLabeler.label_product一致。
+    规则表有任何改动都会改变指纹，旧记录不再命中，并随容量淘汰逐步清除。
+    """
+
+    def __init__(self, cache_dir='.pack_form_cache', max_entries=2000000):
+        """
+        Args:
+            cache_dir (str): 缓存目录
+            max_entries (int): 最多保留的记录数，超出后淘汰最久未使用的记录
+        """
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.path = os.path.join(cache_dir, 'labels.sqlite3')
+        self.hits = 0
+        self.misses = 0
+        self._connection = None
+        self._pid = None
+
+    def __getstate__(self):
+        """序列化时不携带数据库连接，各进程使用自己的连接"""
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        state['_pid'] = None
+        return state
+
+    def _connect(self):
+        """获取当前进程的数据库连接（首次使用时创建表）"""
+        if self._connection is not None and self._pid == os.getpid():
+            return self._connection
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS labels ('
+            ' ruleset TEXT NOT NULL,'
+            ' text_hash BLOB NOT NULL,'
+            ' form_count INTEGER NOT NULL,'
+            ' classified TEXT,'
+            ' match_source TEXT NOT NULL,'
+            ' last_used REAL NOT NULL,'
+            ' PRIMARY KEY (ruleset, text_hash))'
+        )
+        connection.execute('CREATE INDEX IF NOT EXISTS labels_last_used ON labels (last_used)')
+        # 记录数由触发器维护，淘汰和统计时不需要COUNT(*)扫描全表；
+        # 已有的缓存文件首次连接时统计一次
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS labels_count ('
+                ' id INTEGER PRIMARY KEY CHECK (id = 0),'
+                ' entries INTEGER NOT NULL)'
+            )
+            connection.execute(
+                'CREATE TRIGGER IF NOT EXISTS labels_count_insert AFTER INSERT ON labels'
+                ' BEGIN UPDATE labels_count SET entries = entries + 1 WHERE id = 0; END'
+            )
+            connection.execute(
+                'CREATE TRIGGER IF NOT EXISTS labels_count_delete AFTER DELETE ON labels'
+                ' BEGIN UPDATE labels_count SET entries = entries - 1 WHERE id = 0; END'
+            )
+            if connection.execute('SELECT 1 FROM labels_count WHERE id = 0').fetchone() is None:
+                connection.execute('INSERT INTO labels_count (id, entries) SELECT 0, COUNT(*) FROM labels')
+        self._connection = connection
+        self._pid = os.getpid()
+        return connection
+
+    def get_many(self, ruleset, texts_lower):
+        """
+        批量查询打标结果
+
+        Args:
+            ruleset (str): 规则集指纹
+            texts_lower (list): 已转换为小写的产品描述文本
+
+        Returns:
+            dict: {小写文本: (检测到的剂型数量, 分类结果, 匹配文本)}，只包含命中的文本
+        """
+        connection = self._connect()
+        keys = {text_key(text): text for text in texts_lower}
+        hash_list = list(keys)
+        found = {}
+        for start in range(0, len(hash_list), _SQL_BATCH):
+            batch = hash_list[start:start + _SQL_BATCH]
+            placeholders = ','.join('?' * len(batch))
+            rows = connection.execute(
+                'SELECT text_hash, form_count, classified, match_source FROM labels'
+                f' WHERE ruleset = ? AND text_hash IN ({placeholders})',
+                [ruleset] + batch
+            ).fetchall()
+            for text_hash, form_count, classified, match_source in rows:
+                found[keys[text_hash]] = (form_count, classified, match_source)
+
+        # 刷新命中记录的使用时间，供淘汰时参考
+        if found:
+            now = time.time()
+            hit_hashes = [text_key(text) for text in found]
+            with connection:
+                connection.execute('BEGIN')
+                for start in range(0, len(hit_hashes), _SQL_BATCH):
+                    batch = hit_hashes[start:start + _SQL_BATCH]
+                    placeholders = ','.join('?' * len(batch))
+                    connection.execute(
+                        f'UPDATE labels SET last_used = ? WHERE ruleset = ? AND text_hash IN ({placeholders})',
+                        [now, ruleset] + batch
+                    )
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, ruleset, results):
+        """
+        批量写入打标结果，写入后按容量淘汰
+
+        Args:
+            ruleset (str): 规则集指纹
+            results (dict): {小写文本: (检测到的剂型数量, 分类结果, 匹配文本)}
+        """
+        if not results:
+            return
+        connection = self._connect()
+        now = time.time()
+        with connection:
+            connection.execute('BEGIN')
+            # 用UPSERT而不是INSERT OR REPLACE：已有记录走更新，不触发插入计数
+            connection.executemany(
+                'INSERT INTO labels'
+                ' (ruleset, text_hash, form_count, classified, match_source, last_used)'
+                ' VALUES (?, ?, ?, ?, ?, ?)'
+                ' ON CONFLICT (ruleset, text_hash) DO UPDATE SET'
+                ' form_count = excluded.form_count, classified = excluded.classified,'
+                ' match_source = excluded.match_source, last_used = excluded.last_used',
+                [
+                    (ruleset, text_key(text), form_count, classified, match_source, now)
+                    for text, (form_count, classified, match_source) in results.items()
+                ]
+            )
+        self.evict()
+
+    def evict(self):
+        """记录数超过上限时，淘汰最久未使用的记录，降到上限的90%"""
+        connection = self._connect()
+        count = self._count(connection)
+        if count <= self.max_entries:
+            return
+        excess = count - int(self.max_entries * 0.9)
+        with connection:
+            connection.execute('BEGIN')
+            connection.execute(
+                'DELETE FROM labels WHERE rowid IN'
+                ' (SELECT rowid FROM labels ORDER BY last_used LIMIT ?)',
+                (excess,)
+            )
+
+    def stats(self):
+        """
+        获取缓存统计
+
+        Returns:
+            dict: 命中次数、未命中次数和当前记录数
+        """
+        entries = self._count(self._connect())
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries}
+
+    @staticmethod
+    def _count(connection):
+        """当前记录数（读取触发器维护的计数）"""
+        return connection.execute('SELECT entries FROM labels_count WHERE id = 0').fetchone()[0]
+
+    def close(self):
+        """关闭数据库连接"""
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+        self._pid = None
+
+
+def content_sha256(source, block_size=1 << 20):
+    """
+    分块计算文件内容的SHA-256
+
+    Args:
+        source: 文件路径、bytes或可读的二进制文件对象（读取后恢复原位置）
+        block_size (int): 每次读取的字节数
+
+    Returns:
+        str: 十六进制摘要
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return hashlib.sha256(source).hexdigest()
+    digest = hashlib.sha256()
+    if hasattr(source, 'read'):
+        position = source.tell()
+        source.seek(0)
+        for block in iter(lambda: source.read(block_size), b''):
+            digest.update(block)
+        source.seek(position)
+        return digest.hexdigest()
+    with open(source, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class InputCache:
+    """
+    按文件内容哈希保存解析后工作表的磁盘缓存
+
+    解析xlsx（解压并逐个单元格解析XML）通常是处理一个文件最慢的一步。缓存以文件内容的SHA-256、
+    工作表和读取的列为键，保存为Feather（Arrow IPC）文件并以内存映射方式读取。
+    无法无损保存为Arrow的工作表（如同一列中混有数字和文本）不缓存，每次照常解析。
+    文件内容变化时哈希随之变化，旧条目不再命中。
+
+    每次命中都会刷新条目文件的修改时间；写入后淘汰超过max_age_days未使用的条目，
+    总大小超过max_bytes时再从最久未使用的条目开始删除。缓存目录只应由本缓存写入。
+    """
+
+    def __init__(self, cache_dir='.pack_form_input_cache', max_bytes=2 * 1024 ** 3, max_age_days=14):
+        """
+        Args:
+            cache_dir (str): 缓存目录
+            max_bytes (int): 缓存文件的总大小上限（字节）
+            max_age_days (float): 条目超过这么多天未使用即被淘汰
+        """
+        try:
+            import pyarrow.feather  # noqa: F401
+        except ImportError:
+            raise ImportError("输入缓存需要安装pyarrow: pip install pyarrow")
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+
+    def read_excel(self, source, sheet_name=0, usecols=None, digest=None):
+        """
+        读取工作表，命中缓存时直接读取缓存文件，否则解析后写入缓存
+
+        Args:
+            source: Excel文件路径、bytes或可读的二进制文件对象
+            sheet_name (str|int|None): 工作表名称或序号，默认第一个；None读取所有工作表
+            usecols (list): 只读取这些列（以只读模式逐行读取，与pack_form_excel.read_sheet一致），
+                默认用pd.read_excel读取所有列
+            digest (str): 已计算好的文件内容SHA-256，默认由本方法计算
+
+        Returns:
+            pd.DataFrame|dict: 工作表数据；sheet_name为None时为 {工作表名称: DataFrame}
+        """
+        if digest is None:
+            digest = content_sha256(source)
+        if sheet_name is None:
+            return self._read_workbook(source, digest, usecols)
+
+        df = self.get(digest, sheet_name, usecols)
+        if df is None:
+            df = self._parse(source, sheet_name, usecols)
+            self.put(digest, sheet_name, usecols, df)
+        return df
+
+    def get(self, digest, sheet_name=0, usecols=None):
+        """
+        查询缓存的工作表
+
+        Args:
+            digest (str): 文件内容的SHA-256
+            sheet_name (str|int): 工作表名称或序号
+            usecols (list): 读取的列，默认所有列
+
+        Returns:
+            pd.DataFrame: 缓存的工作表，未命中时为None
+        """
+        path = self._entry_path(digest, sheet_name, usecols)
+        try:
+            df = self._load(path)
+            os.utime(path)
+        except Exception:
+            # 不存在、损坏或已被其他进程淘汰的条目按未命中处理
+            self.misses += 1
+            return None
+        self.hits += 1
+        return df
+
+    def put(self, digest, sheet_name, usecols, df):
+        """
+        写入工作表，写入后按大小和时间淘汰；无法保存为Arrow的工作表不写入，写入失败只给出警告，不影响处理
+
+        Args:
+            digest (str): 文件内容的SHA-256
+            sheet_name (str|int): 工作表名称或序号
+            usecols (list): 读取的列，默认所有列
+            df (pd.DataFrame): 解析结果
+        """
+        table = self._to_arrow(df)
+        if table is None:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            from pyarrow import feather
+            self._write_atomic(self._entry_path(digest, sheet_name, usecols),
+                               lambda f: feather.write_feather(table, f))
+            self.evict()
+        except OSError as e:
+            warnings.warn(f"写入输入缓存失败: {e}")
+
+    def evict(self):
+        """淘汰超过max_age_days未使用的条目；总大小仍超过上限时，从最久未使用的条目开始删除到上限的90%"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        expire_before = time.time() - self.max_age_days * 86400
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_file():
+                continue
+            try:
+                stat = entry.stat()
+                if stat.st_mtime < expire_before:
+                    os.remove(entry.path)
+                    continue
+            except OSError:
+                continue
+            # 其他进程正在写入的临时文件只按时间淘汰
+            if not entry.name.endswith('.tmp'):
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def stats(self):
+        """
+        获取缓存统计
+
+        Returns:
+            dict: 命中次数、未命中次数、当前条目数和总字节数
+        """
+        entries = 0
+        size = 0
+        if os.path.isdir(self.cache_dir):
+            for entry in os.scandir(self.cache_dir):
+                if entry.is_file() and entry.name.endswith('.feather'):
+                    entries += 1
+                    size += entry.stat().st_size
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'bytes': size}
+
+    def _entry_path(self, digest, sheet_name, usecols, suffix='.feather'):
+        """条目文件的路径：内容哈希加读取参数的哈希"""
+        key = json.dumps([_INPUT_CACHE_FORMAT, sheet_name, usecols], ensure_ascii=False)
+        key_hash = hashlib.blake2b(key.encode('utf-8'), digest_size=8).hexdigest()
+        return os.path.join(self.cache_dir, f'{digest[:32]}-{key_hash}{suffix}')
+
+    def _read_workbook(self, source, digest, usecols):
+        """读取所有工作表；工作表名称列表单独保存，全部命中时不需要打开工作簿"""
+        import pandas as pd
+        index_path = self._entry_path(digest, None, usecols, suffix='.sheets.json')
+        try:
+            with open(index_path, encoding='utf-8') as f:
+                sheet_names = json.load(f)
+            sheets = {}
+            for name in sheet_names:
+                sheets[name] = self.get(digest, name, usecols)
+                if sheets[name] is None:
+                    break
+            else:
+                os.utime(index_path)
+                return sheets
+        except (OSError, ValueError):
+            pass
+
+        if usecols is None:
+            sheets = pd.read_excel(self._as_input(source), sheet_name=None)
+        else:
+            from pack_form_excel import read_sheet_headers
+            sheets = {name: self._parse(source, name, usecols) for name in read_sheet_headers(self._as_input(source))}
+        for name, df in sheets.items():
+            self.put(digest, name, usecols, df)
+        try:
+            self._write_atomic(index_path, lambda f: f.write(
+                json.dumps(list(sheets), ensure_ascii=False).encode('utf-8')))
+        except OSError as e:
+            warnings.warn(f"写入输入缓存失败: {e}")
+        return sheets
+
+    def _parse(self, source, sheet_name, usecols):
+        """解析一个工作表"""
+        import pandas as pd
+        if usecols is None:
+            return pd.read_excel(self._as_input(source), sheet_name=sheet_name)
+        from pack_form_excel import read_sheet, read_sheet_headers
+        if isinstance(sheet_name, int):
+            sheet_name = list(read_sheet_headers(self._as_input(source)))[sheet_name]
+        return read_sheet(self._as_input(source), sheet_name=sheet_name, usecols=usecols)
+
+    @staticmethod
+    def _as_input(source):
+        """bytes包装为文件对象，文件对象回到开头"""
+        if isinstance(source, (bytes, bytearray)):
+            return BytesIO(source)
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        return source
+
+    @staticmethod
+    def _load(path):
+        from pyarrow import feather
+        return feather.read_table(path, memory_map=True).to_pandas()
+
+    @staticmethod
+    def _to_arrow(df):
+        """
+        转换为Arrow表；索引不是从0开始的默认行号、列名不是唯一的字符串或某列无法转换为Arrow时返回None
+        """
+        import pandas as pd
+        import pyarrow
+        index = df.index
+        if not (isinstance(index, pd.RangeIndex) and index.start == 0 and index.step == 1):
+            return None
+        if not all(isinstance(col, str) for col in df.columns) or df.columns.has_duplicates:
+            return None
+        try:
+            return pyarrow.Table.from_pandas(df, preserve_index=False)
+        except (pyarrow.ArrowException, TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_atomic(path, write):
+        """先写临时文件再替换，并发读取的进程不会读到不完整的文件"""
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(temp_path, 'wb') as f:
+                write(f)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
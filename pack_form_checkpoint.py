@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+可断点续跑的打标
+把输入工作表按固定行数编号分块，每块打标完成后立即把结果保存到检查点目录，并在清单文件中记录。
+进程被中断后重新运行同一命令，已完成的分块直接跳过，全部分块完成后才拼接并写出最终结果。
+
+清单（manifest.json）记录输入文件的SHA-256、规则集指纹和分块行数，
+其中任何一项变化时旧的检查点不能复用，需要指定restart重新开始。
+分块的打标结果保存为Feather文件，分块的打标统计以报告的形式记录在清单中，
+续跑时不会反序列化检查点目录中的任意对象。
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from pack_form_metrics import track
+from pack_form_stats import LabelStats
+
+MANIFEST_FILE = 'manifest.json'
+# 清单格式版本，结构变化时递增
+MANIFEST_FORMAT = 2
+
+
+def file_sha256(path, block_size=1 << 20):
+    """
+    分块计算文件的SHA-256，内存占用与文件大小无关
+
+    Args:
+        path (str): 文件路径
+        block_size (int): 每次读取的字节数
+
+    Returns:
+        str: 十六进制摘要
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def checkpoint_dir_for(checkpoint_root, input_file):
+    """
+    输入文件在检查点根目录下的子目录：文件名加路径哈希，不同目录下的同名文件互不干扰
+
+    Args:
+        checkpoint_root (str): 检查点根目录
+        input_file (str): 输入文件路径
+
+    Returns:
+        str: 该输入文件的检查点目录
+    """
+    stem = os.path.splitext(os.path.basename(input_file))[0]
+    path_hash = hashlib.sha1(os.path.abspath(input_file).encode('utf-8')).hexdigest()[:8]
+    return os.path.join(checkpoint_root, f'{stem}-{path_hash}')
+
+
+def _write_atomic(path, data):
+    """先写临时文件再替换，进程在写入过程中被中断也不会留下不完整的文件"""
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def _to_builtin(value):
+    """把报告中的numpy标量转换为可写入JSON的Python类型"""
+    if isinstance(value, dict):
+        return {str(key): _to_builtin(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_builtin(item) for item in value]
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+def _feather_bytes(labels):
+    """
+    把一个分块的打标结果序列化为Feather（Arrow IPC），保留行号索引
+
+    剂型列中的空值可能混有None和NaN，统一为None后写出（写出结果时两者都是空单元格）。
+    """
+    import pyarrow
+    from pyarrow import feather
+    labels = labels.copy()
+    for column in labels.columns:
+        if labels[column].dtype == object:
+            labels[column] = labels[column].where(labels[column].notna(), None)
+    sink = pyarrow.BufferOutputStream()
+    feather.write_feather(pyarrow.Table.from_pandas(labels, preserve_index=True), sink)
+    return sink.getvalue().to_pybytes()
+
+
+class CheckpointManifest:
+    """
+    检查点目录中的清单：记录运行参数和已完成的分块
+
+    每个分块完成后先写分块文件再更新清单，清单中记录的分块一定已完整保存。
+    """
+
+    def __init__(self, checkpoint_dir, data):
+        self.checkpoint_dir = checkpoint_dir
+        self.path = os.path.join(checkpoint_dir, MANIFEST_FILE)
+        self.data = data
+
+    @classmethod
+    def open(cls, checkpoint_dir, run_info, restart=False):
+        """
+        打开或创建清单
+
+        Args:
+            checkpoint_dir (str): 检查点目录
+            run_info (dict): 本次运行的参数（input_sha256、ruleset、chunk_size等），用于判断检查点能否复用
+            restart (bool): 是否丢弃已有的检查点重新开始
+
+        Returns:
+            CheckpointManifest: 清单
+        """
+        path = os.path.join(checkpoint_dir, MANIFEST_FILE)
+        if restart and os.path.isdir(checkpoint_dir):
+            shutil.rmtree(checkpoint_dir)
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            mismatched = [
+                key for key in ('format', 'input_sha256', 'ruleset', 'chunk_size',
+                                'pack_form_column', 'product_column')
+                if data.get(key) != run_info[key]
+            ]
+            if mismatched:
+                raise ValueError(
+                    f"检查点与本次运行不一致（{', '.join(mismatched)}），"
+                    f"输入文件、规则或分块参数已变化，请使用 --restart 重新开始: {checkpoint_dir}"
+                )
+            return cls(checkpoint_dir, data)
+
+        data = dict(run_info, created_at=time.time(), chunks={}, chunk_count=None,
+                    completed_at=None, output_file=None)
+        manifest = cls(checkpoint_dir, data)
+        manifest.save()
+        return manifest
+
+    def save(self):
+        """原子地写回清单"""
+        _write_atomic(self.path, json.dumps(self.data, ensure_ascii=False, indent=2).encode('utf-8'))
+
+    def chunk_path(self, index):
+        return os.path.join(self.checkpoint_dir, f'chunk_{index:06d}.feather')
+
+    def is_done(self, index):
+        """分块已记录在清单中且分块文件存在"""
+        return str(index) in self.data['chunks'] and os.path.exists(self.chunk_path(index))
+
+    def save_chunk(self, index, labels, stats):
+        """
+        保存一个分块的打标结果并记入清单
+
+        Args:
+            index (int): 分块编号（从0开始）
+            labels (pd.DataFrame): 该分块的打标结果（label_columns的结果）
+            stats (LabelStats): 该分块的打标统计
+        """
+        _write_atomic(self.chunk_path(index), _feather_bytes(labels))
+        self.data['chunks'][str(index)] = {
+            'rows': len(labels),
+            'file': os.path.basename(self.chunk_path(index)),
+            'completed_at': time.time(),
+            'stats': _to_builtin(stats.report()),
+        }
+        self.save()
+
+    def load_chunk(self, index):
+        """读取一个分块，返回 (打标结果, 打标统计)"""
+        from pyarrow import feather
+        labels = feather.read_table(self.chunk_path(index)).to_pandas()
+        return labels, LabelStats.from_report(self.data['chunks'][str(index)]['stats'])
+
+    def remove_chunks(self):
+        """删除分块文件（清单保留，记录已完成的运行）"""
+        for index in range(self.data['chunk_count'] or 0):
+            path = self.chunk_path(index)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def label_file_resumable(labeler, input_file, output_file, checkpoint_root, pack_form_column='Pack form',
+                         product_column='Product', mode='dedup', output_format='xlsx', chunk_size=50000,
+                         restart=False, keep_checkpoints=False, metrics=None):
+    """
+    分块打标单个Excel文件，每块完成后保存检查点，中断后重新运行可从未完成的分块继续
+
+    只读取剂型列和产品描述列进行打标；全部分块完成后，写出时再与原数据的其他列拼接。
+
+    Args:
+        labeler (PackFormLabeler): 标签器
+        input_file (str): 输入文件路径
+        output_file (str): 输出文件路径
+        checkpoint_root (str): 检查点根目录，每个输入文件使用其中的一个子目录
+        pack_form_column (str): 剂型列名
+        product_column (str): 产品描述列名
+        mode (str): process_dataframe的处理模式
+        output_format (str): 输出格式
+        chunk_size (int): 每个分块的行数，续跑时必须与首次运行一致
+        restart (bool): 丢弃已有的检查点重新开始
+        keep_checkpoints (bool): 写出最终结果后是否保留分块文件
+        metrics (RunMetrics): 可选，记录读取、打标、保存检查点和写出各阶段的耗时和行数
+
+    Returns:
+        dict: 该文件的标准化报告
+    """
+    import pandas as pd
+    from pack_form_excel import iter_excel_batches
+    from pack_form_labeler import write_output_joined
+
+    checkpoint_dir = checkpoint_dir_for(checkpoint_root, input_file)
+    with track(metrics, 'hash_input'):
+        input_sha256 = file_sha256(input_file)
+    manifest = CheckpointManifest.open(checkpoint_dir, {
+        'format': MANIFEST_FORMAT,
+        'input_file': os.path.abspath(input_file),
+        'input_sha256': input_sha256,
+        'ruleset': labeler.ruleset_fingerprint(),
+        'rules_version': labeler.rules_version,
+        'chunk_size': chunk_size,
+        'pack_form_column': pack_form_column,
+        'product_column': product_column,
+        'mode': mode,
+    }, restart=restart)
+
+    # 上次运行已写出最终结果
+    if (manifest.data['completed_at'] is not None and manifest.data['output_file'] == os.path.abspath(output_file)
+            and os.path.exists(output_file)):
+        print(f"检查点显示该文件已处理完成: {output_file}")
+        return manifest.data['report']
+
+    column_names = {pack_form_column: 'Pack form', product_column: 'Product'}
+    resumed = len(manifest.data['chunks'])
+    if resumed:
+        print(f"从检查点继续: 已完成 {resumed} 个分块 ({checkpoint_dir})")
+
+    # 只读模式无法跳转到指定行，已完成的分块仍需读取但不再打标
+    batches = iter_excel_batches(input_file, batch_size=chunk_size, usecols=list(column_names))
+    index = 0
+    while True:
+        with track(metrics, 'read_excel') as stage:
+            batch = next(batches, None)
+            stage['rows'] = 0 if batch is None else len(batch)
+        if batch is None:
+            break
+        if not manifest.is_done(index):
+            stats = LabelStats()
+            labels, _, _ = labeler.label_columns(batch.rename(columns=column_names), mode=mode,
+                                                 metrics=metrics, stats=stats)
+            with track(metrics, 'checkpoint') as stage:
+                manifest.save_chunk(index, labels, stats)
+                stage['rows'] = len(labels)
+            print(f"分块 {index} 已保存（{index * chunk_size + len(batch)} 行）")
+        index += 1
+    manifest.data['chunk_count'] = index
+    manifest.save()
+
+    # 全部分块完成，按顺序拼接并写出
+    with track(metrics, 'assemble') as stage:
+        chunks = [manifest.load_chunk(i) for i in range(index)]
+        labels = pd.concat([chunk[0] for chunk in chunks])
+        stats = LabelStats()
+        for _, chunk_stats in chunks:
+            stats.merge(chunk_stats)
+        report = stats.report()
+        stage['rows'] = len(labels)
+    with track(metrics, f'write_{output_format}') as stage:
+        write_output_joined(input_file, labels, output_file, output_format, pack_form_column,
+                            batch_size=chunk_size)
+        stage['rows'] = len(labels)
+
+    manifest.data.update(completed_at=time.time(), output_file=os.path.abspath(output_file),
+                         report=_to_builtin(report))
+    manifest.save()
+    if not keep_checkpoints:
+        manifest.remove_chunks()
+    return report
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Excel流式读写
+基于openpyxl的只读/只写模式分批读写工作表，内存占用与总行数无关
+"""
+
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+
+
+def _column_names(header):
+    """与pd.read_excel一致地处理表头：空表头记为Unnamed: n，重复列名加后缀"""
+    names = []
+    seen = {}
+    for i, value in enumerate(header):
+        name = f"Unnamed: {i}" if value is None else value
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _is_empty_row(row):
+    """整行没有值（pd.read_excel把空字符串单元格也视为空）"""
+    return all(value is None or value == '' for value in row)
+
+
+def read_sheet_headers(input_file):
+    """
+    以只读模式读取每个工作表的表头，不读取数据行
+
+    Args:
+        input_file (str): Excel文件路径或可读的二进制文件对象
+
+    Returns:
+        dict: 工作表名称 -> 列名列表（空工作表为空列表），按工作簿中的顺序
+    """
+    workbook = load_workbook(input_file, read_only=True, data_only=True)
+    try:
+        headers = {}
+        for sheet in workbook.worksheets:
+            header = next(sheet.iter_rows(values_only=True, max_row=1), None)
+            headers[sheet.title] = _column_names(header) if header is not None else []
+        return headers
+    finally:
+        workbook.close()
+
+
+def read_sheet(input_file, sheet_name=None, batch_size=50000, usecols=None):
+    """
+    以只读模式读取整个工作表
+
+    只读模式只解析需要的工作表，多个进程分别读取同一工作簿的不同工作表时，
+    不会各自加载整个工作簿。
+
+    Args:
+        input_file (str): Excel文件路径
+        sheet_name (str): 工作表名称，默认为第一个工作表
+        batch_size (int): 分批读取的行数
+        usecols (list): 只读取这些列（按给定顺序），默认读取所有列
+
+    Returns:
+        pd.DataFrame: 工作表数据，表头为空的工作表返回空DataFrame
+    """
+    batches = list(iter_excel_batches(input_file, batch_size=batch_size, sheet_name=sheet_name,
+                                      usecols=usecols))
+    if not batches:
+        return pd.DataFrame()
+    if len(batches) == 1:
+        return batches[0]
+    # 某一批中全为空的列是object类型，拼接后按整列重新推断，与pd.read_excel的类型一致
+    return pd.concat(batches).infer_objects()
+
+
+def iter_excel_batches(input_file, batch_size=50000, sheet_name=None, usecols=None):
+    """
+    以只读模式分批读取Excel工作表
+
+    Args:
+        input_file (str): Excel文件路径
+        batch_size (int): 每批的行数
+        sheet_name (str): 工作表名称，默认为第一个工作表
+        usecols (list): 只保留这些列（按给定顺序），其余列的单元格读取后立即丢弃
+
+    Yields:
+        pd.DataFrame: 每批数据，索引为该批在工作表中的行号（从0开始，不含表头）
+    """
+    workbook = load_workbook(input_file, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name] if sheet_name is not None else workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = _column_names(header)
+        width = len(columns)
+        positions = None
+        if usecols is not None:
+            missing_columns = [col for col in usecols if col not in columns]
+            if missing_columns:
+                raise ValueError(f"缺少必要的列: {missing_columns}")
+            positions = [columns.index(col) for col in usecols]
+            columns = list(usecols)
+
+        batch = []
+        start = 0
+        empty_row = (None,) * len(columns)
+        # 连续的空行只计数，之后出现非空行时才补入；工作表末尾的空行（如只设置了格式的行）
+        # 与pd.read_excel一样丢弃，即使有上百万行也不会占用内存
+        pending_empty = 0
+        for row in rows:
+            if _is_empty_row(row):
+                pending_empty += 1
+                continue
+            while pending_empty:
+                count = min(pending_empty, batch_size - len(batch))
+                batch.extend([empty_row] * count)
+                pending_empty -= count
+                if len(batch) >= batch_size:
+                    yield pd.DataFrame(batch, columns=columns,
+                                       index=pd.RangeIndex(start, start + len(batch)))
+                    start += len(batch)
+                    batch = []
+            # 只读模式下各行长度可能不一致，按表头宽度补齐或截断
+            if len(row) != width:
+                row = (tuple(row) + (None,) * width)[:width]
+            if positions is not None:
+                row = tuple(row[i] for i in positions)
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield pd.DataFrame(batch, columns=columns,
+                                   index=pd.RangeIndex(start, start + len(batch)))
+                start += len(batch)
+                batch = []
+        if batch or start == 0:
+            yield pd.DataFrame(batch, columns=columns,
+                               index=pd.RangeIndex(start, start + len(batch)))
+    finally:
+        workbook.close()
+
+
+class StreamingExcelWriter:
+    """
+    只写模式的Excel写入器
+
+    每批数据追加到工作表后即可释放，整个工作簿不会驻留在内存中。
+    可用add_sheet依次写入多个工作表。
+    """
+
+    def __init__(self, output_file, sheet_name='Sheet1'):
+        """
+        Args:
+            output_file (str): 输出文件路径，也可以是可写的二进制文件对象（如BytesIO）
+            sheet_name (str): 第一个工作表的名称
+        """
+        self.output_file = output_file
+        self._workbook = Workbook(write_only=True)
+        self.rows_written = 0
+        self.add_sheet(sheet_name)
+
+    def add_sheet(self, sheet_name):
+        """
+        新建工作表，之后的write写入该工作表
+
+        Args:
+            sheet_name (str): 工作表名称
+        """
+        self._sheet = self._workbook.create_sheet(title=sheet_name)
+        self.columns = None
+
+    def write(self, df):
+        """
+        追加一批数据，第一批的列名作为表头
+
+        Args:
+            df (pd.DataFrame): 要写入的数据，写入当前工作表
+        """
+        if self.columns is None:
+            self.columns = list(df.columns)
+            self._sheet.append(self.columns)
+        # 空值写为空单元格，与to_excel一致
+        values = df[self.columns].astype(object)
+        values = values.where(values.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            self._sheet.append(row)
+        self.rows_written += len(df)
+
+    def close(self):
+        """保存并关闭工作簿"""
+        self._workbook.save(self.output_file)
+        self._workbook.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        return False
+
+
+def write_excel(df, output_file, sheet_name='Sheet1', batch_size=10000):
+    """
+    以只写模式写出整个DataFrame，逐批转换数据，避免像to_excel那样为每个单元格创建对象
+
+    Args:
+        df (pd.DataFrame): 要写入的数据
+        output_file (str): 输出文件路径或可写的二进制文件对象
+        sheet_name (str): 工作表名称
+        batch_size (int): 每批转换的行数
+    """
+    write_excel_sheets([(sheet_name, df)], output_file, batch_size=batch_size)
+
+
+def write_excel_sheets(sheets, output_file, batch_size=10000):
+    """
+    以只写模式把多个DataFrame写入同一个工作簿
+
+    Args:
+        sheets (list): [(工作表名称, DataFrame), ...]，按顺序写入
+        output_file (str): 输出文件路径或可写的二进制文件对象
+        batch_size (int): 每批转换的行数
+    """
+    with StreamingExcelWriter(output_file, sheet_name=sheets[0][0]) as writer:
+        for i, (sheet_name, df) in enumerate(sheets):
+            if i > 0:
+                writer.add_sheet(sheet_name)
+            for start in range(0, max(len(df), 1), batch_size):
+                writer.write(df.iloc[start:start + batch_size])
@@ -3,300 +3,247 @@
 """
 剂型打标程序
 用于对Excel表格中的Pack form列进行智能打标和标准化
+
+label_texts、standardize_values等逐条处理的接口不依赖pandas；
+pandas和openpyxl只在处理DataFrame和Excel文件时按需导入
 """
 
-import pandas as pd
+import argparse
+import collections
+import functools
+import glob
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import BytesIO
+import numpy as np
 import re
 import warnings
+from pack_form_cache import InputCache, LabelCache
+from pack_form_matchers import AhoCorasickMatcher, CompiledRegexMatcher, split_leading_literal
+from pack_form_metrics import RunMetrics, merge_metrics, track, write_jsonl, write_prometheus
+from pack_form_rules import load_rules, rules_checksum
+from pack_form_stats import LabelStats
 warnings.filterwarnings('ignore')
 
+def normalize_pack_form(pack_form):
+    """
+    归一化剂型名称：忽略大小写，标点和连续空白统一为单个空格
+    
+    Args:
+        pack_form (str): 剂型名称
+        
+    Returns:
+        str: 归一化后的剂型名称，例如 'Fl. Oz.' -> 'fl oz'
+    """
+    return re.sub(r'[\W_]+', ' ', pack_form.casefold()).strip()
+
+def is_missing(value):
+    """
+    判断标量是否为空值，与pd.isna一致但不需要导入pandas
+    
+    Args:
+        value: 任意标量
+        
+    Returns:
+        bool: None、NaN、NaT和pd.NA返回True
+    """
+    if value is None:
+        return True
+    if isinstance(value, str):
+        return False
+    pandas = sys.modules.get('pandas')
+    if pandas is not None:
+        # 值可能是pd.NA或pd.NaT，交给pandas判断
+        return pandas.api.types.is_scalar(value) and bool(pandas.isna(value))
+    try:
+        return bool(value != value)
+    except (TypeError, ValueError):
+        return False
+
+# label_texts的结果：产品描述、分类结果（未检测到剂型时为None）、检测到的剂型数量、匹配文本、置信度
+LabelResult = collections.namedtuple(
+    'LabelResult', ['text', 'pack_form', 'form_count', 'match_source', 'confidence_score']
+)
+# standardize_values的结果：原剂型名称、标准化结果、是否被修改
+StandardizeResult = collections.namedtuple('StandardizeResult', ['value', 'standardized', 'changed'])
+
+# 剂型位掩码最多64位（含Others）；分类编码为int8，剂型数加空值和Bundle不会超出其范围
+MAX_PACK_FORMS = 64
+
 class PackFormLabeler:
-    def __init__(self):
-        """初始化剂型分类和正则表达式模式"""
-        self.pack_forms = {
-            'Capsule': [
-                # 英文
-                r'\bcapsule\b', r'\bcapsules\b', r'\bcap\b', r'\bcaps\b',
-                r'\bgelcap\b', r'\bgelcaps\b', 
-                # 中文
-                r'\b胶囊\b', r'\b软胶囊\b', r'\b硬胶囊\b', r'\b肠溶胶囊\b',
-                r'\b缓释胶囊\b', r'\b控释胶囊\b'
-            ],
-            'Tablet': [
-                # 英文
-                r'\btablet\b',r'\bcaplet\b', r'\btablets\b', r'\btab\b', r'\btabs\b',
-                r'\bchewable\b',    r'\bchewables\b', r'\bsublingual\b', r'\benteric\b', r'\bCaplets\b', 
-                # 中文
-                r'\b片剂\b', r'\b片\b', r'\b咀嚼片\b', r'\b含片\b',
-                r'\b舌下片\b', r'\b肠溶片\b', r'\b缓释片\b', r'\b控释片\b'
-            ],
-            'Powder': [
-                # 英文
-                r'\bpowder\b', r'\bpowders\b', r'\bpwd\b', r'\bgranule\b',
-                r'\bgranules\b', r'\bdrink\b', r'\bdrinks\b',r'\bCrystal\b',
-                # 中文
-                r'\b粉剂\b', r'\b粉末\b', r'\b冲剂\b', r'\b散剂\b',
-                r'\b颗粒剂\b', r'\b冲饮\b', r'\b饮品\b'
-            ],
-            'Gummy': [
-                # 英文
-                r'\bgummy\b', r'\bgummies\b',r'\bGummy\b', r'\bGummies\b',
-                r'\bcandy\b', r'\bcandies\b', r'\bjelly\b', r'\bjellies\b',
-                # 中文
-                r'软糖', r'咀嚼糖', r'果冻', r'糖果',
-                r'口香糖', r'咀嚼片'
-            ],
-            'Drop': [
-                # 英文
-                r'\bdrop\b', r'\bdrops\b', r'\btincture\b', r'\btinctures\b',
-                r'\bessence\b', r'\bessences\b', r'\bFL OZs\b',
-                r'\bliquid\s*drop\b', r'\bliquid\s*drops\b',
-                # 中文
-                r'滴剂', r'滴液', r'酊剂', r'精华',
-                r'精华液', r'液体滴剂', r'液体滴液'
-            ],
-            'Softgel': [
-                # 英文
-                r'\bsoftgel\b', r'\bsoftgels\b', r'\bsoft\s*gel\b',
-                r'\bgel\b', r'\bgels\b', r'\bgelatin\b',
-                # 中文
-                r'软胶囊', r'软胶', r'明胶'
-            ],
-            'Liquid': [
-                # 英文
-                r'\bliquid\b', r'\bliquids\b', r'\bsyrup\b', r'\bsyrups\b',
-                r'\bsuspension\b', r'\bsuspensions\b', r'\belixir\b',
-                r'\bsolution\b', r'\bsolutions\b', r'\bemulsion\b',
-                # 中文
-                r'液体', r'口服液', r'糖浆', r'混悬液',
-                r'溶液', r'乳剂', r'水剂'
-            ],
-            'Cream': [
-                # 英文
-                r'\bcream\b', r'\bcreams\b', r'\bointment\b', r'\bointments\b',
-                # 中文
-                r'乳膏', r'霜剂', r'软膏', r'膏剂'
-            ],
-            'Spray': [
-                # 英文
-                r'\bspray\b', r'\bsprays\b', r'\binhaler\b', r'\binhalers\b',
-                # 中文
-                r'喷雾', r'喷剂', r'吸入器', r'吸入剂'
-            ],
-            'Lotion': [
-                # 英文
-                r'\blotion\b', r'\blotions\b',
-                # 中文
-                r'乳液', r'洗剂'
-            ],
-            'Patch': [
-                # 英文
-                r'\bpatch\b', r'\bpatches\b',
-                # 中文
-                r'贴剂', r'贴片', r'贴膏'
-            ],
-            'Suppository': [
-                # 英文
-                r'\bsuppository\b', r'\bsuppositories\b',
-                # 中文
-                r'栓剂', r'坐药'
-            ],
-            'Oil': [
-                # 英文
-                r'\boil\b', r'\boils\b', r'\boils\b',
-                r'\bessential\s*oil\b', r'\bessential\s*oils\b',
-                r'\bfish\s*oil\b', r'\bomega\s*oil\b',
-                r'\bcarrier\s*oil\b', r'\bcarrier\s*oils\b',
-                # 中文
-                r'油', r'精油', r'鱼油', r'植物油', r'橄榄油',
-                r'椰子油', r'亚麻籽油', r'月见草油'
-            ]
+    # 可选的匹配引擎：compiled为预编译单次扫描，automaton为关键词自动机，
+    # legacy为逐条正则匹配
+    ENGINES = ('compiled', 'automaton', 'legacy')
+    # process_dataframe的处理模式：loop为逐行处理，vectorized为按列批量处理，
+    # dedup为对去重后的产品标题打标再回填到各行
+    PROCESS_MODES = ('loop', 'vectorized', 'dedup')
+    # 打标时新增的列
+    LABEL_COLUMNS = [
+        'Matched_Pack_Form', 'Match_Source', 'Is_Originally_Empty',
+        'Confidence_Score', 'Standardization_Applied'
+    ]
+
+    def __init__(self, engine='compiled', cache_size=100000, label_cache=None, rules=None):
+        """
+        加载剂型规则并编译匹配器
+        
+        Args:
+            engine (str): 匹配引擎，'compiled'（默认）、'automaton' 或 'legacy'
+            cache_size (int): 按产品标题缓存打标结果的LRU容量，0表示不缓存
+            label_cache (LabelCache): 可选的持久化打标缓存，dedup模式下使用
+            rules (str|dict): 规则包路径（.json/.yaml）或已加载的规则包，默认为 rules/pack_form_rules.json
+        """
+        if engine not in self.ENGINES:
+            raise ValueError(f"未知的匹配引擎: {engine}，可选: {list(self.ENGINES)}")
+        self.engine = engine
+
+        self.cache_size = cache_size
+        self.label_cache = label_cache
+        self._apply_rules(rules if isinstance(rules, dict) else load_rules(rules))
+    
+    def __getstate__(self):
+        """序列化时只保留规则表和配置，编译结果和缓存在反序列化时重建"""
+        return {
+            'engine': self.engine,
+            'cache_size': self.cache_size,
+            'label_cache': self.label_cache,
+            'rules_version': self.rules_version,
+            'rules_path': self.rules_path,
+            '_rules_mtime': self._rules_mtime,
+            'pack_forms': self.pack_forms,
+            'standardization_map': self.standardization_map,
+            'others_patterns': self.others_patterns
         }
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._compile_rules()
+    
+    def _apply_rules(self, rules):
+        """使用规则包中的规则表"""
+        self.rules_version = rules.get('version')
+        self.rules_path = rules.get('path')
+        self._rules_mtime = rules.get('mtime')
+        self.pack_forms = rules['pack_forms']
+        self.standardization_map = rules['standardization_map']
+        self.others_patterns = rules['others_patterns']
+        self._compile_rules()
+    
+    def reload_rules(self, rules=None):
+        """
+        重新加载规则包，长时间运行的进程无需重启即可使用新规则
+        
+        新规则编译完成后才替换当前规则，编译失败时保留原规则；
+        打标结果缓存随之清空，持久化缓存因规则集指纹变化自动失效。
+        
+        Args:
+            rules (str|dict): 规则包路径或已加载的规则包，默认重新读取当前规则文件
+        """
+        if rules is None:
+            rules = self.rules_path
+        reloaded = PackFormLabeler(engine=self.engine, cache_size=self.cache_size,
+                                   label_cache=self.label_cache, rules=rules)
+        self.__dict__.update(reloaded.__dict__)
+    
+    def reload_rules_if_changed(self):
+        """
+        规则文件被修改时重新加载
+        
+        Returns:
+            bool: 是否重新加载了规则
+        """
+        if self.rules_path is None or not os.path.exists(self.rules_path):
+            return False
+        if os.path.getmtime(self.rules_path) == self._rules_mtime:
+            return False
+        self.reload_rules()
+        return True
+    
+    def _compile_rules(self):
+        """根据当前规则表构建标准化索引、匹配器和缓存"""
+        # 规则集指纹：规则表的任何改动都会改变指纹，使持久化缓存自动失效
+        self._ruleset_fingerprint = rules_checksum(self.__dict__)[:16]
+        
+        # 标准化索引：归一化后的剂型名 -> 标准剂型，构造时一次性构建
+        self._standardization_index = {}
+        for term, standard_form in self.standardization_map.items():
+            self._standardization_index.setdefault(normalize_pack_form(term), standard_form)
+        # 索引中没有的剂型名才需要正则匹配，结果按剂型名缓存
+        self._standardize_by_patterns_cached = functools.lru_cache(maxsize=10000)(
+            self._standardize_by_patterns
+        )
+        
+        self._build_classification_table()
+        
+        # 构造时一次性编译所有模式
+        self._column_patterns = None
+        self._matcher = None
+        if self.engine == 'compiled':
+            self._matcher = CompiledRegexMatcher(self.pack_forms, self.others_patterns)
+        elif self.engine == 'automaton':
+            self._matcher = AhoCorasickMatcher(self.pack_forms, self.others_patterns)
+        
+        # 按产品标题缓存打标结果，跨多次调用复用
+        self._label_product_cached = functools.lru_cache(maxsize=self.cache_size)(self._label_product)
+    
+    def _build_classification_table(self):
+        """
+        预计算剂型位掩码到分类结果的查找表
+        
+        每个剂型（含Others）占一位，一行检测到的剂型集合即为一个整数掩码；
+        分类编码0表示未检测到剂型，其余编码对应 _class_labels 中的剂型名或Bundle。
+        掩码类型按剂型数量选择：不超过32个为uint32，不超过64个为uint64，更多时无法表示。
+        """
+        forms = list(self.pack_forms) + ['Others']
+        if len(forms) > MAX_PACK_FORMS:
+            raise ValueError(
+                f"规则包的剂型数量（含Others）为 {len(forms)}，超过上限 {MAX_PACK_FORMS}"
+            )
+        self._mask_dtype = np.uint32 if len(forms) <= 32 else np.uint64
+        self._form_bits = {form: 1 << i for i, form in enumerate(forms)}
+        self._class_labels = np.array([None] + forms + ['Bundle'], dtype=object)
+        self._class_codes = {label: code for code, label in enumerate(self._class_labels)}
+        # Matched_Pack_Form列的取值：未检测到剂型的行为空字符串
+        self._matched_labels = np.array([''] + forms + ['Bundle'], dtype=object)
+        
+        # 剂型数量过多时查找表过大，改为按出现过的掩码逐个分类
+        self._class_table = None
+        if len(forms) <= 16:
+            masks = np.arange(1 << len(forms), dtype=self._mask_dtype)
+            self._class_table = self._classify_mask_array(masks)
+    
+    def _classify_mask_array(self, masks):
+        """按classify_pack_form的规则对一组掩码分类，返回分类编码"""
+        form_count = np.zeros(len(masks), dtype=np.int8)
+        for bit in self._form_bits.values():
+            form_count += (masks & bit) > 0
+        codes = np.zeros(len(masks), dtype=np.int8)
+        # 单一剂型取剂型名，多个剂型为Bundle，同时有Liquid和Drop时为Drop
+        for form, bit in self._form_bits.items():
+            codes[masks == bit] = self._class_codes[form]
+        codes[form_count > 1] = self._class_codes['Bundle']
+        if 'Liquid' in self._form_bits and 'Drop' in self._form_bits:
+            liquid_drop = self._form_bits['Liquid'] | self._form_bits['Drop']
+            codes[(masks & liquid_drop) == liquid_drop] = self._class_codes['Drop']
+        return codes
+    
+    def _classify_masks(self, masks):
+        """
+        查表得到一组剂型掩码的分类编码
         
-        # 标准化映射表 
-        self.standardization_map = {
-    # ========================================
-    # Capsule 相关
-    # ========================================
-    'capsule': 'Capsule', 'capsules': 'Capsule',
-    'cap': 'Capsule', 'caps': 'Capsule', 'capsu': 'Capsule',
-    'gelcaps': 'Capsule', 'gelcap': 'Capsule',
-    # 首字母大写
-    'Capsule': 'Capsule', 'Capsules': 'Capsule','VegCap': 'Capsule',
-    'Cap': 'Capsule', 'Caps': 'Capsule', 'Capsu': 'Capsule',
-    'Gelcaps': 'Capsule', 'Gelcap': 'Capsule',
-    # 全大写
-    'CAPSULE': 'Capsule', 'CAPSULES': 'Capsule',
-    'CAP': 'Capsule', 'CAPS': 'Capsule', 'CAPSU': 'Capsule',
-    'GELCAPS': 'Capsule', 'GELCAP': 'Capsule',
-
-    # ========================================
-    # Tablet 相关（包含 caplet）
-    # ========================================
-    'tablet': 'Tablet', 'tablets': 'Tablet',
-    'tab': 'Tablet', 'tabs': 'Tablet',
-    'caplet': 'Tablet', 'caplets': 'Tablet',  # ✅ 正确归类到 Tablet
-    'chewable': 'Tablet', 'chewables': 'Tablet',
-    'chew': 'Tablet', 'chews': 'Tablet',
-    'sublingual': 'Tablet', 'enteric': 'Tablet',
-    # 首字母大写
-    'Tablet': 'Tablet', 'Tablets': 'Tablet',
-    'Tab': 'Tablet', 'Tabs': 'Tablet',
-    'Caplet': 'Tablet', 'Caplets': 'Tablet',  # ✅ 首字母大写也归为 Tablet
-    'Chewable': 'Tablet', 'Chewables': 'Tablet',
-    'Chew': 'Tablet', 'Chews': 'Tablet',
-    'Sublingual': 'Tablet', 'Enteric': 'Tablet',
-    # 全大写
-    'TABLET': 'Tablet', 'TABLETS': 'Tablet',
-    'TAB': 'Tablet', 'TABS': 'Tablet',
-    'CAPLET': 'Tablet', 'CAPLETS': 'Tablet',  # ✅ 全大写也正确映射
-    'CHEWABLE': 'Tablet', 'CHEWABLES': 'Tablet',
-    'CHEW': 'Tablet', 'CHEWS': 'Tablet',
-    'SUBLINGUAL': 'Tablet', 'ENTERIC': 'Tablet',
-
-    # ========================================
-    # Powder 相关
-    # ========================================
-    'powder': 'Powder', 'powders': 'Powder','Powdered': 'Powder',
-    'granule': 'Powder', 'granules': 'Powder',
-    'Crystals': 'Powder','Crystal': 'Powder','crystal': 'Powder','crystals': 'Powder',
-    'pwd': 'Powder',
-    'Powder': 'Powder', 'Powders': 'Powder',
-    'Granule': 'Powder', 'Granules': 'Powder',
-    'Pwd': 'Powder',
-    'POWDER': 'Powder', 'POWDERS': 'Powder',
-    'GRANULE': 'Powder', 'GRANULES': 'Powder',
-    'PWD': 'Powder',
-
-    # ========================================
-    # Gummy 相关
-    # ========================================
-    'gummy': 'Gummy', 'gummies': 'Gummy',
-    'jelly': 'Gummy', 'jellies': 'Gummy',
-    'gumm': 'Gummy',
-    'Gummy': 'Gummy', 'Gummies': 'Gummy',
-    'Jelly': 'Gummy', 'Jellies': 'Gummy',
-    'Gumm': 'Gummy',
-    'GUMMY': 'Gummy', 'GUMMIES': 'Gummy',
-    'JELLY': 'Gummy', 'JELLIES': 'Gummy',
-    'GUMM': 'Gummy',
-
-    # ========================================
-    # Drop 相关
-    # ========================================
-    'drop': 'Drop', 'drops': 'Drop',
-    'tincture': 'Drop', 'tinctures': 'Drop',
-    'fl oz': 'Drop', 'fl. oz.': 'Drop',
-    'Drop': 'Drop', 'Drops': 'Drop',
-    'Tincture': 'Drop', 'Tinctures': 'Drop',
-    'Fl Oz': 'Drop', 'Fl. Oz.': 'Drop',
-    'DROP': 'Drop', 'DROPS': 'Drop',
-    'TINCTURE': 'Drop', 'TINCTURES': 'Drop',
-    'FL OZ': 'Drop', 'FL. OZ.': 'Drop',
-
-    # ========================================
-    # Softgel 相关
-    # ========================================
-    'softgel': 'Softgel', 'softgels': 'Softgel','sof': 'Softgel',
-    'gel': 'Softgel', 'gels': 'Softgel',
-    'Softgel': 'Softgel', 'Softgels': 'Softgel',
-    'Gel': 'Softgel', 'Gels': 'Softgel',
-    'SOFTGEL': 'Softgel', 'SOFTGELS': 'Softgel',
-    'GEL': 'Softgel', 'GELS': 'Softgel',
-
-    # ========================================
-    # Liquid 相关
-    # ========================================
-    'liquid': 'Liquid', 'liquids': 'Liquid',
-    'syrup': 'Liquid', 'syrups': 'Liquid',
-    'solution': 'Liquid', 'solutions': 'Liquid',
-    'suspension': 'Liquid', 'suspensions': 'Liquid',
-    'Liquid': 'Liquid', 'Liquids': 'Liquid',
-    'Syrup': 'Liquid', 'Syrups': 'Liquid',
-    'Solution': 'Liquid', 'Solutions': 'Liquid',
-    'Suspension': 'Liquid', 'Suspensions': 'Liquid',
-    'LIQUID': 'Liquid', 'LIQUIDS': 'Liquid',
-    'SYRUP': 'Liquid', 'SYRUPS': 'Liquid',
-    'SOLUTION': 'Liquid', 'SOLUTIONS': 'Liquid',
-    'SUSPENSION': 'Liquid', 'SUSPENSIONS': 'Liquid',
-
-    # ========================================
-    # Cream 相关
-    # ========================================
-    'cream': 'Cream', 'creams': 'Cream',
-    'ointment': 'Cream', 'ointments': 'Cream',
-    'Cream': 'Cream', 'Creams': 'Cream',
-    'Ointment': 'Cream', 'Ointments': 'Cream',
-    'CREAM': 'Cream', 'CREAMS': 'Cream',
-    'OINTMENT': 'Cream', 'OINTMENTS': 'Cream',
-
-    # ========================================
-    # Spray 相关
-    # ========================================
-    'spray': 'Spray', 'sprays': 'Spray',
-    'inhaler': 'Spray', 'inhalers': 'Spray',
-    'Spray': 'Spray', 'Sprays': 'Spray',
-    'Inhaler': 'Spray', 'Inhalers': 'Spray',
-    'SPRAY': 'Spray', 'SPRAYS': 'Spray',
-    'INHALER': 'Spray', 'INHALERS': 'Spray',
-
-    # ========================================
-    # Lotion 相关
-    # ========================================
-    'lotion': 'Lotion', 'lotions': 'Lotion',
-    'Lotion': 'Lotion', 'Lotions': 'Lotion',
-    'LOTION': 'Lotion', 'LOTIONS': 'Lotion',
-
-    # ========================================
-    # Patch 相关
-    # ========================================
-    'patch': 'Patch', 'patches': 'Patch',
-    'Patch': 'Patch', 'Patches': 'Patch',
-    'PATCH': 'Patch', 'PATCHES': 'Patch',
-
-    # ========================================
-    # Suppository 相关
-    # ========================================
-    'suppository': 'Suppository', 'suppositories': 'Suppository',
-    'Suppository': 'Suppository', 'Suppositories': 'Suppository',
-    'SUPPOSITORY': 'Suppository', 'SUPPOSITORIES': 'Suppository',
-
-    # ========================================
-    # Oil 相关
-    # ========================================
-    'oil': 'Oil', 'oils': 'Oil',
-    'essential oil': 'Oil', 'essential oils': 'Oil',
-    'fish oil': 'Oil', 'omega oil': 'Oil',
-    'carrier oil': 'Oil', 'carrier oils': 'Oil',
-    'Oil': 'Oil', 'Oils': 'Oil',
-    'Carrier Oil': 'Oil', 'Carrier Oils': 'Oil',
-    'OIL': 'Oil', 'OILS': 'Oil',
-    'CARRIER OIL': 'Oil', 'CARRIER OILS': 'Oil',
-
-    # ========================================
-    # Others 相关
-    # ========================================
-    'bag': 'Others', 'bags': 'Others','Tea bags': 'Others',
-    'teabag': 'Others', 'teabags': 'Others',
-    'strip': 'Others', 'strips': 'Others',
-    'stick': 'Others', 'sticks': 'Others',
-    'other': 'Others', 'others': 'Others',
-    'strippy': 'Others',
-    # 首字母大写
-    'Bag': 'Others', 'Bags': 'Others',
-    'Teabag': 'Others', 'Teabags': 'Others',
-    'Strip': 'Others', 'Strips': 'Others',
-    'Stick': 'Others', 'Sticks': 'Others',
-    'Other': 'Others', 'Others': 'Others',
-    'Strippy': 'Others',
-    # 全大写
-    'BAG': 'Others', 'BAGS': 'Others',
-    'TEABAG': 'Others', 'TEABAGS': 'Others',
-    'STRIP': 'Others', 'STRIPS': 'Others',
-    'STICK': 'Others', 'STICKS': 'Others',
-    'OTHER': 'Others', 'OTHERS': 'Others',
-    'STRIPPY': 'Others',
-    }
+        Args:
+            masks (np.ndarray): 剂型位掩码
+            
+        Returns:
+            np.ndarray: 分类编码，可用 _class_labels 转换为剂型名
+        """
+        if self._class_table is not None:
+            return self._class_table[masks]
+        unique_masks, inverse = np.unique(masks, return_inverse=True)
+        return self._classify_mask_array(unique_masks)[inverse]
     
     def detect_others_forms(self, product_text):
         """
@@ -308,24 +255,15 @@ class PackFormLabeler:
         Returns:
             list: 检测到的Others类剂型列表
         """
-        if pd.isna(product_text) or not isinstance(product_text, str):
+        if not isinstance(product_text, str):
             return []
         
-        others_patterns = {
-            'Injection': [r'\binjection\b', r'\binjections\b', r'注射剂', r'针剂'],
-            'Nasal': [r'\bnasal\b', r'鼻用', r'鼻腔'],
-            'Topical': [r'\btopical\b', r'外用', r'局部'],
-            'External': [r'\bexternal\b', r'外用', r'外部'],
-            'Bag': [r'\bbag\b', r'\bbags\b', r'袋装', r'包装'],
-            'Teabag': [r'\bteabag\b', r'\bteabags\b', r'茶包', r'袋泡茶'],
-            'Strip': [r'\bstrip\b', r'\bstrips\b', r'条装', r'条剂'],
-            'Stick': [r'\bstick\b', r'\bsticks\b', r'棒状', r'棒剂']
-        }
-        
-        detected_others = []
         text_lower = product_text.lower()
+        if self._matcher is not None:
+            return self._matcher.detect_others(text_lower)
         
-        for form, patterns in others_patterns.items():
+        detected_others = []
+        for form, patterns in self.others_patterns.items():
             for pattern in patterns:
                 if re.search(pattern, text_lower, re.IGNORECASE):
                     detected_others.append(form)
@@ -343,16 +281,21 @@ class PackFormLabeler:
         Returns:
             str: 标准化后的剂型名称
         """
-        if pd.isna(pack_form) or pack_form == '':
+        if is_missing(pack_form) or pack_form == '':
             return pack_form
         
         # 转换为字符串
         pack_form_str = str(pack_form).strip()
         
-        # 检查是否已经在标准映射表中
-        if pack_form_str in self.standardization_map:
-            return self.standardization_map[pack_form_str]
+        # 检查归一化后是否在标准化索引中
+        standard_form = self._standardization_index.get(normalize_pack_form(pack_form_str))
+        if standard_form is not None:
+            return standard_form
         
+        return self._standardize_by_patterns_cached(pack_form_str)
+    
+    def _standardize_by_patterns(self, pack_form_str):
+        """用剂型正则匹配标准化索引中没有的剂型名称"""
         # 检查是否匹配正则表达式模式
         for standard_form, patterns in self.pack_forms.items():
             for pattern in patterns:
@@ -372,15 +315,19 @@ class PackFormLabeler:
         Returns:
             tuple: (检测到的剂型列表, 匹配的文本列表)
         """
-        if pd.isna(product_text) or not isinstance(product_text, str):
+        if not isinstance(product_text, str):
             return [], []
         
-        detected_forms = []
-        matched_texts = []
-        
         # 转换为小写进行匹配
         text_lower = product_text.lower()
         
+        # 预编译引擎：单次扫描完成所有模式的匹配
+        if self._matcher is not None:
+            return self._matcher.detect(text_lower)
+        
+        detected_forms = []
+        matched_texts = []
+        
         # 检查主要剂型
         for form, patterns in self.pack_forms.items():
             for pattern in patterns:
@@ -424,16 +371,200 @@ class PackFormLabeler:
         else:
             return 'Others'
     
-    def process_dataframe(self, df):
+    def _label_product(self, product_text):
+        """对单个产品描述检测并分类剂型（未缓存）"""
+        detected_forms, matched_texts = self.detect_pack_form(product_text)
+        if not detected_forms:
+            return 0, None, ''
+        mask = 0
+        for form in detected_forms:
+            mask |= self._form_bits[form]
+        if self._class_table is not None:
+            classified = self._class_labels[self._class_table[mask]]
+        else:
+            classified = self._class_labels[self._classify_masks(np.array([mask], dtype=self._mask_dtype))[0]]
+        return len(detected_forms), classified, ', '.join(matched_texts)
+    
+    def label_product(self, product_text):
+        """
+        对单个产品描述打标，结果按标题缓存在LRU中
+        
+        Args:
+            product_text (str): 产品描述文本
+            
+        Returns:
+            tuple: (检测到的剂型数量, 分类结果, 匹配文本)，未检测到剂型时分类结果为None
+        """
+        return self._label_product_cached(product_text)
+    
+    def label_texts(self, texts, batch_size=1024):
+        """
+        逐条打标任意可迭代的产品描述（如JSONL文件的行、数据库游标），惰性产出结果
+        
+        每次从texts中读取batch_size条，批内去重后打标（启用持久化缓存时批量查询），
+        内存占用只与batch_size有关；不需要pandas。
+        
+        Args:
+            texts (iterable): 产品描述，非字符串的值视为空标题
+            batch_size (int): 每批读取的条数
+            
+        Yields:
+            LabelResult: 与texts逐条对应的打标结果
+        """
+        iterator = iter(texts)
+        while True:
+            batch = list(itertools.islice(iterator, batch_size))
+            if not batch:
+                return
+            uniques = list(dict.fromkeys(text for text in batch if isinstance(text, str)))
+            labels = dict(zip(uniques, self._label_values(uniques)))
+            for text in batch:
+                form_count, classified, match_source = labels[text] if isinstance(text, str) else (0, None, '')
+                yield LabelResult(text, classified, form_count, match_source, min(form_count / 2.0, 1.0))
+    
+    def standardize_values(self, values):
+        """
+        逐条标准化任意可迭代的剂型名称，惰性产出结果，不需要pandas
+        
+        Args:
+            values (iterable): 剂型名称
+            
+        Yields:
+            StandardizeResult: 与values逐条对应的标准化结果
+        """
+        for value in values:
+            standardized = self.standardize_pack_form(value)
+            yield StandardizeResult(value, standardized, standardized is not value and standardized != value)
+    
+    def ruleset_fingerprint(self):
+        """
+        获取规则集指纹
+        
+        Returns:
+            str: 由pack_forms、standardization_map和others_patterns计算的哈希
+        """
+        return self._ruleset_fingerprint
+    
+    def cache_info(self):
+        """
+        获取打标结果缓存的统计信息
+        
+        Returns:
+            dict: 命中次数、未命中次数、当前条目数和容量
+        """
+        info = self._label_product_cached.cache_info()
+        return {
+            'hits': info.hits,
+            'misses': info.misses,
+            'size': info.currsize,
+            'maxsize': info.maxsize
+        }
+    
+    def cache_clear(self):
+        """清空打标结果缓存"""
+        self._label_product_cached.cache_clear()
+    
+    def process_dataframe(self, df, mode='loop', workers=1, chunk_size=50000, metrics=None,
+                          progress=None, categorical=False, inplace=False, stats=None):
         """
         处理DataFrame，对Pack form列进行智能打标和标准化
         
         Args:
             df (pd.DataFrame): 包含'Pack form'和'Product'列的DataFrame
+            mode (str): 处理模式，'loop'（默认）逐行处理，'vectorized' 按列批量处理，
+                'dedup' 对去重后的产品标题打标（结果缓存在LRU中），各模式结果逐行一致
+            workers (int): 并行进程数，1（默认）为单进程，None为CPU核数
+            chunk_size (int): 多进程时每个任务处理的行数
+            metrics (RunMetrics): 可选，记录standardization和detection阶段的耗时和行数
+            progress (callable): 可选，每处理完一个分块调用 progress(已处理行数, 总行数)，
+                设置后按chunk_size分块处理
+            categorical (bool): 是否将Pack form、Matched_Pack_Form和Match_Source列输出为
+                分类类型，取值与默认输出相同但内存占用小得多
+            inplace (bool): 是否直接修改df（替换Pack form列并追加新列）并返回df，
+                不复制整个DataFrame，宽表时可大幅降低内存峰值
+            stats (LabelStats): 可选，打标完成后把本次结果的计数、剂型分布和标准化示例累计到其中，
+                分块或流式处理时传入同一个对象即可得到整体报告
             
         Returns:
-            pd.DataFrame: 处理后的DataFrame
+            tuple: (处理后的DataFrame, 成功填充行数, 标准化行数)
+        """
+        if mode not in self.PROCESS_MODES:
+            raise ValueError(f"未知的处理模式: {mode}，可选: {list(self.PROCESS_MODES)}")
+        if inplace:
+            labels, processed_count, standardization_count = self.label_columns(
+                df, mode=mode, workers=workers, chunk_size=chunk_size, metrics=metrics,
+                progress=progress, categorical=categorical, stats=stats
+            )
+            for column in labels.columns:
+                df[column] = labels[column]
+            return df, processed_count, standardization_count
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if mode != 'loop' and progress is None and not (workers > 1 and len(df) > chunk_size):
+            result = self._process_dataframe_vectorized(
+                df, dedupe=(mode == 'dedup'), metrics=metrics, categorical=categorical
+            )
+            self._update_stats(stats, result[0], metrics)
+            return result
+        
+        if workers > 1 and len(df) > chunk_size:
+            with track(metrics, 'parallel_labeling') as stage:
+                stage['rows'] = len(df)
+                result = self._process_dataframe_parallel(df, mode, workers, chunk_size, progress)
+        elif progress is not None:
+            results = []
+            for done_rows, chunk_result in self.iter_process_chunks(df, mode, chunk_size, metrics):
+                results.append(chunk_result)
+                progress(done_rows, len(df))
+            result = self.merge_chunk_results(df, results)
+        else:
+            result = self._process_dataframe_loop(df, metrics)
+        
+        df_processed, processed_count, standardization_count = result
+        if categorical:
+            df_processed = self._to_categorical(df_processed)
+        self._update_stats(stats, df_processed, metrics)
+        return df_processed, processed_count, standardization_count
+    
+    def _update_stats(self, stats, df_processed, metrics=None):
+        """把打标结果累计到stats中（stats为None时不做任何事）"""
+        if stats is None:
+            return
+        with track(metrics, 'statistics') as stage:
+            stats.update(df_processed)
+            stage['rows'] = len(df_processed)
+    
+    def label_columns(self, df, mode='dedup', **kwargs):
         """
+        只对Pack form和Product两列打标，返回打标生成的列，不复制df的其他列
+        
+        结果可在写出时再与原数据拼接（见write_output_joined），内存占用只与这两列有关。
+        
+        Args:
+            df (pd.DataFrame): 包含'Pack form'和'Product'列的DataFrame
+            mode (str): 处理模式
+            **kwargs: 传给process_dataframe的其他参数（workers、chunk_size、metrics、progress、categorical、stats）
+            
+        Returns:
+            tuple: (与df索引对齐、只含Pack form和新增列的DataFrame, 成功填充行数, 标准化行数)
+        """
+        labeled, processed_count, standardization_count = self.process_dataframe(
+            df[['Pack form', 'Product']], mode=mode, **kwargs
+        )
+        return labeled[['Pack form'] + self.LABEL_COLUMNS], processed_count, standardization_count
+    
+    def _process_dataframe_loop(self, df, metrics=None):
+        """
+        逐行处理DataFrame
+        
+        Args:
+            df (pd.DataFrame): 包含'Pack form'和'Product'列的DataFrame
+            metrics (RunMetrics): 可选，记录各阶段的耗时和行数
+            
+        Returns:
+            tuple: (处理后的DataFrame, 成功填充行数, 标准化行数)
+        """
+        import pandas as pd
         # 复制DataFrame避免修改原始数据
         df_processed = df.copy()
         
@@ -446,94 +577,409 @@ class PackFormLabeler:
         
         # 第一步：标准化已存在的剂型
         standardization_count = 0
-        for idx, row in df_processed.iterrows():
-            if pd.notna(row['Pack form']) and row['Pack form'] != '':
-                original_form = row['Pack form']
-                standardized_form = self.standardize_pack_form(original_form)
-                
-                if standardized_form != original_form:
-                    df_processed.at[idx, 'Pack form'] = standardized_form
-                    df_processed.at[idx, 'Standardization_Applied'] = True
-                    standardization_count += 1
+        with track(metrics, 'standardization') as stage:
+            for idx, row in df_processed.iterrows():
+                if pd.notna(row['Pack form']) and row['Pack form'] != '':
+                    stage['rows'] += 1
+                    original_form = row['Pack form']
+                    standardized_form = self.standardize_pack_form(original_form)
+                    
+                    if standardized_form != original_form:
+                        df_processed.at[idx, 'Pack form'] = standardized_form
+                        df_processed.at[idx, 'Standardization_Applied'] = True
+                        standardization_count += 1
         
         # 第二步：处理空的Pack form列
         processed_count = 0
-        for idx, row in df_processed.iterrows():
-            # 只处理Pack form为空的行
-            if pd.isna(row['Pack form']) or row['Pack form'] == '':
-                product_text = row['Product']
-                detected_forms, matched_texts = self.detect_pack_form(product_text)
-                
-                if detected_forms:
-                    classified_form = self.classify_pack_form(detected_forms)
-                    
-                    # 实际填充到Pack form列
-                    df_processed.at[idx, 'Pack form'] = classified_form
+        with track(metrics, 'detection') as stage:
+            for idx, row in df_processed.iterrows():
+                # 只处理Pack form为空的行
+                if pd.isna(row['Pack form']) or row['Pack form'] == '':
+                    stage['rows'] += 1
+                    product_text = row['Product']
+                    detected_forms, matched_texts = self.detect_pack_form(product_text)
                     
-                    # 同时保存到新列
-                    df_processed.at[idx, 'Matched_Pack_Form'] = classified_form
-                    df_processed.at[idx, 'Match_Source'] = ', '.join(matched_texts)
-                    
-                    # 计算置信度分数
-                    confidence = min(len(detected_forms) / 2.0, 1.0)
-                    df_processed.at[idx, 'Confidence_Score'] = confidence
-                    
-                    processed_count += 1
+                    if detected_forms:
+                        classified_form = self.classify_pack_form(detected_forms)
+                        
+                        # 实际填充到Pack form列
+                        df_processed.at[idx, 'Pack form'] = classified_form
+                        
+                        # 同时保存到新列
+                        df_processed.at[idx, 'Matched_Pack_Form'] = classified_form
+                        df_processed.at[idx, 'Match_Source'] = ', '.join(matched_texts)
+                        
+                        # 计算置信度分数
+                        confidence = min(len(detected_forms) / 2.0, 1.0)
+                        df_processed.at[idx, 'Confidence_Score'] = confidence
+                        
+                        processed_count += 1
         
         return df_processed, processed_count, standardization_count
     
-    def generate_standardization_report(self, df_processed):
+    def iter_process_chunks(self, df, mode='loop', chunk_size=50000, metrics=None, stats=None):
         """
-        生成标准化处理报告
+        按行分块依次处理DataFrame，每处理完一块立即返回该块的结果，便于显示进度或中途停止
         
         Args:
-            df_processed (pd.DataFrame): 处理后的DataFrame
+            df (pd.DataFrame): 包含'Pack form'和'Product'列的DataFrame
+            mode (str): 每个分块使用的处理模式
+            chunk_size (int): 每个分块的行数
+            metrics (RunMetrics): 可选，累计各分块的阶段耗时和行数
+            stats (LabelStats): 可选，逐块累计打标统计
+            
+        Yields:
+            tuple: (已处理行数, (分块处理结果, 成功填充行数, 标准化行数))，
+                全部分块的结果可用merge_chunk_results合并
+        """
+        # 只处理打标需要的两列，空表也返回一个（空）分块
+        columns = df[['Pack form', 'Product']]
+        for start in range(0, max(len(df), 1), chunk_size):
+            chunk = columns.iloc[start:start + chunk_size]
+            yield start + len(chunk), self.process_dataframe(chunk, mode=mode, metrics=metrics, stats=stats)
+    
+    def merge_chunk_results(self, df, results):
+        """
+        按原顺序合并分块处理结果，写回原DataFrame的副本
+        
+        Args:
+            df (pd.DataFrame): 被分块处理的原DataFrame
+            results (list): 各分块的 (分块处理结果, 成功填充行数, 标准化行数)，按分块顺序排列
             
         Returns:
-            dict: 标准化报告
-        """
-        report = {
-            'total_rows': len(df_processed),
-            'standardization_applied': df_processed['Standardization_Applied'].sum(),
-            'originally_empty': df_processed['Is_Originally_Empty'].sum(),
-            'successfully_filled': 0,
-            'final_empty': 0,
-            'pack_form_distribution': {},
-            'standardization_examples': []
-        }
+            tuple: (处理后的DataFrame, 成功填充行数, 标准化行数)
+        """
+        import pandas as pd
+        labeled = pd.concat([result[0] for result in results])
+        processed_count = sum(result[1] for result in results)
+        standardization_count = sum(result[2] for result in results)
+        
+        df_processed = df.copy()
+        for column in ['Pack form'] + self.LABEL_COLUMNS:
+            df_processed[column] = labeled[column].set_axis(df.index)
         
-        # 计算填充统计
-        report['successfully_filled'] = report['originally_empty'] - df_processed['Pack form'].isna().sum()
-        report['final_empty'] = df_processed['Pack form'].isna().sum()
+        return df_processed, processed_count, standardization_count
+    
+    def _get_column_patterns(self):
+        """
+        获取按剂型编译的正则（首次调用时构建）
+        
+        Returns:
+            tuple: ([(剂型, 剂型组合正则, [各模式正则])], [(Others类剂型, 组合正则)])
+        """
+        if self._column_patterns is None:
+            def combine(patterns, flags=0):
+                return re.compile(
+                    '|'.join(f'(?:{split_leading_literal(p)[1]})' for p in patterns), flags
+                )
+            
+            forms = [
+                (form, combine(patterns), [re.compile(p) for p in patterns])
+                for form, patterns in self.pack_forms.items()
+            ]
+            others = [
+                (form, combine(patterns, re.IGNORECASE))
+                for form, patterns in self.others_patterns.items()
+            ]
+            self._column_patterns = (forms, others)
+        return self._column_patterns
+    
+    def _detect_column(self, products):
+        """
+        按列检测剂型，结果与逐行调用detect_pack_form和classify_pack_form一致
         
-        # 剂型分布
-        pack_form_counts = df_processed['Pack form'].value_counts()
-        report['pack_form_distribution'] = pack_form_counts.to_dict()
+        Args:
+            products (pd.Series): 产品描述列
+            
+        Returns:
+            tuple: (检测到的剂型数量, 分类编码, 匹配文本)，均为与products按位置对齐的数组
+        """
+        rows = len(products)
+        form_count = np.zeros(rows, dtype=int)
+        masks = np.zeros(rows, dtype=self._mask_dtype)
+        match_source = np.full(rows, '', dtype=object)
+        has_source = np.zeros(rows, dtype=bool)
         
-        # 标准化示例
-        standardized_rows = df_processed[df_processed['Standardization_Applied'] == True]
-        if len(standardized_rows) > 0:
-            for idx, row in standardized_rows.head(10).iterrows():
-                report['standardization_examples'].append({
-                    'row': idx + 1,
-                    'product': str(row['Product'])[:80] + "..." if len(str(row['Product'])) > 80 else str(row['Product']),
-                    'pack_form': row['Pack form']
-                })
+        is_text = products.map(lambda value: isinstance(value, str)).to_numpy(dtype=bool)
+        text_positions = np.flatnonzero(is_text)
+        if len(text_positions) == 0:
+            return form_count, self._classify_masks(masks), match_source
         
-        return report
+        # 转换为小写进行匹配
+        lower = products.iloc[text_positions].astype(object).str.lower()
+        
+        def append_source(positions, texts):
+            separators = np.where(has_source[positions], ', ', '').astype(object)
+            match_source[positions] = match_source[positions] + separators + texts
+            has_source[positions] = True
+        
+        forms, others = self._get_column_patterns()
+        
+        # 检查主要剂型：先用剂型组合正则筛选，再逐条模式取出匹配文本
+        for form, combined, compiled_patterns in forms:
+            contains = lower.str.contains(combined).to_numpy(dtype=bool)
+            if not contains.any():
+                continue
+            candidates = lower[contains]
+            candidate_positions = text_positions[contains]
+            bit = self._form_bits[form]
+            for compiled in compiled_patterns:
+                found = candidates.str.findall(compiled)
+                hit = (found.str.len() > 0).to_numpy(dtype=bool)
+                if not hit.any():
+                    continue
+                positions = candidate_positions[hit]
+                form_count[positions] += 1
+                masks[positions] |= bit
+                append_source(positions, found[hit].str.join(', ').to_numpy(dtype=object))
+        
+        # 检查Others类剂型
+        others_hit = np.zeros(rows, dtype=bool)
+        for form, combined in others:
+            contains = lower.str.contains(combined).to_numpy(dtype=bool)
+            if not contains.any():
+                continue
+            positions = text_positions[contains]
+            others_hit[positions] = True
+            append_source(positions, np.full(len(positions), form, dtype=object))
+        form_count[others_hit] += 1
+        masks[others_hit] |= self._form_bits['Others']
+        
+        # 分类：按检测到的剂型掩码查表
+        return form_count, self._classify_masks(masks), match_source
+    
+    def _label_values(self, values):
+        """
+        对一组不重复的产品描述打标，启用持久化缓存时先批量查询缓存
+        
+        Args:
+            values (iterable): 不重复的产品描述
+            
+        Returns:
+            list: 与values对齐的 (检测到的剂型数量, 分类结果, 匹配文本)
+        """
+        if self.label_cache is None:
+            return [self._label_product_cached(value) for value in values]
+        
+        # 检测结果只取决于标题的小写形式，以小写文本查询缓存
+        lowered = [value.lower() if isinstance(value, str) else None for value in values]
+        cached = self.label_cache.get_many(
+            self._ruleset_fingerprint, list({text for text in lowered if text is not None})
+        )
+        
+        labels = []
+        new_results = {}
+        for value, text in zip(values, lowered):
+            label = cached.get(text) if text is not None else None
+            if label is None:
+                label = self._label_product_cached(value)
+                if text is not None:
+                    new_results[text] = label
+            labels.append(label)
+        self.label_cache.put_many(self._ruleset_fingerprint, new_results)
+        return labels
+    
+    def _detect_unique(self, products):
+        """
+        对去重后的产品描述检测剂型，再按原顺序回填
+        
+        Args:
+            products (pd.Series): 产品描述列
+            
+        Returns:
+            tuple: (检测到的剂型数量, 分类编码, 匹配文本)，均为与products按位置对齐的数组
+        """
+        import pandas as pd
+        codes, uniques = pd.factorize(products)
+        labels = self._label_values(uniques)
+        # 末尾追加空结果，对应factorize中编码为-1的空值
+        labels.append((0, None, ''))
+        
+        form_count = np.array([label[0] for label in labels], dtype=int)
+        class_codes = np.array([self._class_codes[label[1]] for label in labels], dtype=np.int8)
+        match_source = np.array([label[2] for label in labels], dtype=object)
+        return form_count[codes], class_codes[codes], match_source[codes]
+    
+    def _standardize_column(self, pack_forms):
+        """
+        标准化整列剂型名称，每个不同的取值只解析一次
+        
+        Args:
+            pack_forms (pd.Series): 非空的剂型列
+            
+        Returns:
+            np.ndarray: 与pack_forms按位置对齐的标准化结果
+        """
+        import pandas as pd
+        # 混合类型时5和5.0会被factorize视为同一取值，只对纯字符串列去重
+        if pd.api.types.infer_dtype(pack_forms, skipna=True) != 'string':
+            return pack_forms.map(self.standardize_pack_form).to_numpy(dtype=object)
+        
+        codes, uniques = pd.factorize(pack_forms)
+        standardized = np.array([self.standardize_pack_form(value) for value in uniques], dtype=object)
+        return standardized[codes]
+    
+    def _process_dataframe_vectorized(self, df, dedupe=False, metrics=None, categorical=False):
+        """
+        按列批量处理DataFrame，结果与逐行处理一致
+        
+        Args:
+            df (pd.DataFrame): 包含'Pack form'和'Product'列的DataFrame
+            dedupe (bool): 是否对去重后的产品标题打标，否则按列正则匹配
+            metrics (RunMetrics): 可选，记录各阶段的耗时和行数
+            categorical (bool): 剂型和匹配文本列是否输出为分类类型
+            
+        Returns:
+            tuple: (处理后的DataFrame, 成功填充行数, 标准化行数)
+        """
+        import pandas as pd
+        # 复制DataFrame避免修改原始数据
+        df_processed = df.copy()
+        rows = len(df_processed)
+        
+        pack_form = df_processed['Pack form']
+        is_originally_empty = pack_form.isna().to_numpy()
+        new_pack_form = pack_form.to_numpy(dtype=object, copy=True)
+        
+        # 第一步：标准化已存在的剂型
+        # 可空字符串类型（pd.NA）中空值与''比较的结果仍为NA，按不相等处理
+        existing = ~is_originally_empty & (pack_form != '').to_numpy(dtype=bool, na_value=False)
+        existing_positions = np.flatnonzero(existing)
+        original_forms = new_pack_form[existing_positions]
+        with track(metrics, 'standardization') as stage:
+            stage['rows'] = len(existing_positions)
+            standardized_forms = self._standardize_column(pack_form.iloc[existing_positions])
+        changed = np.asarray(standardized_forms != original_forms, dtype=bool)
+        
+        standardization_applied = np.zeros(rows, dtype=bool)
+        standardized_positions = existing_positions[changed]
+        standardization_applied[standardized_positions] = True
+        new_pack_form[standardized_positions] = standardized_forms[changed]
+        standardization_count = len(standardized_positions)
+        
+        # 第二步：处理空的Pack form列
+        is_empty = pd.isna(new_pack_form)
+        is_empty[~is_empty] = new_pack_form[~is_empty] == ''
+        empty_positions = np.flatnonzero(is_empty)
+        products = df_processed['Product'].iloc[empty_positions]
+        with track(metrics, 'detection') as stage:
+            stage['rows'] = len(empty_positions)
+            if dedupe:
+                form_count, class_codes, match_source = self._detect_unique(products)
+            else:
+                form_count, class_codes, match_source = self._detect_column(products)
+        detected = form_count > 0
+        filled_positions = empty_positions[detected]
+        filled_codes = class_codes[detected]
+        new_pack_form[filled_positions] = self._class_labels[filled_codes]
+        processed_count = len(filled_positions)
+        
+        matched_codes = np.zeros(rows, dtype=np.int8)
+        matched_codes[filled_positions] = filled_codes
+        if categorical:
+            matched_column = pd.Categorical.from_codes(matched_codes, categories=self._matched_labels)
+        else:
+            matched_column = self._matched_labels[matched_codes]
+        source_column = np.full(rows, '', dtype=object)
+        source_column[filled_positions] = match_source[detected]
+        confidence_column = np.zeros(rows, dtype=float)
+        confidence_column[filled_positions] = np.minimum(form_count[detected] / 2.0, 1.0)
+        
+        # 整列赋值
+        pack_form_changed = standardization_applied.copy()
+        pack_form_changed[filled_positions] = True
+        df_processed['Pack form'] = pack_form.where(~pack_form_changed, new_pack_form)
+        df_processed['Matched_Pack_Form'] = matched_column
+        df_processed['Match_Source'] = source_column
+        df_processed['Is_Originally_Empty'] = is_originally_empty
+        df_processed['Confidence_Score'] = confidence_column
+        df_processed['Standardization_Applied'] = standardization_applied
+        if categorical:
+            df_processed = self._to_categorical(df_processed)
+        
+        return df_processed, processed_count, standardization_count
+    
+    def _to_categorical(self, df_processed):
+        """将剂型和匹配文本列转换为分类类型（取值重复度高，可大幅减少内存）"""
+        import pandas as pd
+        for column in ('Pack form', 'Matched_Pack_Form', 'Match_Source'):
+            if isinstance(df_processed[column].dtype, pd.CategoricalDtype):
+                continue
+            if column == 'Matched_Pack_Form':
+                df_processed[column] = pd.Categorical(df_processed[column], categories=self._matched_labels)
+            else:
+                df_processed[column] = df_processed[column].astype('category')
+        return df_processed
+    
+    def _process_dataframe_parallel(self, df, mode, workers, chunk_size, progress=None):
+        """
+        按行分块，在进程池中并行打标，再按原顺序合并
+        
+        Args:
+            df (pd.DataFrame): 包含'Pack form'和'Product'列的DataFrame
+            mode (str): 每个分块使用的处理模式
+            workers (int): 并行进程数
+            chunk_size (int): 每个分块的行数
+            progress (callable): 可选，按分块顺序每完成一块调用 progress(已处理行数, 总行数)
+            
+        Returns:
+            tuple: (处理后的DataFrame, 成功填充行数, 标准化行数)
+        """
+        # 只把打标需要的两列发送给工作进程
+        columns = df[['Pack form', 'Product']]
+        chunks = [columns.iloc[start:start + chunk_size] for start in range(0, len(df), chunk_size)]
+        
+        # 每个工作进程在初始化时反序列化一次标签器，编译好的规则在各分块间复用
+        results = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(self,)) as executor:
+            done_rows = 0
+            for chunk, result in zip(chunks, executor.map(_process_chunk, chunks, itertools.repeat(mode))):
+                results.append(result)
+                done_rows += len(chunk)
+                if progress is not None:
+                    progress(done_rows, len(df))
+        
+        return self.merge_chunk_results(df, results)
+    
+    def generate_standardization_report(self, df_processed):
+        """
+        生成标准化处理报告
+        
+        已在打标时累计统计（process_dataframe的stats参数）的，直接使用LabelStats.report()，无需再扫描结果。
+        
+        Args:
+            df_processed (pd.DataFrame): 处理后的DataFrame
+            
+        Returns:
+            dict: 标准化报告，标准化示例为所有标准化行中的均匀抽样（按行号排序）
+        """
+        return LabelStats().update(df_processed).report()
 
-    def process_excel(self, input_file, output_file=None):
+    def process_excel(self, input_file, output_file=None, mode='loop', metrics=None, sheet_name=0,
+                      input_cache=None):
         """
         处理Excel文件
         
         Args:
             input_file (str): 输入文件路径
             output_file (str): 输出文件路径，如果为None则自动生成
+            mode (str): process_dataframe的处理模式
+            metrics (RunMetrics): 可选，记录读取、打标和写出各阶段的耗时和行数
+            sheet_name (str|int): 要处理的工作表名称或序号，默认第一个；处理所有工作表请使用label_workbook
+            input_cache (InputCache): 可选，解析后工作表的缓存，同一文件再次处理时不再解析
         """
+        import pandas as pd
+        from pack_form_excel import write_excel
         try:
             # 读取Excel文件
             print(f"正在读取文件: {input_file}")
-            df = pd.read_excel(input_file)
+            with track(metrics, 'read_excel') as stage:
+                if input_cache is not None:
+                    df = input_cache.read_excel(input_file, sheet_name=sheet_name)
+                else:
+                    df = pd.read_excel(input_file, sheet_name=sheet_name)
+                stage['rows'] = len(df)
             
             # 检查必要的列
             required_columns = ['Pack form', 'Product']
@@ -543,15 +989,18 @@ class PackFormLabeler:
             
             print(f"文件读取成功，共 {len(df)} 行数据")
             
-            # 统计原始空值
-            original_empty = df['Pack form'].isna().sum()
-            print(f"原始Pack form列空值数量: {original_empty}")
-            
-            # 处理数据
-            df_processed, processed_count, standardization_count = self.process_dataframe(df)
+            # 处理数据，同时统计原始空值
+            stats = LabelStats()
+            df_processed, processed_count, standardization_count = self.process_dataframe(
+                df, mode=mode, metrics=metrics, stats=stats
+            )
             
+            print(f"原始Pack form列空值数量: {stats.originally_empty}")
             print(f"成功处理 {processed_count} 行空值数据")
             print(f"标准化处理 {standardization_count} 行已有剂型")
+            if mode == 'dedup':
+                cache = self.cache_info()
+                print(f"打标缓存: 命中 {cache['hits']} 次, 未命中 {cache['misses']} 次")
             
             # 生成输出文件名
             if output_file is None:
@@ -559,7 +1008,9 @@ class PackFormLabeler:
                 output_file = f"{base_name}_labeled.xlsx"
             
             # 保存结果
-            df_processed.to_excel(output_file, index=False)
+            with track(metrics, 'write_excel') as stage:
+                write_excel(df_processed, output_file)
+                stage['rows'] = len(df_processed)
             print(f"结果已保存到: {output_file}")
             
             return df_processed
@@ -567,46 +1018,667 @@ class PackFormLabeler:
         except Exception as e:
             print(f"处理过程中出现错误: {str(e)}")
             return None
+    
+    def process_excel_streaming(self, input_file, output_file=None, batch_size=50000, mode='dedup',
+                                metrics=None):
+        """
+        流式处理Excel文件：分批读取、打标并写出，内存占用与总行数无关
+        
+        Args:
+            input_file (str): 输入文件路径
+            output_file (str): 输出文件路径，如果为None则自动生成
+            batch_size (int): 每批处理的行数
+            mode (str): 每批使用的process_dataframe处理模式
+            metrics (RunMetrics): 可选，按阶段累计各批次读取、打标和写出的耗时和行数
+            
+        Returns:
+            dict: 处理统计（总行数、成功填充行数、标准化行数、输出文件和逐批累计的标准化报告），失败时返回None
+        """
+        from pack_form_excel import StreamingExcelWriter, iter_excel_batches
+        try:
+            print(f"正在流式读取文件: {input_file}")
+            
+            if output_file is None:
+                base_name = input_file.rsplit('.', 1)[0]
+                output_file = f"{base_name}_labeled.xlsx"
+            
+            summary = {
+                'total_rows': 0,
+                'processed_count': 0,
+                'standardization_count': 0,
+                'output_file': output_file
+            }
+            stats = LabelStats()
+            
+            with StreamingExcelWriter(output_file) as writer:
+                batches = iter_excel_batches(input_file, batch_size=batch_size)
+                while True:
+                    with track(metrics, 'read_excel') as stage:
+                        batch = next(batches, None)
+                        stage['rows'] = 0 if batch is None else len(batch)
+                    if batch is None:
+                        break
+                    
+                    # 检查必要的列
+                    required_columns = ['Pack form', 'Product']
+                    missing_columns = [col for col in required_columns if col not in batch.columns]
+                    if missing_columns:
+                        raise ValueError(f"缺少必要的列: {missing_columns}")
+                    
+                    df_processed, processed_count, standardization_count = self.process_dataframe(
+                        batch, mode=mode, metrics=metrics, stats=stats
+                    )
+                    with track(metrics, 'write_excel') as stage:
+                        writer.write(df_processed)
+                        stage['rows'] = len(df_processed)
+                    
+                    summary['total_rows'] += len(batch)
+                    summary['processed_count'] += processed_count
+                    summary['standardization_count'] += standardization_count
+                    print(f"已处理 {summary['total_rows']} 行")
+            
+            print(f"成功处理 {summary['processed_count']} 行空值数据")
+            print(f"标准化处理 {summary['standardization_count']} 行已有剂型")
+            print(f"结果已保存到: {output_file}")
+            
+            summary['report'] = stats.report()
+            return summary
+            
+        except Exception as e:
+            print(f"处理过程中出现错误: {str(e)}")
+            return None
 
-def main():
-    """主函数"""
-    print("剂型打标程序")
-    print("="*30)
+# 命令行支持的输出格式
+OUTPUT_FORMATS = ('xlsx', 'csv', 'csv.gz', 'parquet')
+
+def expand_input_paths(inputs, recursive=False):
+    """
+    展开命令行输入的文件、通配符和目录
     
-    # 创建标签器实例
-    labeler = PackFormLabeler()
+    Args:
+        inputs (list): 文件路径、通配符或目录
+        recursive (bool): 是否递归查找目录和 ** 通配符
+        
+    Returns:
+        list: 去重后的Excel文件路径，保持输入顺序
+    """
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            pattern = os.path.join(item, '**', '*.xlsx') if recursive else os.path.join(item, '*.xlsx')
+            matches = sorted(glob.glob(pattern, recursive=recursive))
+        elif any(char in item for char in '*?['):
+            matches = sorted(glob.glob(item, recursive=recursive))
+        else:
+            paths.append(item)
+            continue
+        for path in matches:
+            name = os.path.basename(path)
+            # 跳过Excel临时文件和本程序生成的结果文件
+            if name.startswith('~$') or os.path.splitext(name)[0].endswith('_labeled'):
+                continue
+            paths.append(path)
+    return list(dict.fromkeys(paths))
+
+def build_output_path(input_file, output_dir=None, output_format='xlsx'):
+    """
+    生成输出文件路径：<输出目录>/<原文件名>_labeled.<格式>
+    
+    Args:
+        input_file (str): 输入文件路径
+        output_dir (str): 输出目录，为None时与输入文件相同
+        output_format (str): 输出格式
+        
+    Returns:
+        str: 输出文件路径
+    """
+    base_name = os.path.splitext(os.path.basename(input_file))[0]
+    directory = output_dir if output_dir is not None else os.path.dirname(input_file)
+    return os.path.join(directory, f"{base_name}_labeled.{output_format}")
+
+def write_output(df, output_file, output_format='xlsx', sheet_name='Sheet1'):
+    """
+    按指定格式写出结果
+    
+    Args:
+        df (pd.DataFrame): 处理后的DataFrame
+        output_file (str): 输出文件路径或可写的二进制文件对象
+        output_format (str): 'xlsx'、'csv'、'csv.gz' 或 'parquet'
+        sheet_name (str): xlsx格式的工作表名称
+    """
+    from pack_form_excel import write_excel
+    if output_format in ('csv', 'csv.gz'):
+        # 带BOM以便Excel正确识别中文
+        df.to_csv(output_file, index=False, encoding='utf-8-sig',
+                  compression='gzip' if output_format == 'csv.gz' else None)
+    elif output_format == 'parquet':
+        df.to_parquet(output_file, index=False)
+    else:
+        # 只写模式逐批写出，内存占用不随行数增长
+        write_excel(df, output_file, sheet_name=sheet_name)
+
+def write_output_joined(input_file, labels, output_file, output_format='xlsx', pack_form_column='Pack form',
+                        sheet_name=None, batch_size=50000):
+    """
+    写出时再把打标结果拼接回原数据：分批重新读取输入工作表的所有列，替换剂型列并追加新列后逐批写出
+    
+    整个宽表不会同时驻留在内存中，列顺序与process_dataframe的结果一致。
+    
+    Args:
+        input_file (str): 打标时读取的Excel文件
+        labels (pd.DataFrame): 按行顺序排列的打标结果，包含'Pack form'和LABEL_COLUMNS中的列
+        output_file (str): 输出文件路径
+        output_format (str): 'xlsx'、'csv'、'csv.gz' 或 'parquet'（parquet需要一次写出，会先拼接所有批次）
+        pack_form_column (str): 输入文件中的剂型列名
+        sheet_name (str): 工作表名称，默认为第一个工作表
+        batch_size (int): 每批读取和写出的行数
+    """
+    import gzip
+    from pack_form_excel import StreamingExcelWriter, iter_excel_batches
     
-    # 处理文件
-    input_file = "test01.xlsx"
-    result_df = labeler.process_excel(input_file)
+    def joined_batches():
+        start = 0
+        for batch in iter_excel_batches(input_file, batch_size=batch_size, sheet_name=sheet_name):
+            part = labels.iloc[start:start + len(batch)]
+            if len(part) != len(batch):
+                raise ValueError(f"输入文件的行数与打标结果不一致，文件可能在处理过程中被修改: {input_file}")
+            batch[pack_form_column] = part['Pack form'].to_numpy()
+            for column in PackFormLabeler.LABEL_COLUMNS:
+                batch[column] = part[column].to_numpy()
+            start += len(batch)
+            yield batch
+        if start != len(labels):
+            raise ValueError(f"输入文件的行数与打标结果不一致，文件可能在处理过程中被修改: {input_file}")
     
-    if result_df is not None:
-        print("\n处理完成！")
+    if output_format in ('csv', 'csv.gz'):
+        opener = gzip.open if output_format == 'csv.gz' else open
+        # 带BOM以便Excel正确识别中文
+        with opener(output_file, 'wt', encoding='utf-8-sig', newline='') as f:
+            for i, batch in enumerate(joined_batches()):
+                batch.to_csv(f, index=False, header=(i == 0))
+    elif output_format == 'parquet':
+        import pandas as pd
+        pd.concat(list(joined_batches())).to_parquet(output_file, index=False)
+    else:
+        with StreamingExcelWriter(output_file) as writer:
+            for batch in joined_batches():
+                writer.write(batch)
+
+def export_bytes(df, output_format='xlsx', sheet_name='Sheet1'):
+    """
+    按指定格式生成结果文件的内容，供Web界面下载
+    
+    Args:
+        df (pd.DataFrame): 处理后的DataFrame
+        output_format (str): 'xlsx'、'csv'、'csv.gz' 或 'parquet'
+        sheet_name (str): xlsx格式的工作表名称
         
-        # 生成详细报告
-        report = labeler.generate_standardization_report(result_df)
+    Returns:
+        bytes: 文件内容
+    """
+    output = BytesIO()
+    write_output(df, output, output_format, sheet_name=sheet_name)
+    return output.getvalue()
+
+def label_file(labeler, input_file, output_file, pack_form_column='Pack form',
+               product_column='Product', mode='dedup', output_format='xlsx', metrics=None,
+               low_memory=False, checkpoint_dir=None, chunk_size=50000, restart=False, input_cache=None):
+    """
+    对单个Excel文件打标并写出结果
+    
+    Args:
+        labeler (PackFormLabeler): 标签器
+        input_file (str): 输入文件路径
+        output_file (str): 输出文件路径
+        pack_form_column (str): 剂型列名
+        product_column (str): 产品描述列名
+        mode (str): process_dataframe的处理模式
+        output_format (str): 输出格式
+        metrics (RunMetrics): 可选，记录读取、打标、统计和写出各阶段的耗时和行数
+        low_memory (bool): 只读取剂型列和产品描述列进行打标，写出时再分批与原数据的其他列拼接；
+            宽表的内存峰值只与这两列有关，代价是输入文件被读取两次
+        checkpoint_dir (str): 检查点根目录，指定时按chunk_size行分块打标并保存每块的结果，
+            中断后重新运行可从未完成的分块继续（见pack_form_checkpoint）
+        chunk_size (int): 断点续跑时每个分块的行数
+        restart (bool): 断点续跑时丢弃已有的检查点重新开始
+        input_cache (InputCache): 可选，解析后工作表的缓存（断点续跑时不使用）；
+            低内存模式只缓存两列，写出时仍需读取原文件
         
-        print(f"\n📊 处理统计:")
-        print(f"  总行数: {report['total_rows']}")
-        print(f"  标准化处理: {report['standardization_applied']} 行")
-        print(f"  原始空值: {report['originally_empty']} 行")
-        print(f"  成功填充: {report['successfully_filled']} 行")
-        print(f"  处理后空值: {report['final_empty']} 行")
+    Returns:
+        dict: 该文件的标准化报告
+    """
+    if checkpoint_dir is not None:
+        from pack_form_checkpoint import label_file_resumable
+        return label_file_resumable(labeler, input_file, output_file, checkpoint_dir, pack_form_column,
+                                    product_column, mode, output_format, chunk_size=chunk_size,
+                                    restart=restart, metrics=metrics)
+    
+    import pandas as pd
+    from pack_form_excel import read_sheet
+    column_names = {pack_form_column: 'Pack form', product_column: 'Product'}
+    with track(metrics, 'read_excel') as stage:
+        if input_cache is not None:
+            df = input_cache.read_excel(input_file, usecols=list(column_names) if low_memory else None)
+        elif low_memory:
+            df = read_sheet(input_file, usecols=list(column_names))
+        else:
+            df = pd.read_excel(input_file)
+        stage['rows'] = len(df)
+    
+    # 检查必要的列，并统一为标签器使用的列名
+    missing_columns = [col for col in column_names if col not in df.columns]
+    if missing_columns:
+        raise ValueError(f"缺少必要的列: {missing_columns}")
+    df = df.rename(columns=column_names)
+    
+    # 低内存模式下df只有两列，直接在其上追加新列；报告在打标时累计
+    stats = LabelStats()
+    df_processed, _, _ = labeler.process_dataframe(df, mode=mode, metrics=metrics, inplace=low_memory,
+                                                   stats=stats)
+    report = stats.report()
+    
+    if low_memory:
+        with track(metrics, f'write_{output_format}') as stage:
+            write_output_joined(input_file, df_processed, output_file, output_format, pack_form_column)
+            stage['rows'] = len(df_processed)
+        return report
+    
+    df_processed = df_processed.rename(columns={v: k for k, v in column_names.items()})
+    with track(metrics, f'write_{output_format}') as stage:
+        write_output(df_processed, output_file, output_format)
+        stage['rows'] = len(df_processed)
+    return report
+
+# 多工作表输出中汇总工作表的名称，与已有工作表重名时加序号
+SUMMARY_SHEET = 'Summary'
+
+def find_label_sheets(input_file, pack_form_column='Pack form', product_column='Product'):
+    """
+    找出工作簿中包含必要列的工作表（只读取表头）
+    
+    Args:
+        input_file (str): Excel文件路径或可读的二进制文件对象
+        pack_form_column (str): 剂型列名
+        product_column (str): 产品描述列名
         
-        if report['originally_empty'] > 0:
-            fill_rate = (report['successfully_filled'] / report['originally_empty']) * 100
-            print(f"  填充成功率: {fill_rate:.1f}%")
+    Returns:
+        tuple: (可处理的工作表名称列表, {跳过的工作表名称: 缺少的列})
+    """
+    from pack_form_excel import read_sheet_headers
+    sheets = []
+    skipped = {}
+    for sheet_name, columns in read_sheet_headers(input_file).items():
+        missing_columns = [col for col in (pack_form_column, product_column) if col not in columns]
+        if missing_columns:
+            skipped[sheet_name] = missing_columns
+        else:
+            sheets.append(sheet_name)
+    return sheets, skipped
+
+def label_sheet(labeler, input_file, sheet_name, pack_form_column='Pack form',
+                product_column='Product', mode='dedup', metrics=None):
+    """
+    读取并打标工作簿中的一个工作表
+    
+    Args:
+        labeler (PackFormLabeler): 标签器
+        input_file (str): Excel文件路径
+        sheet_name (str): 工作表名称
+        pack_form_column (str): 剂型列名
+        product_column (str): 产品描述列名
+        mode (str): process_dataframe的处理模式
+        metrics (RunMetrics): 可选，记录读取、打标和统计各阶段的耗时和行数
         
-        print(f"\n🏷️ 剂型分布:")
-        for form, count in sorted(report['pack_form_distribution'].items(), key=lambda x: x[1], reverse=True):
-            if pd.notna(form):
-                print(f"  {form}: {count}")
+    Returns:
+        tuple: (处理后的DataFrame（列名与输入一致）, 该工作表的标准化报告)
+    """
+    from pack_form_excel import read_sheet
+    with track(metrics, 'read_excel') as stage:
+        df = read_sheet(input_file, sheet_name)
+        stage['rows'] = len(df)
+    
+    column_names = {pack_form_column: 'Pack form', product_column: 'Product'}
+    df = df.rename(columns=column_names)
+    stats = LabelStats()
+    df_processed, _, _ = labeler.process_dataframe(df, mode=mode, metrics=metrics, stats=stats)
+    return df_processed.rename(columns={v: k for k, v in column_names.items()}), stats.report()
+
+def build_workbook_summary(sheet_reports, skipped=None):
+    """
+    生成多工作表的汇总表：每个工作表一行，末行为合计
+    
+    Args:
+        sheet_reports (list): [(工作表名称, 标准化报告), ...]
+        skipped (dict): {跳过的工作表名称: 缺少的列}
         
-        if report['standardization_examples']:
-            print(f"\n🔄 标准化示例:")
-            for example in report['standardization_examples'][:5]:
-                print(f"  行 {example['row']}: {example['product']}")
-                print(f"    剂型: {example['pack_form']}")
+    Returns:
+        pd.DataFrame: 各工作表的行数、填充和标准化统计，以及各剂型的行数
+    """
+    import pandas as pd
+    total = merge_reports(sheet_reports)
+    forms = sorted(total['pack_form_distribution'], key=lambda form: -total['pack_form_distribution'][form])
+    
+    def summary_row(sheet_name, report, note=''):
+        row = {
+            'Sheet': sheet_name,
+            'Total_Rows': int(report['total_rows']),
+            'Originally_Empty': int(report['originally_empty']),
+            'Successfully_Filled': int(report['successfully_filled']),
+            'Standardization_Applied': int(report['standardization_applied']),
+            'Final_Empty': int(report['final_empty']),
+        }
+        for form in forms:
+            row[form] = int(report['pack_form_distribution'].get(form, 0))
+        row['Note'] = note
+        return row
+    
+    rows = [summary_row(sheet_name, report) for sheet_name, report in sheet_reports]
+    for sheet_name, missing_columns in (skipped or {}).items():
+        rows.append({'Sheet': sheet_name, 'Note': f"已跳过，缺少必要的列: {missing_columns}"})
+    rows.append(summary_row('Total', total, f"{len(sheet_reports)} 个工作表"))
+    summary = pd.DataFrame(rows, columns=list(rows[-1]))
+    # 跳过的工作表没有统计值，计数列使用可空整数类型
+    counts = summary.columns[1:-1]
+    summary[counts] = summary[counts].astype('Int64')
+    return summary
+
+def write_labeled_workbook(output_file, labeled_sheets, sheet_reports, skipped=None):
+    """
+    写出多工作表的打标结果：第一个工作表为汇总表，其后为各打标工作表
+    
+    Args:
+        output_file (str): 输出文件路径或可写的二进制文件对象
+        labeled_sheets (list): [(工作表名称, 处理后的DataFrame), ...]
+        sheet_reports (list): [(工作表名称, 标准化报告), ...]
+        skipped (dict): {跳过的工作表名称: 缺少的列}
+    """
+    from pack_form_excel import write_excel_sheets
+    names = {sheet_name for sheet_name, _ in labeled_sheets}
+    summary_sheet = SUMMARY_SHEET
+    suffix = 1
+    while summary_sheet in names:
+        summary_sheet = f"{SUMMARY_SHEET} {suffix}"
+        suffix += 1
+    summary = build_workbook_summary(sheet_reports, skipped)
+    write_excel_sheets([(summary_sheet, summary)] + list(labeled_sheets), output_file)
+
+def label_workbook(labeler, input_file, output_file, pack_form_column='Pack form',
+                   product_column='Product', mode='dedup', executor=None, metrics=None):
+    """
+    对工作簿中所有包含必要列的工作表打标，写出一个包含汇总表和各打标工作表的工作簿
+    
+    Args:
+        labeler (PackFormLabeler): 标签器
+        input_file (str): 输入文件路径
+        output_file (str): 输出文件路径（.xlsx）
+        pack_form_column (str): 剂型列名
+        product_column (str): 产品描述列名
+        mode (str): process_dataframe的处理模式
+        executor (ProcessPoolExecutor): 可选，以_init_worker初始化的进程池，各工作表在其中并行处理
+        metrics (RunMetrics): 可选，记录各工作表的读取、打标和报告阶段以及写出阶段
+        
+    Returns:
+        dict: 所有工作表合并后的标准化报告，另附 sheets（已打标的工作表）和 skipped_sheets（跳过的工作表）
+    """
+    sheets, skipped = find_label_sheets(input_file, pack_form_column, product_column)
+    if not sheets:
+        raise ValueError(f"没有包含必要列的工作表: {skipped}")
+    
+    tasks = [(input_file, sheet_name, pack_form_column, product_column, mode) for sheet_name in sheets]
+    if executor is not None:
+        # 按工作表顺序收集结果，写出时保持原工作表顺序
+        futures = [executor.submit(_label_sheet_in_worker, task) for task in tasks]
+        results = [future.result() for future in futures]
+    else:
+        results = [_label_sheet_with_metrics(labeler, task) for task in tasks]
+    
+    sheet_reports = []
+    labeled_sheets = []
+    for sheet_name, (df_processed, report, sheet_metrics) in zip(sheets, results):
+        sheet_reports.append((sheet_name, report))
+        labeled_sheets.append((sheet_name, df_processed))
+        if metrics is not None:
+            metrics.add_stages(sheet_metrics)
+    
+    with track(metrics, 'write_xlsx') as stage:
+        write_labeled_workbook(output_file, labeled_sheets, sheet_reports, skipped)
+        stage['rows'] = sum(len(df) for _, df in labeled_sheets)
+    
+    report = merge_reports(sheet_reports)
+    report['sheets'] = sheets
+    report['skipped_sheets'] = skipped
+    return report
+
+def merge_reports(file_reports, max_examples=10):
+    """
+    合并多个文件的标准化报告
+    
+    标准化示例按各报告的标准化行数加权合并（LabelStats.merge），合并后仍是所有标准化行中的均匀抽样。
+    
+    Args:
+        file_reports (list): [(文件路径, 报告), ...]
+        max_examples (int): 保留的标准化示例数量
+        
+    Returns:
+        dict: 与generate_standardization_report结构相同的汇总报告，示例中附带文件路径，按文件和行号排序
+    """
+    merged = LabelStats(max_examples=max_examples)
+    order = {}
+    for input_file, report in file_reports:
+        order.setdefault(input_file, len(order))
+        merged.merge(LabelStats.from_report(report, file=input_file))
+    report = merged.report()
+    report['standardization_examples'].sort(key=lambda example: (order[example['file']], example['row']))
+    return report
+
+def print_metrics(metrics):
+    """打印各阶段的耗时和吞吐量"""
+    total = metrics['total']
+    rate = f", {total['rows_per_sec']:,.0f} 行/秒" if total['rows_per_sec'] else ''
+    print(f"\n⏱️ 总耗时: {total['elapsed_seconds']:.3f} 秒{rate}（各阶段累计 {total['worker_seconds']:.3f} 秒）")
+    print(f"  阶段耗时（多进程时为各进程累计）:")
+    for record in metrics['stages']:
+        rate = f"{record['rows_per_sec']:,.0f} 行/秒" if record['rows_per_sec'] else '-'
+        print(f"  {record['stage']}: {record['worker_seconds']:.3f} 秒 (CPU {record['cpu_seconds']:.3f} 秒), "
+              f"{record['rows']} 行, {rate}")
+    if metrics['total']['max_rss_bytes'] is not None:
+        print(f"  峰值内存: {metrics['total']['max_rss_bytes'] / 1024 / 1024:.1f} MB")
+
+def print_report(report):
+    """打印标准化报告"""
+    import pandas as pd
+    print(f"\n📊 处理统计:")
+    print(f"  总行数: {report['total_rows']}")
+    print(f"  标准化处理: {report['standardization_applied']} 行")
+    print(f"  原始空值: {report['originally_empty']} 行")
+    print(f"  成功填充: {report['successfully_filled']} 行")
+    print(f"  处理后空值: {report['final_empty']} 行")
+    
+    if report['originally_empty'] > 0:
+        fill_rate = (report['successfully_filled'] / report['originally_empty']) * 100
+        print(f"  填充成功率: {fill_rate:.1f}%")
+    
+    print(f"\n🏷️ 剂型分布:")
+    for form, count in sorted(report['pack_form_distribution'].items(), key=lambda x: x[1], reverse=True):
+        if pd.notna(form):
+            print(f"  {form}: {count}")
+    
+    if report['standardization_examples']:
+        print(f"\n🔄 标准化示例:")
+        for example in report['standardization_examples'][:5]:
+            location = f"{os.path.basename(example['file'])} " if 'file' in example else ''
+            print(f"  {location}行 {example['row']}: {example['product']}")
+            print(f"    剂型: {example['pack_form']}")
+
+# 工作进程内的标签器，由_init_worker在进程启动时创建
+_worker_labeler = None
+
+def _init_worker(labeler):
+    """进程池初始化函数：保存反序列化后的标签器"""
+    global _worker_labeler
+    _worker_labeler = labeler
+
+def _process_chunk(chunk, mode):
+    """在工作进程中处理一个分块"""
+    return _worker_labeler.process_dataframe(chunk, mode=mode)
+
+def _label_sheet_with_metrics(labeler, task):
+    """处理一个工作表并记录各阶段指标，返回 (处理后的DataFrame, 报告, 指标字典)"""
+    metrics = RunMetrics()
+    df_processed, report = label_sheet(labeler, *task, metrics=metrics)
+    return df_processed, report, metrics.as_dict()
+
+def _label_sheet_in_worker(task):
+    """在工作进程中处理一个工作表"""
+    return _label_sheet_with_metrics(_worker_labeler, task)
+
+def _label_file_with_metrics(labeler, task, options=None):
+    """处理一个文件并记录各阶段指标，返回 (报告, 指标字典)；options为传给label_file的其他参数"""
+    metrics = RunMetrics()
+    report = label_file(labeler, *task, metrics=metrics, **(options or {}))
+    return report, metrics.as_dict()
+
+def _label_workbook_with_metrics(labeler, task, executor=None):
+    """处理一个工作簿的所有工作表并记录各阶段指标，返回 (报告, 指标字典)"""
+    input_file, output_file, pack_form_column, product_column, mode, _ = task
+    metrics = RunMetrics()
+    report = label_workbook(labeler, input_file, output_file, pack_form_column, product_column, mode,
+                            executor=executor, metrics=metrics)
+    return report, metrics.as_dict()
+
+def _label_file_in_worker(task, options=None):
+    """在工作进程中处理一个文件"""
+    return _label_file_with_metrics(_worker_labeler, task, options)
+
+def build_arg_parser():
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(
+        description='剂型打标程序：对Excel表格中的Pack form列进行智能打标和标准化'
+    )
+    parser.add_argument('inputs', nargs='+', help='输入的Excel文件、通配符或目录')
+    parser.add_argument('-o', '--output-dir', help='输出目录，默认与输入文件相同')
+    parser.add_argument('-f', '--format', dest='output_format', choices=OUTPUT_FORMATS,
+                        default='xlsx', help='输出格式（默认xlsx）')
+    parser.add_argument('--pack-form-column', default='Pack form', help='剂型列名（默认 Pack form）')
+    parser.add_argument('--product-column', default='Product', help='产品描述列名（默认 Product）')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='同时处理文件的进程数，0表示CPU核数（默认1）')
+    parser.add_argument('--mode', choices=PackFormLabeler.PROCESS_MODES, default='dedup',
+                        help='process_dataframe的处理模式（默认dedup）')
+    parser.add_argument('--engine', choices=PackFormLabeler.ENGINES, default='compiled',
+                        help='剂型匹配引擎（默认compiled）')
+    parser.add_argument('--rules', help='规则包（.json/.yaml），默认 rules/pack_form_rules.json')
+    parser.add_argument('-r', '--recursive', action='store_true', help='递归查找目录中的Excel文件')
+    parser.add_argument('--all-sheets', action='store_true',
+                        help='处理每个文件中所有包含必要列的工作表，各工作表由多个进程并行处理，'
+                             '输出一个含汇总表的工作簿（仅xlsx）')
+    parser.add_argument('--low-memory', action='store_true',
+                        help='只读取剂型列和产品描述列打标，写出时再与其他列拼接，适合列很多的宽表')
+    parser.add_argument('--checkpoint-dir',
+                        help='断点续跑：分块打标并把每块结果保存到该目录，中断后重新运行同一命令从未完成的分块继续')
+    parser.add_argument('--chunk-size', type=int, default=50000, help='断点续跑时每个分块的行数（默认50000）')
+    parser.add_argument('--restart', action='store_true', help='丢弃已有的检查点，重新开始断点续跑')
+    parser.add_argument('--cache-dir', help='持久化打标缓存目录（dedup模式下生效），默认不启用')
+    parser.add_argument('--input-cache',
+                        help='解析后工作表的缓存目录，按文件内容哈希保存，同一文件再次处理时跳过Excel解析，默认不启用')
+    parser.add_argument('--metrics-jsonl', help='以JSON-lines格式追加本次运行的阶段指标到该文件')
+    parser.add_argument('--metrics-prom', help='写出Prometheus文本文件采集器格式的阶段指标（.prom）')
+    return parser
+
+def main(argv=None):
+    """主函数"""
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if args.all_sheets and args.output_format != 'xlsx':
+        parser.error('--all-sheets 只支持xlsx输出格式')
+    if args.all_sheets and args.low_memory:
+        parser.error('--low-memory 不能与 --all-sheets 同时使用')
+    if args.checkpoint_dir and args.all_sheets:
+        parser.error('--checkpoint-dir 不能与 --all-sheets 同时使用')
+    if args.input_cache and (args.all_sheets or args.checkpoint_dir):
+        parser.error('--input-cache 不能与 --all-sheets 或 --checkpoint-dir 同时使用')
+    
+    print("剂型打标程序")
+    print("="*30)
+    
+    input_files = expand_input_paths(args.inputs, recursive=args.recursive)
+    if not input_files:
+        print("未找到需要处理的Excel文件")
+        return 1
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    
+    # 创建标签器实例，多进程时每个工作进程各持有一份
+    label_cache = LabelCache(args.cache_dir) if args.cache_dir else None
+    labeler = PackFormLabeler(engine=args.engine, label_cache=label_cache, rules=args.rules)
+    print(f"规则包版本: {labeler.rules_version} ({labeler.ruleset_fingerprint()})")
+    
+    tasks = [
+        (input_file, build_output_path(input_file, args.output_dir, args.output_format),
+         args.pack_form_column, args.product_column, args.mode, args.output_format)
+        for input_file in input_files
+    ]
+    workers = args.workers or os.cpu_count() or 1
+    if not args.all_sheets:
+        # 按文件并行时，进程数不超过文件数
+        workers = min(workers, len(tasks))
+    print(f"共 {len(tasks)} 个文件，使用 {workers} 个进程处理")
+    
+    # 传给label_file的其他参数，检查点模式本身只读取两列，不需要--low-memory
+    options = {'low_memory': args.low_memory}
+    if args.input_cache:
+        options['input_cache'] = InputCache(args.input_cache)
+    if args.checkpoint_dir:
+        options = {'checkpoint_dir': args.checkpoint_dir, 'chunk_size': args.chunk_size, 'restart': args.restart}
+    
+    reports = {}
+    file_metrics = {}
+    failures = {}
+    # 整批运行的实际耗时；多进程时各文件的阶段耗时之和会大于它
+    run_start = time.perf_counter()
+    
+    def record(task, get_result):
+        try:
+            reports[task[0]], file_metrics[task[0]] = get_result()
+            print(f"完成: {task[0]} -> {task[1]}")
+            if reports[task[0]].get('sheets'):
+                print(f"  已打标 {len(reports[task[0]]['sheets'])} 个工作表")
+            for sheet_name, missing_columns in reports[task[0]].get('skipped_sheets', {}).items():
+                print(f"  跳过工作表 {sheet_name}: 缺少必要的列 {missing_columns}")
+        except Exception as e:
+            failures[task[0]] = str(e)
+            print(f"失败: {task[0]}: {str(e)}")
+    
+    if args.all_sheets:
+        # 逐个文件处理，同一文件的各工作表在进程池中并行
+        executor = None
+        if workers > 1:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(labeler,))
+        try:
+            for task in tasks:
+                record(task, lambda: _label_workbook_with_metrics(labeler, task, executor))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+    elif workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(labeler,)) as executor:
+            futures = {executor.submit(_label_file_in_worker, task, options): task for task in tasks}
+            for future in as_completed(futures):
+                record(futures[future], future.result)
+    else:
+        for task in tasks:
+            record(task, lambda: _label_file_with_metrics(labeler, task, options))
+    
+    elapsed_seconds = time.perf_counter() - run_start
+    print(f"\n处理完成！成功 {len(reports)} 个文件，失败 {len(failures)} 个文件")
+    if label_cache is not None:
+        print(f"打标缓存: {label_cache.stats()['entries']} 条记录 ({label_cache.path})")
+    
+    if reports:
+        # 按输入顺序汇总各文件的报告
+        report = merge_reports([(f, reports[f]) for f in input_files if f in reports])
+        print_report(report)
         
         print("\n📋 新列说明:")
         print("  - Pack form: 已实际填充和标准化的剂型")
@@ -615,8 +1687,22 @@ def main():
         print("  - Is_Originally_Empty: 标记该行Pack form是否原本为空")
         print("  - Confidence_Score: 匹配置信度分数 (0.0-1.0)")
         print("  - Standardization_Applied: 标记是否进行了标准化处理")
-    else:
-        print("处理失败，请检查文件格式和内容")
+        
+        metrics = merge_metrics([file_metrics[f] for f in input_files if f in file_metrics],
+                                elapsed_seconds=elapsed_seconds)
+        print_metrics(metrics)
+        labels = {'job': 'pack_form_labeler', 'mode': args.mode, 'engine': args.engine}
+        if args.metrics_jsonl:
+            write_jsonl(args.metrics_jsonl, dict(metrics, files=len(reports)), **labels)
+        if args.metrics_prom:
+            write_prometheus(args.metrics_prom, metrics, **labels)
+    
+    if failures:
+        print("\n以下文件处理失败，请检查文件格式和内容:")
+        for input_file, error in failures.items():
+            print(f"  {input_file}: {error}")
+        return 1
+    return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+剂型匹配引擎
+将剂型规则表预编译为可复用的匹配器，供PackFormLabeler调用
+"""
+
+import re
+
+# 正则中有特殊含义、不能视为字面字符的符号
+_REGEX_SPECIALS = set('\\.^$*+?{}[]|()')
+_QUANTIFIERS = set('*+?{')
+
+
+def split_leading_literal(pattern):
+    """
+    拆出模式开头的字面字符
+
+    形如 \\bxxx 的模式会改写为以字面字符开头的等价形式，
+    使组合正则的各个分支可以按首字符快速跳过。
+
+    Args:
+        pattern (str): 正则模式
+
+    Returns:
+        tuple: (首字符, 改写后的模式)，首字符无法确定时为 (None, 原模式)
+    """
+    has_boundary = pattern.startswith(r'\b')
+    body = pattern[2:] if has_boundary else pattern
+    if not body or body[0] in _REGEX_SPECIALS or body[1:2] in _QUANTIFIERS:
+        return None, pattern
+    first = body[0]
+    if not has_boundary:
+        return first, pattern
+    if not re.match(r'\w', first):
+        return None, pattern
+    # \b后紧跟单词字符，等价于该字符之前不是单词字符
+    return first, first + r'(?<!\w.)' + body[1:]
+
+
+def parse_literal(pattern):
+    """
+    判断模式是否为字面关键词（可带首尾 \\b）
+
+    Args:
+        pattern (str): 正则模式
+
+    Returns:
+        tuple: (关键词, 是否要求开头边界, 是否要求结尾边界)，非字面模式返回None
+    """
+    left = pattern.startswith(r'\b')
+    body = pattern[2:] if left else pattern
+    right = body.endswith(r'\b')
+    keyword = body[:-2] if right else body
+    if not keyword or any(c in _REGEX_SPECIALS for c in keyword):
+        return None
+    return keyword, left, right
+
+
+def is_word_char(char):
+    """与正则 \\w 一致的单词字符判断"""
+    return char.isalnum() or char == '_'
+
+
+class _PatternTableMatcher:
+    """
+    匹配器基类
+
+    维护按剂型顺序编号的模式表，子类只需实现scan()给出每个模式的命中位置，
+    结果的组装方式与逐条re.findall/re.search的原实现保持一致。
+    """
+
+    def __init__(self, pack_forms, others_patterns):
+        """
+        Args:
+            pack_forms (dict): 主要剂型 -> 正则模式列表
+            others_patterns (dict): Others类剂型 -> 正则模式列表
+        """
+        self.forms = list(pack_forms.keys())
+        self.others_names = list(others_patterns.keys())
+
+        # 模式表：(类别, 剂型序号, 原始模式, 是否忽略大小写)
+        # Others类剂型原实现使用re.IGNORECASE
+        self.patterns = []
+        for form_index, patterns in enumerate(pack_forms.values()):
+            for pattern in patterns:
+                self.patterns.append(('f', form_index, pattern, False))
+        for others_index, patterns in enumerate(others_patterns.values()):
+            for pattern in patterns:
+                self.patterns.append(('o', others_index, pattern, True))
+
+    def scan(self, text_lower):
+        """
+        扫描文本，返回每个模式的命中位置
+
+        Args:
+            text_lower (str): 已转换为小写的产品描述文本
+
+        Returns:
+            dict: {模式序号: [(起点, 终点, 匹配文本), ...]}，按起点排序
+        """
+        raise NotImplementedError
+
+    def detect_others(self, text_lower):
+        """
+        检测Others类剂型
+
+        Args:
+            text_lower (str): 已转换为小写的产品描述文本
+
+        Returns:
+            list: 检测到的Others类剂型列表
+        """
+        others_hit = set()
+        for pattern_id in self.scan(text_lower):
+            kind, index = self.patterns[pattern_id][:2]
+            if kind == 'o':
+                others_hit.add(index)
+        return [name for i, name in enumerate(self.others_names) if i in others_hit]
+
+    def detect(self, text_lower):
+        """
+        检测主要剂型和Others类剂型
+
+        Args:
+            text_lower (str): 已转换为小写的产品描述文本
+
+        Returns:
+            tuple: (检测到的剂型列表, 匹配的文本列表)
+        """
+        detected_forms = []
+        matched_texts = []
+        others_hit = set()
+
+        hits = self.scan(text_lower)
+        # 模式序号按剂型和模式的原始顺序编号，排序后即为原实现的输出顺序
+        for pattern_id in sorted(hits):
+            kind, index = self.patterns[pattern_id][:2]
+            if kind == 'o':
+                others_hit.add(index)
+                continue
+            # 与re.findall一致：同一模式的匹配互不重叠
+            last_end = 0
+            for start, end, value in hits[pattern_id]:
+                if start >= last_end:
+                    matched_texts.append(value)
+                    last_end = end if end > start else start + 1
+            detected_forms.append(self.forms[index])
+
+        if others_hit:
+            detected_forms.append('Others')
+            matched_texts.extend(
+                name for i, name in enumerate(self.others_names) if i in others_hit
+            )
+
+        return detected_forms, matched_texts
+
+
+class CompiledRegexMatcher(_PatternTableMatcher):
+    """
+    预编译的多模式正则匹配器
+
+    构造时把所有主要剂型和Others类剂型的模式编译成一个组合正则，
+    每个产品标题只扫描一遍：组合正则定位有模式命中的位置，再用按首字符
+    预编译的位置正则（每个模式一个命名分组）一次取出该位置命中的所有模式。
+    输出与逐条re.findall/re.search的结果完全一致。
+    """
+
+    def __init__(self, pack_forms, others_patterns, pattern_ids=None):
+        """
+        Args:
+            pack_forms (dict): 主要剂型 -> 正则模式列表
+            others_patterns (dict): Others类剂型 -> 正则模式列表
+            pattern_ids (iterable): 只编译这些序号的模式，默认编译全部
+        """
+        super().__init__(pack_forms, others_patterns)
+        if pattern_ids is None:
+            pattern_ids = range(len(self.patterns))
+        self.pattern_ids = sorted(pattern_ids)
+
+        # 模式序号 -> 首字符
+        self._leading = {}
+        alternatives = []
+        for pattern_id in self.pattern_ids:
+            _, _, pattern, ignore_case = self.patterns[pattern_id]
+            first, rewritten = split_leading_literal(pattern)
+            self._leading[pattern_id] = first
+            alternatives.append(f'(?i:{rewritten})' if ignore_case else f'(?:{rewritten})')
+
+        self.scanner = re.compile('(?=' + '|'.join(alternatives) + ')')
+
+        # 首字符 -> (位置正则, [(分组下标, 模式序号), ...])
+        self._position_scanners = {}
+        for pattern_id, first in self._leading.items():
+            if first is not None:
+                ignore_case = self.patterns[pattern_id][3]
+                self._position_scanner(first.lower() if ignore_case else first)
+
+    def _position_scanner(self, char):
+        """获取（必要时编译）以指定字符开头的位置正则"""
+        scanner = self._position_scanners.get(char)
+        if scanner is not None:
+            return scanner
+
+        parts = []
+        pattern_ids = []
+        for pattern_id in self.pattern_ids:
+            _, _, pattern, ignore_case = self.patterns[pattern_id]
+            first = self._leading[pattern_id]
+            if first is not None:
+                if ignore_case:
+                    if not re.fullmatch(re.escape(first), char, re.IGNORECASE):
+                        continue
+                elif first != char:
+                    continue
+            body = f'(?i:{pattern})' if ignore_case else pattern
+            parts.append(f'(?=(?P<_p{pattern_id}>{body}))?')
+            pattern_ids.append(pattern_id)
+
+        regex = re.compile(''.join(parts))
+        entries = [(regex.groupindex[f'_p{i}'] - 1, i) for i in pattern_ids]
+        scanner = (regex, entries)
+        self._position_scanners[char] = scanner
+        return scanner
+
+    def scan(self, text_lower):
+        hits = {}
+        for m in self.scanner.finditer(text_lower):
+            pos = m.start()
+            regex, entries = self._position_scanner(text_lower[pos:pos + 1])
+            groups = regex.match(text_lower, pos).groups()
+            for group_index, pattern_id in entries:
+                value = groups[group_index]
+                if value is not None:
+                    hits.setdefault(pattern_id, []).append((pos, pos + len(value), value))
+        return hits
+
+
+class AhoCorasickMatcher(_PatternTableMatcher):
+    """
+    Aho-Corasick关键词自动机匹配器
+
+    规则表中绝大多数模式是字面关键词（英文单词加 \\b 边界，或中文字串），
+    这些关键词构建成一个自动机，扫描时间只与标题长度线性相关，与词表大小无关。
+    命中后仅对要求 \\b 的关键词检查单词边界；少数真正的正则（如 soft\\s*gel）
+    交给CompiledRegexMatcher处理。输出与逐条正则匹配的结果完全一致。
+    """
+
+    def __init__(self, pack_forms, others_patterns):
+        """
+        Args:
+            pack_forms (dict): 主要剂型 -> 正则模式列表
+            others_patterns (dict): Others类剂型 -> 正则模式列表
+        """
+        super().__init__(pack_forms, others_patterns)
+
+        # 状态转移表、失败指针、输出表
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        regex_ids = []
+        for pattern_id, (_, _, pattern, ignore_case) in enumerate(self.patterns):
+            literal = parse_literal(pattern)
+            if literal is None:
+                regex_ids.append(pattern_id)
+                continue
+            keyword, left, right = literal
+            if ignore_case:
+                keyword = keyword.lower()
+            self._add_keyword(keyword, (
+                pattern_id, len(keyword), keyword, ignore_case,
+                # 开头/结尾的 \b：None表示不检查，否则为边界外侧是否应为非单词字符
+                is_word_char(keyword[0]) if left else None,
+                is_word_char(keyword[-1]) if right else None,
+            ))
+        self._build_failure_links()
+
+        # 字母表中的字符（含忽略大小写的关键词字符）
+        self._alphabet = set()
+        for transitions in self._goto:
+            self._alphabet.update(transitions)
+        self._ignore_case_chars = sorted({
+            c for entries in self._output for entry in entries if entry[3]
+            for c in entry[2] if c.lower() != c.upper()
+        })
+        # 文本字符 -> 自动机字符（仅在忽略大小写时才会映射为不同字符）
+        self._fold = {c: c for c in self._alphabet}
+
+        self.regex_ids = regex_ids
+        self._fallback = None
+        if regex_ids:
+            self._fallback = CompiledRegexMatcher(pack_forms, others_patterns, regex_ids)
+
+    def _add_keyword(self, keyword, entry):
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(entry)
+
+    def _build_failure_links(self):
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def _fold_char(self, char):
+        """把不在字母表中的字符映射为忽略大小写时等价的关键词字符"""
+        folded = char
+        if char.lower() != char.upper():
+            for candidate in self._ignore_case_chars:
+                if re.fullmatch(re.escape(candidate), char, re.IGNORECASE):
+                    folded = candidate
+                    break
+        self._fold[char] = folded
+        return folded
+
+    def scan(self, text_lower):
+        hits = {}
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        fold = self._fold
+        length = len(text_lower)
+        state = 0
+        folded_any = False
+
+        for i, char in enumerate(text_lower):
+            key = fold.get(char)
+            if key is None:
+                key = self._fold_char(char)
+            if key != char:
+                folded_any = True
+            while state and key not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(key, 0)
+            if not state:
+                continue
+            for pattern_id, size, keyword, ignore_case, left, right in output[state]:
+                start = i + 1 - size
+                if left is not None:
+                    if left != (start == 0 or not is_word_char(text_lower[start - 1])):
+                        continue
+                if right is not None:
+                    if right != (i + 1 == length or not is_word_char(text_lower[i + 1])):
+                        continue
+                value = text_lower[start:i + 1]
+                # 折叠过字符时，区分大小写的关键词需要逐字确认
+                if folded_any and not ignore_case and value != keyword:
+                    continue
+                hits.setdefault(pattern_id, []).append((start, i + 1, value))
+
+        if self._fallback is not None:
+            hits.update(self._fallback.scan(text_lower))
+        return hits
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+打标运行指标
+记录整次运行的实际耗时，以及各处理阶段的耗时、CPU时间、处理行数和内存峰值，并导出为JSON-lines或
+Prometheus文本文件；另提供打标服务使用的请求延迟直方图
+
+多进程运行时各阶段的耗时是所有工作进程的累计值（worker_seconds），会大于实际耗时（elapsed_seconds）。
+"""
+
+import contextlib
+import itertools
+import json
+import os
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows没有resource模块
+    resource = None
+
+
+def _max_rss_bytes():
+    """当前进程的最大常驻内存（字节），不支持的平台返回None"""
+    if resource is None:
+        return None
+    # Linux上ru_maxrss的单位为KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class RunMetrics:
+    """
+    一次打标运行的分阶段指标
+
+    用法:
+        metrics = RunMetrics()
+        with metrics.stage('read_excel') as stage:
+            df = pd.read_excel(path)
+            stage['rows'] = len(df)
+        metrics.finish()
+        metrics.as_dict()
+    """
+
+    def __init__(self, trace_memory=False):
+        """
+        Args:
+            trace_memory (bool): 是否用tracemalloc记录每个阶段的Python内存峰值（有额外开销）
+        """
+        self.trace_memory = trace_memory
+        self.started_at = time.time()
+        self._clock_start = time.perf_counter()
+        # 整次运行的实际耗时，finish()之前为None，as_dict()时按当前时间计算
+        self.elapsed_seconds = None
+        # 阶段名称 -> 累计指标，同名阶段多次执行（如分批处理）时累加
+        self._stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        记录一个处理阶段，上下文中可设置 stage['rows'] 为该阶段处理的行数
+
+        Args:
+            name (str): 阶段名称，同名阶段的耗时和行数累加
+        """
+        current = {'rows': 0}
+        started_tracing = False
+        if self.trace_memory:
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+                started_tracing = True
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield current
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            peak_traced = None
+            if self.trace_memory:
+                peak_traced = tracemalloc.get_traced_memory()[1]
+                if started_tracing:
+                    tracemalloc.stop()
+            self._add(name, current['rows'], wall, cpu, _max_rss_bytes(), peak_traced)
+
+    def _add(self, name, rows, wall, cpu, max_rss, peak_traced=None, calls=1):
+        """累加一次阶段执行的指标"""
+        record = self._stages.setdefault(name, {
+            'stage': name, 'calls': 0, 'rows': 0, 'worker_seconds': 0.0, 'cpu_seconds': 0.0,
+            'max_rss_bytes': None, 'peak_traced_bytes': None
+        })
+        record['calls'] += calls
+        record['rows'] += rows
+        record['worker_seconds'] += wall
+        record['cpu_seconds'] += cpu
+        for key, value in (('max_rss_bytes', max_rss), ('peak_traced_bytes', peak_traced)):
+            if value is not None:
+                record[key] = max(record[key] or 0, value)
+
+    def finish(self, elapsed_seconds=None):
+        """
+        结束计时，记录整次运行的实际耗时
+
+        Args:
+            elapsed_seconds (float): 可选，直接指定实际耗时，默认为创建以来经过的时间
+        """
+        if elapsed_seconds is None:
+            elapsed_seconds = time.perf_counter() - self._clock_start
+        self.elapsed_seconds = elapsed_seconds
+
+    def add_stages(self, metrics):
+        """
+        并入另一次运行（如工作进程中处理的工作表）的各阶段指标
+
+        只累加各阶段的耗时和行数，本次运行的实际耗时不变。
+
+        Args:
+            metrics (dict): RunMetrics.as_dict()的结果
+        """
+        self.started_at = min(self.started_at, metrics['started_at'])
+        for record in metrics['stages']:
+            self._add(record['stage'], record['rows'], record['worker_seconds'], record['cpu_seconds'],
+                      record['max_rss_bytes'], record.get('peak_traced_bytes'), record['calls'])
+
+    def as_dict(self):
+        """
+        导出为字典
+
+        Returns:
+            dict: {'started_at': 开始时间戳, 'stages': [各阶段指标], 'total': 汇总指标}；
+                  total中elapsed_seconds为实际耗时，worker_seconds和cpu_seconds为各阶段（各工作进程）的累计值，
+                  rows_per_sec为处理行数最多的阶段的行数除以实际耗时
+        """
+        stages = []
+        for record in self._stages.values():
+            record = dict(record)
+            seconds = record['worker_seconds']
+            record['worker_seconds'] = round(seconds, 6)
+            record['cpu_seconds'] = round(record['cpu_seconds'], 6)
+            record['rows_per_sec'] = round(record['rows'] / seconds, 1) if seconds > 0 and record['rows'] else None
+            stages.append(record)
+
+        elapsed = self.elapsed_seconds
+        if elapsed is None:
+            elapsed = time.perf_counter() - self._clock_start
+        rows = max((record['rows'] for record in stages), default=0)
+        rss = [record['max_rss_bytes'] for record in stages if record['max_rss_bytes'] is not None]
+        return {
+            'started_at': self.started_at,
+            'stages': stages,
+            'total': {
+                'elapsed_seconds': round(elapsed, 6),
+                'worker_seconds': round(sum(record['worker_seconds'] for record in stages), 6),
+                'cpu_seconds': round(sum(record['cpu_seconds'] for record in stages), 6),
+                'rows': rows,
+                'rows_per_sec': round(rows / elapsed, 1) if elapsed > 0 and rows else None,
+                'max_rss_bytes': max(rss) if rss else None,
+            },
+        }
+
+    def to_json(self):
+        """导出为JSON字符串"""
+        return json.dumps(self.as_dict(), ensure_ascii=False)
+
+
+def merge_metrics(metrics_dicts, elapsed_seconds=None):
+    """
+    按阶段名称合并多次运行的指标（如批量处理的多个文件）
+
+    Args:
+        metrics_dicts (list): RunMetrics.as_dict()的结果列表
+        elapsed_seconds (float): 整批运行的实际耗时；默认为各次运行实际耗时之和，只适用于依次执行的运行
+
+    Returns:
+        dict: 与RunMetrics.as_dict()结构相同的汇总指标
+    """
+    merged = RunMetrics()
+    for metrics in metrics_dicts:
+        merged.add_stages(metrics)
+    if elapsed_seconds is None:
+        elapsed_seconds = sum(metrics['total']['elapsed_seconds'] for metrics in metrics_dicts)
+    merged.finish(elapsed_seconds)
+    return merged.as_dict()
+
+
+def track(metrics, name):
+    """
+    记录一个处理阶段，metrics为None时不做任何记录
+
+    Args:
+        metrics (RunMetrics): 指标对象，可为None
+        name (str): 阶段名称
+    """
+    if metrics is None:
+        return contextlib.nullcontext({'rows': 0})
+    return metrics.stage(name)
+
+
+def write_jsonl(path, metrics, **labels):
+    """
+    以JSON-lines格式追加一条指标记录
+
+    Args:
+        path (str): 输出文件路径
+        metrics (dict): RunMetrics.as_dict()的结果
+        **labels: 附加到记录上的标签，如 job='nightly'
+    """
+    record = dict(labels)
+    record.update(metrics)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def write_prometheus(path, metrics, **labels):
+    """
+    写出Prometheus node_exporter文本文件采集器格式的指标（原子替换）
+
+    Args:
+        path (str): 输出文件路径，通常以 .prom 结尾
+        metrics (dict): RunMetrics.as_dict()的结果
+        **labels: 附加到每个指标上的标签
+    """
+    series = [
+        ('pack_form_stage_worker_seconds', 'Time spent in each labeling stage, summed over worker processes',
+         'worker_seconds'),
+        ('pack_form_stage_cpu_seconds', 'CPU time per labeling stage, summed over worker processes', 'cpu_seconds'),
+        ('pack_form_stage_rows', 'Rows processed per labeling stage', 'rows'),
+        ('pack_form_stage_rows_per_second', 'Throughput of a single worker per labeling stage', 'rows_per_sec'),
+        ('pack_form_stage_max_rss_bytes', 'Peak resident memory at the end of each stage', 'max_rss_bytes'),
+        ('pack_form_stage_peak_traced_bytes', 'Peak traced Python memory during each stage', 'peak_traced_bytes'),
+    ]
+    base_labels = ''.join(f',{key}="{_escape_label(value)}"' for key, value in labels.items())
+
+    lines = []
+    for name, help_text, key in series:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} gauge')
+        for record in metrics['stages']:
+            value = record.get(key)
+            if value is not None:
+                lines.append(f'{name}{{stage="{_escape_label(record["stage"])}"{base_labels}}} {value}')
+
+    total_labels = '{' + base_labels.lstrip(',') + '}' if base_labels else ''
+    run_series = [
+        ('pack_form_run_wall_seconds', 'Elapsed wall time of the whole labeling run', 'elapsed_seconds'),
+        ('pack_form_run_worker_seconds', 'Stage time of the run summed over worker processes', 'worker_seconds'),
+        ('pack_form_run_cpu_seconds', 'CPU time of the run summed over worker processes', 'cpu_seconds'),
+        ('pack_form_run_rows_per_second', 'Rows labeled per second of elapsed wall time', 'rows_per_sec'),
+    ]
+    for name, help_text, key in run_series:
+        value = metrics['total'].get(key)
+        if value is not None:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name}{total_labels} {value}')
+    lines.append('# HELP pack_form_run_timestamp_seconds Start time of the labeling run')
+    lines.append('# TYPE pack_form_run_timestamp_seconds gauge')
+    lines.append(f'pack_form_run_timestamp_seconds{total_labels} {metrics["started_at"]}')
+
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(temp_path, path)
+
+
+# 请求延迟直方图的默认桶上界（秒）
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class LatencyHistogram:
+    """
+    累积分桶的延迟直方图，与Prometheus的histogram类型一致
+
+    用法:
+        histogram = LatencyHistogram()
+        histogram.observe(0.003)
+        histogram.quantile(0.99)
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """
+        Args:
+            buckets (tuple): 递增的桶上界，最后隐含一个+Inf桶
+        """
+        self.buckets = tuple(buckets)
+        # 每个桶（含+Inf）内的观测次数，非累积
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """记录一次观测值"""
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        按桶内线性插值估算分位数
+
+        Args:
+            q (float): 0到1之间的分位点
+
+        Returns:
+            float: 估算的分位数，没有观测值时返回None；落在+Inf桶时返回最大的桶上界
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, self.counts):
+            if count and cumulative + count >= rank:
+                return lower + (bound - lower) * (rank - cumulative) / count
+            cumulative += count
+            lower = bound
+        return self.buckets[-1]
+
+    def as_dict(self):
+        """
+        导出为字典
+
+        Returns:
+            dict: 观测次数、总和、均值、p50/p95/p99估算值和累积桶计数
+        """
+        cumulative = list(itertools.accumulate(self.counts))
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'mean': round(self.sum / self.count, 6) if self.count else None,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': {**{str(bound): n for bound, n in zip(self.buckets, cumulative)}, '+Inf': cumulative[-1]},
+        }
+
+    def prometheus_lines(self, name, **labels):
+        """
+        生成Prometheus文本格式的样本行（不含HELP和TYPE）
+
+        Args:
+            name (str): 指标名称
+            **labels: 附加到每个样本上的标签
+        """
+        base_labels = ''.join(f',{key}="{_escape_label(value)}"' for key, value in labels.items())
+        lines = []
+        for bound, count in zip(self.buckets + ('+Inf',), itertools.accumulate(self.counts)):
+            lines.append(f'{name}_bucket{{le="{bound}"{base_labels}}} {count}')
+        total_labels = '{' + base_labels.lstrip(',') + '}' if base_labels else ''
+        lines.append(f'{name}_sum{total_labels} {self.sum}')
+        lines.append(f'{name}_count{total_labels} {self.count}')
+        return lines
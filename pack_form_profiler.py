@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+剂型规则性能分析
+用一批产品标题逐条运行规则表中的每个模式，统计各模式的执行次数、命中次数和耗时，
+并标出重复、无法命中或命中过多的模式，便于精简规则表
+
+用法:
+    python pack_form_profiler.py data/*.xlsx --top 30
+    python pack_form_profiler.py --synthetic 50000 --sort hits -o pattern_profile.csv
+"""
+
+import argparse
+import re
+import sys
+import time
+
+import pandas as pd
+
+from pack_form_labeler import PackFormLabeler, expand_input_paths
+from pack_form_matchers import is_word_char, parse_literal
+
+# 报告的排序方式 -> 排序字段
+SORT_KEYS = {
+    'time': 'total_ms',
+    'hits': 'hits',
+    'hit_rate': 'hit_rate',
+    'exclusive': 'exclusive_hits',
+}
+
+
+def static_flags(pattern, table, seen_patterns):
+    """
+    不运行语料即可判断的问题
+
+    Args:
+        pattern (str): 正则模式
+        table (str): 'pack_forms' 或 'others_patterns'
+        seen_patterns (set): 同一剂型中已出现过的模式
+
+    Returns:
+        list: 问题标记
+    """
+    flags = []
+    if pattern in seen_patterns:
+        flags.append('duplicate')
+    # pack_forms在小写文本上匹配且不忽略大小写，含大写字母的模式永远不会命中
+    if table == 'pack_forms' and re.sub(r'\\.', '', pattern) != re.sub(r'\\.', '', pattern).lower():
+        flags.append('uppercase')
+    # \b紧邻中文字符时，只有中文前后是空格、标点或文本边界才会命中
+    literal = parse_literal(pattern)
+    if literal is not None:
+        keyword, left, right = literal
+        if (left and is_word_char(keyword[0]) and not keyword[0].isascii()) or \
+                (right and is_word_char(keyword[-1]) and not keyword[-1].isascii()):
+            flags.append('cjk_boundary')
+    return flags
+
+
+def profile_patterns(labeler, texts):
+    """
+    按原始的逐条匹配方式运行每个模式，统计执行次数、命中次数和耗时
+
+    主要剂型的每个模式对每个标题都执行一次re.findall；Others类剂型与detect_others_forms一致，
+    同一剂型中前面的模式命中后不再执行后面的模式。
+
+    Args:
+        labeler (PackFormLabeler): 提供规则表的标签器
+        texts (iterable): 产品描述，非字符串的值会被跳过
+
+    Returns:
+        list: 每个模式一条记录（dict），按规则表顺序排列
+    """
+    texts_lower = [text.lower() for text in texts if isinstance(text, str)]
+    rows = len(texts_lower)
+    records = []
+
+    def new_record(table, form, pattern, seen):
+        return {
+            'table': table,
+            'form': form,
+            'pattern': pattern,
+            'literal': parse_literal(pattern) is not None,
+            'evaluations': 0,
+            'hits': 0,
+            'matches': 0,
+            'exclusive_hits': 0,
+            'total_ms': 0.0,
+            'flags': static_flags(pattern, table, seen),
+        }
+
+    for form, patterns in labeler.pack_forms.items():
+        form_records = []
+        hit_sets = []
+        seen = set()
+        for pattern in patterns:
+            record = new_record('pack_forms', form, pattern, seen)
+            seen.add(pattern)
+            compiled = re.compile(pattern)
+            start = time.perf_counter()
+            found = [compiled.findall(text) for text in texts_lower]
+            record['total_ms'] = (time.perf_counter() - start) * 1000
+            hit_rows = {i for i, matches in enumerate(found) if matches}
+            record['evaluations'] = rows
+            record['hits'] = len(hit_rows)
+            record['matches'] = sum(len(matches) for matches in found)
+            form_records.append(record)
+            hit_sets.append(hit_rows)
+        _count_exclusive_hits(form_records, hit_sets)
+        records.extend(form_records)
+
+    for form, patterns in labeler.others_patterns.items():
+        form_records = []
+        hit_sets = []
+        seen = set()
+        # 同一剂型中尚未被前面的模式命中的标题
+        remaining = list(range(rows))
+        for pattern in patterns:
+            record = new_record('others_patterns', form, pattern, seen)
+            seen.add(pattern)
+            compiled = re.compile(pattern, re.IGNORECASE)
+            start = time.perf_counter()
+            found = [compiled.search(texts_lower[i]) is not None for i in remaining]
+            record['total_ms'] = (time.perf_counter() - start) * 1000
+            hit_rows = {i for i, hit in zip(remaining, found) if hit}
+            record['evaluations'] = len(remaining)
+            record['hits'] = record['matches'] = len(hit_rows)
+            remaining = [i for i, hit in zip(remaining, found) if not hit]
+            form_records.append(record)
+            hit_sets.append(hit_rows)
+        _count_exclusive_hits(form_records, hit_sets)
+        records.extend(form_records)
+
+    for record in records:
+        evaluations = record['evaluations']
+        record['hit_rate'] = record['hits'] / evaluations if evaluations else 0.0
+        record['us_per_eval'] = record['total_ms'] * 1000 / evaluations if evaluations else 0.0
+        if evaluations and record['hits'] == 0:
+            record['flags'].append('no_hits')
+    return records
+
+
+def _count_exclusive_hits(form_records, hit_sets):
+    """统计每个模式独自检测出该剂型的标题数，为0说明删除该模式不影响分类结果"""
+    for i, record in enumerate(form_records):
+        others = set().union(*(hits for j, hits in enumerate(hit_sets) if j != i))
+        record['exclusive_hits'] = len(hit_sets[i] - others)
+
+
+def flag_frequent(records, threshold):
+    """标记命中率超过阈值的模式（可能过于宽泛）"""
+    for record in records:
+        if record['hit_rate'] > threshold:
+            record['flags'].append('frequent')
+
+
+def rank_patterns(records, sort='time'):
+    """
+    对模式记录排序
+
+    Args:
+        records (list): profile_patterns的结果
+        sort (str): 'time'、'hits'、'hit_rate' 或 'exclusive'
+
+    Returns:
+        list: 排序后的记录，exclusive按升序（最可删除的在前），其余按降序
+    """
+    key = SORT_KEYS[sort]
+    return sorted(records, key=lambda record: record[key], reverse=(sort != 'exclusive'))
+
+
+def records_to_frame(records):
+    """转换为DataFrame，便于保存为CSV或Excel"""
+    frame = pd.DataFrame(records)
+    frame['flags'] = frame['flags'].map(','.join)
+    return frame
+
+
+def print_profile(records, rows, top=None):
+    """打印排序后的模式报告"""
+    total_ms = sum(record['total_ms'] for record in records)
+    print(f"语料 {rows} 行，{len(records)} 个模式，总耗时 {total_ms:.1f} ms")
+    print(f"{'rank':>4}  {'form':<12}{'pattern':<28}{'evals':>9}{'hits':>8}{'excl':>7}"
+          f"{'hit%':>8}{'ms':>10}{'us/eval':>9}  flags")
+    for rank, record in enumerate(records[:top] if top else records, 1):
+        print(
+            f"{rank:>4}  {record['form']:<12}{record['pattern']:<28}{record['evaluations']:>9}"
+            f"{record['hits']:>8}{record['exclusive_hits']:>7}{record['hit_rate'] * 100:>7.2f}%"
+            f"{record['total_ms']:>10.2f}{record['us_per_eval']:>9.3f}  {','.join(record['flags'])}"
+        )
+
+    sections = [
+        ({'duplicate', 'uppercase'}, '永远不会命中或重复的模式（可直接删除）'),
+        ({'cjk_boundary'}, '\\b紧邻中文字符的模式（仅在中文前后为空格、标点或文本边界时命中）'),
+        ({'frequent'}, '命中率过高的模式（可能过于宽泛）'),
+    ]
+    for flags, title in sections:
+        flagged = [record for record in records if flags & set(record['flags'])]
+        if flagged:
+            print(f"\n{title}:")
+            for record in flagged:
+                print(f"  {record['form']}: {record['pattern']}  [{','.join(record['flags'])}]")
+
+    no_hits = sum('no_hits' in record['flags'] for record in records)
+    if no_hits:
+        print(f"\n本语料中未命中的模式: {no_hits} 个（见flags列中的no_hits）")
+
+
+def load_texts(inputs, product_column='Product', recursive=False):
+    """从Excel文件中读取产品描述列"""
+    texts = []
+    for input_file in expand_input_paths(inputs, recursive=recursive):
+        df = pd.read_excel(input_file, usecols=[product_column])
+        texts.extend(df[product_column].tolist())
+    return texts
+
+
+def build_arg_parser():
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(description='剂型规则性能分析：统计每个模式的执行次数、命中次数和耗时')
+    parser.add_argument('inputs', nargs='*', help='作为语料的Excel文件、通配符或目录')
+    parser.add_argument('--product-column', default='Product', help='产品描述列名（默认 Product）')
+    parser.add_argument('-r', '--recursive', action='store_true', help='递归查找目录中的Excel文件')
+    parser.add_argument('--synthetic', type=int, metavar='ROWS',
+                        help='使用指定行数的合成标题作为语料（benchmarks.synthetic）')
+    parser.add_argument('--seed', type=int, default=0, help='合成语料的随机种子（默认0）')
+    parser.add_argument('--sort', choices=list(SORT_KEYS), default='time', help='排序方式（默认time）')
+    parser.add_argument('--top', type=int, help='只打印前N个模式')
+    parser.add_argument('--frequent-threshold', type=float, default=0.2,
+                        help='命中率超过该值的模式标记为frequent（默认0.2）')
+    parser.add_argument('-o', '--output', help='保存完整报告的文件（.csv、.xlsx 或 .json）')
+    return parser
+
+
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if not args.inputs and not args.synthetic:
+        parser.error('请指定Excel文件或 --synthetic 行数')
+
+    if args.synthetic:
+        from benchmarks.synthetic import generate_titles
+        texts = generate_titles(args.synthetic, seed=args.seed, duplicate_ratio=0.0)
+    else:
+        texts = load_texts(args.inputs, args.product_column, args.recursive)
+
+    records = profile_patterns(PackFormLabeler(engine='legacy'), texts)
+    flag_frequent(records, args.frequent_threshold)
+    records = rank_patterns(records, args.sort)
+    print_profile(records, sum(isinstance(text, str) for text in texts), args.top)
+
+    if args.output:
+        frame = records_to_frame(records)
+        if args.output.endswith('.json'):
+            frame.to_json(args.output, orient='records', force_ascii=False, indent=2)
+        elif args.output.endswith('.xlsx'):
+            frame.to_excel(args.output, index=False)
+        else:
+            frame.to_csv(args.output, index=False, encoding='utf-8-sig')
+        print(f"\n报告已保存到: {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+剂型规则包
+规则表（pack_forms、standardization_map、others_patterns）保存在外部的规则包文件（JSON/YAML）中，
+带版本号和校验和
+
+用法:
+    python pack_form_rules.py stamp rules/pack_form_rules.json --version 1.1.0   # 修改规则后更新版本和校验和
+    python pack_form_rules.py verify rules/pack_form_rules.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+# 随程序发布的默认规则包
+DEFAULT_RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules', 'pack_form_rules.json')
+
+# 规则包中的规则表
+RULE_TABLES = ('pack_forms', 'standardization_map', 'others_patterns')
+
+
+def rules_checksum(rules):
+    """
+    计算规则表的校验和
+
+    Args:
+        rules (dict): 包含pack_forms、standardization_map和others_patterns的规则包
+
+    Returns:
+        str: SHA-256十六进制摘要，前16位即PackFormLabeler的规则集指纹
+    """
+    tables = json.dumps([rules[table] for table in RULE_TABLES], ensure_ascii=False)
+    return hashlib.sha256(tables.encode('utf-8')).hexdigest()
+
+
+def _read_source(path):
+    """读取JSON或YAML格式的规则包"""
+    with open(path, encoding='utf-8') as f:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("读取YAML规则包需要安装PyYAML: pip install pyyaml")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def read_rule_pack(path):
+    """
+    读取并校验规则包文件
+
+    Args:
+        path (str): 规则包路径（.json、.yaml 或 .yml）
+
+    Returns:
+        dict: 规则包，另附 path 和 mtime 字段
+    """
+    rules = _read_source(path)
+    missing = [table for table in RULE_TABLES if table not in rules]
+    if missing:
+        raise ValueError(f"规则包缺少规则表: {missing}")
+
+    checksum = rules_checksum(rules)
+    if rules.get('checksum') and rules['checksum'] != checksum:
+        raise ValueError(
+            f"规则包校验和不一致: {path}，修改规则后请运行 python pack_form_rules.py stamp {path}"
+        )
+    rules['checksum'] = checksum
+    rules.setdefault('version', 'unversioned')
+    rules['path'] = os.path.abspath(path)
+    rules['mtime'] = os.path.getmtime(path)
+    return rules
+
+
+def stamp_rule_pack(path, version=None):
+    """
+    重新计算规则包的校验和（可同时更新版本号）并写回文件
+
+    Args:
+        path (str): JSON规则包路径
+        version (str): 新版本号，为None时保留原版本号
+
+    Returns:
+        dict: 更新后的规则包
+    """
+    if path.endswith(('.yaml', '.yml')):
+        raise ValueError("stamp只支持JSON规则包，YAML规则包请手动更新checksum字段")
+    rules = _read_source(path)
+    if version is not None:
+        rules['version'] = version
+    rules['checksum'] = rules_checksum(rules)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(rules, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+    return rules
+
+
+def load_rules(path=None):
+    """
+    加载规则包
+
+    Args:
+        path (str): 规则包路径，默认为随程序发布的规则包
+
+    Returns:
+        dict: 规则包
+    """
+    return read_rule_pack(path if path is not None else DEFAULT_RULES_FILE)
+
+
+def build_arg_parser():
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(description='剂型规则包工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    stamp = subparsers.add_parser('stamp', help='重新计算规则包的校验和（修改规则后运行）')
+    stamp.add_argument('rules', nargs='?', default=DEFAULT_RULES_FILE, help='规则包路径')
+    stamp.add_argument('--version', help='同时更新版本号')
+
+    verify = subparsers.add_parser('verify', help='校验规则包')
+    verify.add_argument('rules', nargs='?', default=DEFAULT_RULES_FILE, help='规则包路径')
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    try:
+        if args.command == 'stamp':
+            rules = stamp_rule_pack(args.rules, args.version)
+            print(f"已更新 {args.rules}: 版本 {rules['version']}，校验和 {rules['checksum'][:16]}")
+        else:
+            rules = read_rule_pack(args.rules)
+            print(f"校验通过: {args.rules}，版本 {rules['version']}，校验和 {rules['checksum'][:16]}")
+    except Exception as e:
+        print(f"处理过程中出现错误: {str(e)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,532 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+剂型打标HTTP服务
+常驻一个已加载规则的PackFormLabeler，通过本地HTTP接口为单条或小批量标题打标、标准化剂型名称。
+同一时间到达的请求合并为微批次，去重后批量打标，并统计各接口的延迟直方图
+
+用法:
+    python pack_form_service.py --port 8765
+    curl -X POST localhost:8765/label -d '{"text": "Vitamin C 500mg 60 Capsules"}'
+    curl -X POST localhost:8765/label -d '{"texts": ["Fish Oil Softgels", "Kids Gummies"]}'
+    curl -X POST localhost:8765/standardize -d '{"values": ["capsules", "Fl. Oz."]}'
+    curl localhost:8765/metrics
+
+接口:
+    POST /label         {"text": "..."} 或 {"texts": [...]}
+    POST /standardize   {"value": "..."} 或 {"values": [...]}
+    GET  /health        服务状态和规则包版本
+    GET  /stats         JSON格式的延迟直方图和分位数
+    GET  /metrics       Prometheus文本格式的延迟直方图
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from pack_form_cache import LabelCache
+from pack_form_labeler import PackFormLabeler
+from pack_form_metrics import LatencyHistogram
+
+# 请求体大小上限
+MAX_BODY_BYTES = 8 * 1024 * 1024
+# 单个请求头的行数上限
+MAX_HEADER_LINES = 100
+# 微批次大小（条目数）的直方图桶
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+
+HTTP_REASONS = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    413: 'Payload Too Large', 500: 'Internal Server Error',
+}
+
+
+class HTTPError(Exception):
+    """返回给客户端的HTTP错误"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class MicroBatcher:
+    """
+    把并发到达的请求合并为微批次
+
+    第一个请求到达后最多等待max_wait秒（或凑满max_batch个条目），
+    然后把这段时间内所有请求的条目交给handler一次处理，再按请求拆分结果。
+    """
+
+    def __init__(self, handler, executor, max_batch=512, max_wait=0.002, on_batch=None):
+        """
+        Args:
+            handler (callable): 批处理函数，输入条目列表，返回等长的结果列表；在executor中执行
+            executor (Executor): 执行handler的线程池
+            max_batch (int): 每个批次最多合并的条目数（单个请求的条目不拆分）
+            max_wait (float): 第一个请求到达后等待其他请求的最长时间（秒）
+            on_batch (callable): 每个批次处理完后的回调，参数为 (条目数, 请求数, 耗时秒数)
+        """
+        self.handler = handler
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.on_batch = on_batch
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    def start(self):
+        """在当前事件循环中启动批处理任务"""
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """停止批处理任务"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, items):
+        """
+        提交一个请求的条目，等待所在批次处理完成
+
+        Args:
+            items (list): 条目列表
+
+        Returns:
+            list: 与items对齐的结果
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((items, future))
+        return await future
+
+    async def _collect(self):
+        """取出一个批次的请求：阻塞等待第一个请求，再在max_wait内收集后续请求"""
+        pending = [await self._queue.get()]
+        size = len(pending[0][0])
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                request = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            pending.append(request)
+            size += len(request[0])
+        # 已在队列中的请求不再等待，直接并入本批次
+        while size < self.max_batch and not self._queue.empty():
+            request = self._queue.get_nowait()
+            pending.append(request)
+            size += len(request[0])
+        return pending, size
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending, size = await self._collect()
+            items = [item for request_items, _ in pending for item in request_items]
+            start = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(self.executor, self.handler, items)
+            except Exception as e:
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            if self.on_batch is not None:
+                self.on_batch(size, len(pending), time.perf_counter() - start)
+            offset = 0
+            for request_items, future in pending:
+                if not future.done():
+                    future.set_result(results[offset:offset + len(request_items)])
+                offset += len(request_items)
+
+
+class LabelingService:
+    """
+    常驻标签器的打标服务
+
+    打标和标准化请求分别合并为微批次，两类批次在同一个工作线程中依次执行，
+    标签器不会被并发调用；规则包文件被修改后，在下一个批次开始前重新加载规则。
+    """
+
+    def __init__(self, labeler, max_batch=512, max_wait_ms=2.0, reload_rules=True):
+        """
+        Args:
+            labeler (PackFormLabeler): 标签器
+            max_batch (int): 每个微批次最多合并的条目数
+            max_wait_ms (float): 合并请求的最长等待时间（毫秒），0表示只合并已排队的请求
+            reload_rules (bool): 是否在规则包文件被修改后自动重新加载
+        """
+        self.labeler = labeler
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.reload_rules = reload_rules
+        self.started_at = time.time()
+        self.request_latency = {
+            endpoint: LatencyHistogram() for endpoint in ('/label', '/standardize')
+        }
+        self.batch_latency = {kind: LatencyHistogram() for kind in ('label', 'standardize')}
+        self.batch_size = {kind: LatencyHistogram(BATCH_SIZE_BUCKETS) for kind in ('label', 'standardize')}
+        self.requests_per_batch = {kind: LatencyHistogram(BATCH_SIZE_BUCKETS) for kind in ('label', 'standardize')}
+        self.errors = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pack-form-batch')
+        self._batchers = {}
+
+    def start(self):
+        """在当前事件循环中启动微批处理任务"""
+        for kind, handler in (('label', self.label_batch), ('standardize', self.standardize_batch)):
+            self._batchers[kind] = MicroBatcher(
+                handler, self._executor, self.max_batch, self.max_wait,
+                on_batch=lambda size, requests, seconds, kind=kind: self._record_batch(kind, size, requests, seconds)
+            )
+            self._batchers[kind].start()
+
+    async def stop(self):
+        """停止微批处理任务并关闭工作线程"""
+        for batcher in self._batchers.values():
+            await batcher.stop()
+        self._executor.shutdown(wait=True)
+
+    def _record_batch(self, kind, size, requests, seconds):
+        self.batch_size[kind].observe(size)
+        self.requests_per_batch[kind].observe(requests)
+        self.batch_latency[kind].observe(seconds)
+
+    def _maybe_reload_rules(self):
+        """规则包被修改时重新加载；新规则无法加载时继续使用旧规则"""
+        if not self.reload_rules:
+            return
+        try:
+            if self.labeler.reload_rules_if_changed():
+                print(f"已重新加载规则包: {self.labeler.rules_version} ({self.labeler.ruleset_fingerprint()})")
+        except Exception as e:
+            print(f"重新加载规则包失败，继续使用当前规则: {str(e)}")
+
+    def label_batch(self, texts):
+        """
+        对一个微批次的产品标题打标：去重后批量打标，再按原顺序展开
+
+        Args:
+            texts (list): 产品描述（字符串或None）
+
+        Returns:
+            list: 与texts对齐的结果字典，NaN已替换为None
+        """
+        self._maybe_reload_rules()
+        return [_json_record(result)
+                for result in self.labeler.label_texts(texts, batch_size=max(len(texts), 1))]
+
+    def standardize_batch(self, values):
+        """
+        标准化一个微批次的剂型名称
+
+        Args:
+            values (list): 剂型名称（字符串或None）
+
+        Returns:
+            list: 与values对齐的结果字典，NaN已替换为None
+        """
+        self._maybe_reload_rules()
+        return [_json_record(result) for result in self.labeler.standardize_values(values)]
+
+    async def label(self, payload):
+        """处理 /label 请求"""
+        items, single = _request_items(payload, 'text', 'texts')
+        results = await self._batchers['label'].submit(items)
+        return {'result': results[0]} if single else {'results': results}
+
+    async def standardize(self, payload):
+        """处理 /standardize 请求"""
+        items, single = _request_items(payload, 'value', 'values')
+        results = await self._batchers['standardize'].submit(items)
+        return {'result': results[0]} if single else {'results': results}
+
+    def health(self):
+        """服务状态"""
+        return {
+            'status': 'ok',
+            'engine': self.labeler.engine,
+            'rules_version': self.labeler.rules_version,
+            'ruleset': self.labeler.ruleset_fingerprint(),
+            'uptime_seconds': round(time.time() - self.started_at, 3),
+        }
+
+    def stats(self):
+        """各接口的延迟直方图和微批次统计"""
+        return {
+            'requests': {endpoint: h.as_dict() for endpoint, h in self.request_latency.items()},
+            'batches': {
+                kind: {
+                    'latency': self.batch_latency[kind].as_dict(),
+                    'items': self.batch_size[kind].as_dict(),
+                    'requests': self.requests_per_batch[kind].as_dict(),
+                }
+                for kind in self.batch_latency
+            },
+            'errors': self.errors,
+            'cache': self.labeler.cache_info(),
+        }
+
+    def prometheus(self):
+        """Prometheus文本格式的指标"""
+        series = [
+            ('pack_form_service_request_seconds', 'Request latency per endpoint',
+             [(h, {'endpoint': endpoint}) for endpoint, h in self.request_latency.items()]),
+            ('pack_form_service_batch_seconds', 'Processing time per micro-batch',
+             [(h, {'kind': kind}) for kind, h in self.batch_latency.items()]),
+            ('pack_form_service_batch_items', 'Items per micro-batch',
+             [(h, {'kind': kind}) for kind, h in self.batch_size.items()]),
+            ('pack_form_service_batch_requests', 'Requests merged into each micro-batch',
+             [(h, {'kind': kind}) for kind, h in self.requests_per_batch.items()]),
+        ]
+        lines = []
+        for name, help_text, histograms in series:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for histogram, labels in histograms:
+                lines.extend(histogram.prometheus_lines(name, **labels))
+        lines.append('# HELP pack_form_service_errors_total Requests answered with an error status')
+        lines.append('# TYPE pack_form_service_errors_total counter')
+        lines.append(f'pack_form_service_errors_total {self.errors}')
+        return '\n'.join(lines) + '\n'
+
+    async def dispatch(self, method, path, body):
+        """
+        路由一个HTTP请求
+
+        Returns:
+            tuple: (状态码, 响应体对象或文本, Content-Type)
+        """
+        if path in ('/label', '/standardize'):
+            if method != 'POST':
+                raise HTTPError(405, f'{path} 只支持POST')
+            try:
+                payload = json.loads(body or b'{}')
+            except ValueError:
+                raise HTTPError(400, '请求体不是有效的JSON')
+            start = time.perf_counter()
+            handler = self.label if path == '/label' else self.standardize
+            response = await handler(payload)
+            self.request_latency[path].observe(time.perf_counter() - start)
+            return 200, response, 'application/json'
+        if path not in ('/health', '/stats', '/metrics'):
+            raise HTTPError(404, f'未知的接口: {path}')
+        if method != 'GET':
+            raise HTTPError(405, f'{path} 只支持GET')
+        if path == '/health':
+            return 200, self.health(), 'application/json'
+        if path == '/stats':
+            return 200, self.stats(), 'application/json'
+        return 200, self.prometheus(), 'text/plain; version=0.0.4'
+
+    async def handle_connection(self, reader, writer):
+        """处理一个HTTP/1.1连接，支持keep-alive"""
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, path, keep_alive, body = request
+                try:
+                    status, response, content_type = await self.dispatch(method, path, body)
+                except HTTPError as e:
+                    self.errors += 1
+                    status, response, content_type = e.status, {'error': str(e)}, 'application/json'
+                except Exception as e:
+                    self.errors += 1
+                    status, response, content_type = 500, {'error': str(e)}, 'application/json'
+                _write_response(writer, status, response, content_type, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except HTTPError as e:
+            # 请求本身无法解析，返回错误后关闭连接
+            self.errors += 1
+            _write_response(writer, e.status, {'error': str(e)}, 'application/json', False)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+
+def _request_items(payload, single_key, batch_key):
+    """
+    从请求体中取出条目列表，返回 (条目列表, 是否为单条请求)
+
+    在进入微批次之前校验，条目不是字符串或null的请求只向该请求返回400，不影响同一批次的其他请求。
+    """
+    if not isinstance(payload, dict):
+        raise HTTPError(400, f'请求体应为JSON对象，包含 {single_key} 或 {batch_key}')
+    if batch_key in payload:
+        items = payload[batch_key]
+        if not isinstance(items, list):
+            raise HTTPError(400, f'{batch_key} 应为数组')
+        for i, item in enumerate(items):
+            if item is not None and not isinstance(item, str):
+                raise HTTPError(400, f'{batch_key}[{i}] 应为字符串或null，实际为 {json.dumps(item)}')
+        return items, False
+    if single_key in payload:
+        item = payload[single_key]
+        if item is not None and not isinstance(item, str):
+            raise HTTPError(400, f'{single_key} 应为字符串或null，实际为 {json.dumps(item)}')
+        return [item], True
+    raise HTTPError(400, f'请求体缺少 {single_key} 或 {batch_key}')
+
+
+def _json_record(result):
+    """把结果元组转为字典，NaN替换为None，响应中序列化为null而不是非法的NaN"""
+    return {key: None if isinstance(value, float) and math.isnan(value) else value
+            for key, value in result._asdict().items()}
+
+
+async def _read_request(reader):
+    """
+    读取一个HTTP请求
+
+    Returns:
+        tuple: (方法, 路径, 是否保持连接, 请求体)，连接已关闭时返回None
+    """
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    try:
+        method, target, version = request_line.decode('latin-1').split()
+    except ValueError:
+        raise HTTPError(400, '无效的请求行')
+
+    headers = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise HTTPError(400, '请求头过长')
+
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise HTTPError(400, '无效的Content-Length')
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, f'请求体超过 {MAX_BODY_BYTES} 字节')
+    body = await reader.readexactly(length) if length else b''
+
+    connection = headers.get('connection', '').lower()
+    keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+    return method.upper(), urlsplit(target).path, keep_alive, body
+
+
+def _write_response(writer, status, response, content_type, keep_alive):
+    """写出HTTP响应"""
+    if isinstance(response, str):
+        body = response.encode('utf-8')
+    else:
+        body = json.dumps(response, ensure_ascii=False, allow_nan=False).encode('utf-8')
+    if 'charset' not in content_type:
+        content_type += '; charset=utf-8'
+    head = (
+        f'HTTP/1.1 {status} {HTTP_REASONS.get(status, "")}\r\n'
+        f'Content-Type: {content_type}\r\n'
+        f'Content-Length: {len(body)}\r\n'
+        f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'
+    )
+    writer.write(head.encode('latin-1') + body)
+
+
+async def serve(service, host='127.0.0.1', port=8765, ready=None):
+    """
+    启动HTTP服务，直到收到SIGINT/SIGTERM或任务被取消
+
+    Args:
+        service (LabelingService): 打标服务
+        host (str): 监听地址，默认只监听本机
+        port (int): 监听端口，0表示由系统分配
+        ready (callable): 开始监听后的回调，参数为实际的 (host, port)
+    """
+    service.start()
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    address = server.sockets[0].getsockname()[:2]
+    if ready is not None:
+        ready(address)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):  # Windows或非主线程
+            pass
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        server.close()
+        await server.wait_closed()
+        await service.stop()
+
+
+def print_stats(stats):
+    """打印各接口的请求数和延迟分位数"""
+    print("\n⏱️ 请求延迟:")
+    for endpoint, histogram in stats['requests'].items():
+        if histogram['count']:
+            print(f"  {endpoint}: {histogram['count']} 次，p50 {histogram['p50'] * 1000:.2f} ms，"
+                  f"p95 {histogram['p95'] * 1000:.2f} ms，p99 {histogram['p99'] * 1000:.2f} ms")
+    for kind, batch in stats['batches'].items():
+        if batch['items']['count']:
+            print(f"  {kind}微批次: {batch['items']['count']} 个，平均 {batch['items']['mean']:.1f} 条、"
+                  f"{batch['requests']['mean']:.1f} 个请求")
+
+
+def build_arg_parser():
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(description='剂型打标HTTP服务：为单条或小批量标题打标、标准化剂型名称')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址（默认127.0.0.1，只接受本机请求）')
+    parser.add_argument('--port', type=int, default=8765, help='监听端口（默认8765）')
+    parser.add_argument('--engine', choices=PackFormLabeler.ENGINES, default='compiled',
+                        help='剂型匹配引擎（默认compiled）')
+    parser.add_argument('--rules', help='规则包（.json/.yaml），默认 rules/pack_form_rules.json')
+    parser.add_argument('--cache-dir', help='持久化打标缓存目录，默认不启用')
+    parser.add_argument('--max-batch', type=int, default=512, help='每个微批次最多合并的条目数（默认512）')
+    parser.add_argument('--max-wait-ms', type=float, default=2.0,
+                        help='合并并发请求的最长等待时间，毫秒（默认2）')
+    parser.add_argument('--no-reload', action='store_true', help='规则包文件被修改后不自动重新加载')
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    label_cache = LabelCache(args.cache_dir) if args.cache_dir else None
+    labeler = PackFormLabeler(engine=args.engine, label_cache=label_cache, rules=args.rules)
+    service = LabelingService(labeler, args.max_batch, args.max_wait_ms, reload_rules=not args.no_reload)
+
+    def ready(address):
+        print(f"剂型打标服务已启动: http://{address[0]}:{address[1]}")
+        print(f"规则包版本: {labeler.rules_version} ({labeler.ruleset_fingerprint()})")
+
+    try:
+        asyncio.run(serve(service, args.host, args.port, ready))
+    except KeyboardInterrupt:
+        pass
+    print_stats(service.stats())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
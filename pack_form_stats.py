@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+打标统计累计器
+在打标过程中逐批累计标准化报告所需的计数、剂型分布和标准化示例，
+分块、流式和断点续跑时无需在最后重新扫描整个结果
+
+用法:
+    stats = LabelStats()
+    for batch in batches:
+        labeler.process_dataframe(batch, mode='dedup', stats=stats)
+    stats.report()
+"""
+
+import math
+import random
+
+import numpy as np
+
+
+class LabelStats:
+    """
+    单遍累计的打标统计
+
+    标准化示例为所有标准化行中的均匀蓄水池抽样（Algorithm L，按几何分布跳过，
+    每批只需处理被选中的行），抽样结果由seed决定，同样的输入得到同样的示例。
+    """
+
+    def __init__(self, max_examples=10, seed=0):
+        """
+        Args:
+            max_examples (int): 保留的标准化示例数量
+            seed (int): 抽样的随机种子
+        """
+        self.max_examples = max_examples
+        self.total_rows = 0
+        self.standardization_applied = 0
+        self.originally_empty = 0
+        self.final_empty = 0
+        self.pack_form_distribution = {}
+        self._examples = []
+        # 已经过的标准化行数，以及下一个被抽中的标准化行的序号
+        self._seen = 0
+        self._next = None
+        self._threshold = 1.0
+        self._rng = random.Random(seed)
+
+    def update(self, df_processed):
+        """
+        累计一批打标结果
+
+        Args:
+            df_processed (pd.DataFrame): process_dataframe的结果（或包含Product列的label_columns结果），
+                索引为行号（从0开始）
+
+        Returns:
+            LabelStats: self
+        """
+        counts = df_processed['Pack form'].value_counts()
+        applied = np.flatnonzero(df_processed['Standardization_Applied'].to_numpy(dtype=bool))
+
+        self.total_rows += len(df_processed)
+        self.standardization_applied += len(applied)
+        self.originally_empty += int(np.count_nonzero(df_processed['Is_Originally_Empty'].to_numpy(dtype=bool)))
+        # value_counts不统计空值，其余即处理后的空值
+        self.final_empty += len(df_processed) - int(counts.sum())
+        distribution = self.pack_form_distribution
+        for form, count in counts.items():
+            distribution[form] = distribution.get(form, 0) + int(count)
+        self._sample(applied, df_processed)
+        return self
+
+    def merge(self, other):
+        """
+        并入另一部分（如另一个分块）的统计，示例按两部分的标准化行数加权合并，仍为均匀抽样
+
+        Args:
+            other (LabelStats): 另一部分的统计
+
+        Returns:
+            LabelStats: self
+        """
+        self.total_rows += other.total_rows
+        self.standardization_applied += other.standardization_applied
+        self.originally_empty += other.originally_empty
+        self.final_empty += other.final_empty
+        for form, count in other.pack_form_distribution.items():
+            self.pack_form_distribution[form] = self.pack_form_distribution.get(form, 0) + count
+
+        # 逐个抽取：从某一方抽取的概率与该方剩余的标准化行数成正比（不放回）
+        pools = (list(self._examples), list(other._examples))
+        remaining = [self._seen, other._seen]
+        examples = []
+        while len(examples) < self.max_examples and (pools[0] or pools[1]):
+            side = 0 if pools[0] and (
+                not pools[1] or self._rng.random() * (remaining[0] + remaining[1]) < remaining[0]
+            ) else 1
+            examples.append(pools[side].pop(self._rng.randrange(len(pools[side]))))
+            remaining[side] -= 1
+        self._examples = examples
+        self._seen += other._seen
+        if self._seen >= self.max_examples > 0:
+            self._reset_skip(self._seen)
+        return self
+
+    @classmethod
+    def from_report(cls, report, **example_fields):
+        """
+        由report()的结果（如检查点清单或各工作表保存的报告）恢复统计，用于merge合并
+
+        报告中的示例是该部分标准化行的均匀抽样，按standardization_applied加权合并后仍为均匀抽样。
+
+        Args:
+            report (dict): 标准化报告
+            **example_fields: 附加到每个示例中的字段（如来源文件）
+
+        Returns:
+            LabelStats: 统计
+        """
+        stats = cls()
+        stats.total_rows = int(report['total_rows'])
+        stats.standardization_applied = int(report['standardization_applied'])
+        stats.originally_empty = int(report['originally_empty'])
+        stats.final_empty = int(report['final_empty'])
+        stats.pack_form_distribution = {form: int(count) for form, count in report['pack_form_distribution'].items()}
+        stats._examples = [dict(example, **example_fields) for example in report['standardization_examples']]
+        stats._seen = stats.standardization_applied
+        return stats
+
+    def report(self):
+        """
+        导出为与generate_standardization_report结构相同的报告
+
+        Returns:
+            dict: 标准化报告，剂型分布按数量降序，示例按行号排序
+        """
+        return {
+            'total_rows': self.total_rows,
+            'standardization_applied': self.standardization_applied,
+            'originally_empty': self.originally_empty,
+            'successfully_filled': self.originally_empty - self.final_empty,
+            'final_empty': self.final_empty,
+            'pack_form_distribution': dict(
+                sorted(self.pack_form_distribution.items(), key=lambda item: item[1], reverse=True)
+            ),
+            'standardization_examples': sorted(self._examples, key=lambda example: example['row']),
+        }
+
+    def _sample(self, positions, df_processed):
+        """把本批的标准化行（位置）纳入蓄水池抽样"""
+        base = self._seen
+        self._seen += len(positions)
+        if self.max_examples <= 0:
+            return
+        # 蓄水池未满时直接加入
+        for position in positions[:max(self.max_examples - base, 0)]:
+            self._examples.append(self._example(df_processed, position))
+        if self._next is None:
+            if len(self._examples) < self.max_examples:
+                return
+            self._reset_skip(self.max_examples)
+        while self._next < self._seen:
+            replaced = self._rng.randrange(self.max_examples)
+            self._examples[replaced] = self._example(df_processed, positions[self._next - base])
+            self._threshold *= math.exp(math.log(self._random()) / self.max_examples)
+            self._skip()
+
+    def _reset_skip(self, seen):
+        """按已经过的行数seen重新确定抽样阈值：n个随机键中最小的k个的最大值服从Beta(k, n-k+1)"""
+        self._threshold = self._rng.betavariate(self.max_examples, seen - self.max_examples + 1)
+        self._next = seen - 1
+        self._skip()
+
+    def _skip(self):
+        """按几何分布确定下一个被抽中的序号"""
+        gap = math.log(self._random()) / math.log(max(1.0 - self._threshold, 1e-300))
+        self._next += int(math.floor(gap)) + 1
+
+    def _random(self):
+        """(0, 1) 区间的随机数，避免对0取对数"""
+        return self._rng.random() or 1e-300
+
+    @staticmethod
+    def _example(df_processed, position):
+        row = df_processed.iloc[position]
+        product = str(row['Product'])
+        return {
+            'row': int(df_processed.index[position]) + 1,
+            'product': product[:80] + "..." if len(product) > 80 else product,
+            'pack_form': row['Pack form'],
+        }
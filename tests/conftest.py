@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""多个测试文件共用的测试数据"""
+
+import pytest
+
+from benchmarks.synthetic import generate_dataframe
+from pack_form_excel import write_excel
+from pack_form_labeler import PackFormLabeler, label_file
+
+
+@pytest.fixture(scope='session')
+def labeler():
+    return PackFormLabeler()
+
+
+@pytest.fixture(scope='session')
+def input_file(tmp_path_factory):
+    """2500行的合成工作簿"""
+    path = tmp_path_factory.mktemp('input') / 'products.xlsx'
+    write_excel(generate_dataframe(2500, seed=3), str(path))
+    return str(path)
+
+
+@pytest.fixture(scope='session')
+def reference(labeler, input_file, tmp_path_factory):
+    """整表读取、打标的CSV输出和报告"""
+    output_file = tmp_path_factory.mktemp('reference') / 'labeled.csv'
+    report = label_file(labeler, input_file, str(output_file), output_format='csv')
+    return output_file.read_bytes(), report
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""持久化缓存"""
+
+import itertools
+import os
+import sqlite3
+import time
+
+import pandas as pd
+import pytest
+
+import pack_form_cache
+from pack_form_cache import InputCache, LabelCache, content_sha256
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """每次调用递增一秒的时钟，使各次写入和命中的使用时间可区分"""
+    ticks = itertools.count(1_000_000)
+    monkeypatch.setattr(pack_form_cache.time, 'time', lambda: float(next(ticks)))
+
+
+def results(names):
+    return {name: (1, 'Capsule', name) for name in names}
+
+
+def table_count(cache):
+    return cache._connect().execute('SELECT COUNT(*) FROM labels').fetchone()[0]
+
+
+def test_label_cache_count_tracks_inserts_and_updates(tmp_path):
+    cache = LabelCache(str(tmp_path))
+    cache.put_many('r1', results(['a', 'b', 'c']))
+    # 已有记录走UPSERT更新，不重复计数
+    cache.put_many('r1', results(['b', 'c', 'd']))
+    cache.put_many('r2', results(['a']))
+    assert cache.stats()['entries'] == table_count(cache) == 5
+    assert cache.get_many('r1', ['a', 'd', 'x']) == results(['a', 'd'])
+    assert cache.get_many('r2', ['b']) == {}
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_label_cache_evicts_least_recently_used(tmp_path, clock):
+    cache = LabelCache(str(tmp_path), max_entries=10)
+    for i in range(5):
+        cache.put_many('r1', results([f'old{i}']))
+    cache.put_many('r1', results(f'new{i}' for i in range(5)))
+    # 命中的记录刷新使用时间，淘汰时保留
+    assert len(cache.get_many('r1', ['old0', 'old1'])) == 2
+    cache.put_many('r1', results(['extra']))
+
+    # 超出上限后降到上限的90%，淘汰最久未使用的old2和old3
+    assert cache.stats()['entries'] == table_count(cache) == 9
+    kept = cache.get_many('r1', ['old0', 'old1', 'old2', 'old3', 'old4', 'extra'] + [f'new{i}' for i in range(5)])
+    assert sorted(kept) == ['extra', 'new0', 'new1', 'new2', 'new3', 'new4', 'old0', 'old1', 'old4']
+
+
+def test_label_cache_counts_existing_database(tmp_path):
+    # 没有计数表的旧缓存文件首次连接时统计一次
+    cache = LabelCache(str(tmp_path))
+    cache.put_many('r1', results(['a', 'b', 'c']))
+    cache.close()
+    connection = sqlite3.connect(cache.path)
+    connection.executescript('DROP TRIGGER labels_count_insert; DROP TRIGGER labels_count_delete;'
+                             ' DROP TABLE labels_count;')
+    connection.close()
+
+    cache = LabelCache(str(tmp_path), max_entries=3)
+    assert cache.stats()['entries'] == 3
+    cache.put_many('r1', results(['d']))
+    assert cache.stats()['entries'] == table_count(cache) == 2
+
+
+def write_products(path, pack_forms):
+    pd.DataFrame({'Pack form': pack_forms, 'Product': [f'p{i}' for i in range(len(pack_forms))]}).to_excel(
+        path, index=False)
+    return str(path)
+
+
+def test_input_cache_hit_matches_read_excel(tmp_path):
+    path = write_products(tmp_path / 'in.xlsx', ['tablets', None, 'capsules'])
+    cache = InputCache(str(tmp_path / 'cache'))
+    first = cache.read_excel(path)
+    second = cache.read_excel(path)
+    pd.testing.assert_frame_equal(second, pd.read_excel(path))
+    pd.testing.assert_frame_equal(second, first)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.stats()['entries'] == 1
+
+
+def test_input_cache_skips_non_arrow_columns(tmp_path):
+    # 同一列混有数字和文本，无法无损保存为Arrow，照常解析且不写入缓存
+    path = write_products(tmp_path / 'mixed.xlsx', ['tablets', 3, None])
+    cache = InputCache(str(tmp_path / 'cache'))
+    for _ in range(2):
+        pd.testing.assert_frame_equal(cache.read_excel(path), pd.read_excel(path))
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert cache.stats()['entries'] == 0
+
+
+def test_input_cache_evicts_by_size_and_age(tmp_path):
+    cache_dir = tmp_path / 'cache'
+    cache = InputCache(str(cache_dir))
+    paths = [write_products(tmp_path / f'in{i}.xlsx', [f'form {i}'] * 200) for i in range(4)]
+    for i, path in enumerate(paths):
+        cache.read_excel(path)
+        # 第i个条目在 4-i 天前使用
+        entry = max(cache_dir.iterdir(), key=lambda entry: entry.stat().st_mtime_ns)
+        used_at = time.time() - (4 - i) * 86400
+        os.utime(entry, (used_at, used_at))
+    sizes = sorted(entry.stat().st_size for entry in cache_dir.iterdir())
+    assert cache.stats()['entries'] == 4
+
+    # 总大小超过上限时从最久未使用的条目开始删除，降到上限的90%以内
+    cache.max_bytes = sum(sizes) - 1
+    cache.evict()
+    assert cache.stats()['entries'] == 3
+    assert cache.get(content_sha256(paths[0])) is None
+    assert cache.get(content_sha256(paths[3])) is not None
+
+    # 超过max_age_days未使用的条目直接淘汰
+    cache.max_bytes = 2 * 1024 ** 3
+    cache.max_age_days = 1.5
+    cache.evict()
+    assert [entry.name for entry in cache_dir.iterdir()] == [
+        os.path.basename(cache._entry_path(content_sha256(paths[3]), 0, None))]
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""断点续跑与整表打标的一致性"""
+
+import datetime
+
+import pandas as pd
+import pytest
+
+import pack_form_checkpoint
+from pack_form_labeler import label_file
+
+
+def test_resume_after_crash(labeler, input_file, reference, tmp_path, monkeypatch):
+    output_file = tmp_path / 'labeled.csv'
+    checkpoint_dir = str(tmp_path / 'checkpoints')
+    save_chunk = pack_form_checkpoint.CheckpointManifest.save_chunk
+
+    def crash_after_two_chunks(manifest, index, labels, stats):
+        if index == 2:
+            raise KeyboardInterrupt
+        save_chunk(manifest, index, labels, stats)
+
+    monkeypatch.setattr(pack_form_checkpoint.CheckpointManifest, 'save_chunk', crash_after_two_chunks)
+    with pytest.raises(KeyboardInterrupt):
+        label_file(labeler, input_file, str(output_file), output_format='csv',
+                   checkpoint_dir=checkpoint_dir, chunk_size=600)
+    assert not output_file.exists()
+
+    # 续跑时只打标未完成的分块
+    labeled_chunks = []
+    monkeypatch.setattr(pack_form_checkpoint.CheckpointManifest, 'save_chunk',
+                        lambda manifest, index, labels, stats: (labeled_chunks.append(index),
+                                                                save_chunk(manifest, index, labels, stats)))
+    report = label_file(labeler, input_file, str(output_file), output_format='csv',
+                        checkpoint_dir=checkpoint_dir, chunk_size=600)
+    assert labeled_chunks == [2, 3, 4]
+    assert output_file.read_bytes() == reference[0]
+    # 示例为分块合并后的抽样，与整表抽样不同，其余统计一致
+    for key in ('total_rows', 'standardization_applied', 'originally_empty', 'successfully_filled',
+                'final_empty', 'pack_form_distribution'):
+        assert report[key] == reference[1][key]
+
+
+def test_changed_chunk_size_requires_restart(labeler, input_file, tmp_path):
+    output_file = str(tmp_path / 'labeled.csv')
+    checkpoint_dir = str(tmp_path / 'checkpoints')
+    label_file(labeler, input_file, output_file, output_format='csv', checkpoint_dir=checkpoint_dir,
+               chunk_size=600)
+    with pytest.raises(ValueError, match='chunk_size'):
+        label_file(labeler, input_file, output_file, output_format='csv', checkpoint_dir=checkpoint_dir,
+                   chunk_size=1000)
+    report = label_file(labeler, input_file, output_file, output_format='csv', checkpoint_dir=checkpoint_dir,
+                        chunk_size=1000, restart=True)
+    assert report['total_rows'] == 2500
+
+
+def test_chunks_are_stored_without_pickle(labeler, tmp_path):
+    """分块为Feather文件、统计在清单中；剂型列混有数字、日期和空值时结果仍与整表打标一致"""
+    input_file = str(tmp_path / 'mixed.xlsx')
+    rows = [['tablets', 'Vitamin C'], [None, 'Fish Oil Softgels'], [3, 'x'],
+            [datetime.datetime(2024, 1, 1), 'Kids Gummies'], ['', 'Powder Drink Mix']] * 40
+    pd.DataFrame(rows, columns=['Pack form', 'Product']).to_excel(input_file, index=False)
+    expected_file = tmp_path / 'expected.xlsx'
+    expected_report = label_file(labeler, input_file, str(expected_file))
+
+    output_file = tmp_path / 'labeled.xlsx'
+    checkpoint_dir = tmp_path / 'checkpoints'
+    report = pack_form_checkpoint.label_file_resumable(labeler, input_file, str(output_file),
+                                                       str(checkpoint_dir), chunk_size=30,
+                                                       keep_checkpoints=True)
+    pd.testing.assert_frame_equal(pd.read_excel(output_file), pd.read_excel(expected_file))
+    assert report['total_rows'] == expected_report['total_rows']
+    assert report['pack_form_distribution'] == expected_report['pack_form_distribution']
+
+    files = sorted(path.name for path in next(checkpoint_dir.iterdir()).iterdir())
+    assert files == [f'chunk_{i:06d}.feather' for i in range(7)] + ['manifest.json']
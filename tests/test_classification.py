@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""剂型位掩码分类表：分类类型输出和剂型数量较多的规则包"""
+
+import copy
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import generate_dataframe
+from pack_form_labeler import MAX_PACK_FORMS, PackFormLabeler
+from pack_form_rules import load_rules
+
+
+def rules_with_extra_forms(count):
+    """在默认规则包上追加count个剂型，第i个匹配关键词 zzf{i}"""
+    rules = copy.deepcopy(load_rules())
+    for i in range(count):
+        rules['pack_forms'][f'Form{i}'] = [rf'\bzzf{i}\b']
+    return rules
+
+
+@pytest.fixture(scope='module')
+def df():
+    return generate_dataframe(2000, seed=5)
+
+
+def test_categorical_matches_default_output(df):
+    labeler = PackFormLabeler()
+    expected, _, _ = labeler.process_dataframe(df, mode='dedup')
+    categorical, _, _ = labeler.process_dataframe(df, mode='dedup', categorical=True)
+    for column in ('Pack form', 'Matched_Pack_Form', 'Match_Source'):
+        assert isinstance(categorical[column].dtype, pd.CategoricalDtype)
+        assert categorical[column].astype(object).equals(expected[column].astype(object))
+
+
+@pytest.mark.parametrize('engine', ('compiled', 'automaton'))
+def test_more_than_32_forms(df, engine):
+    rules = rules_with_extra_forms(40)
+    assert len(rules['pack_forms']) + 1 > 32
+    frame = df.copy()
+    titles = ['zzf1 Capsules', 'zzf35', 'zzf36 zzf39 powder', 'Vitamin zzf38 Tablets', 'zzf39']
+    frame.loc[:len(titles) - 1, 'Product'] = titles
+    frame.loc[:len(titles) - 1, 'Pack form'] = None
+
+    legacy = PackFormLabeler(engine='legacy', rules=rules)
+    labeler = PackFormLabeler(engine=engine, rules=rules)
+    assert labeler.label_product('zzf35')[1] == 'Form35'
+    assert labeler.label_product('zzf39')[1] == 'Form39'
+    for text in titles:
+        assert labeler.label_product(text) == legacy.label_product(text)
+
+    expected = legacy.process_dataframe(frame, mode='loop')
+    for mode in PackFormLabeler.PROCESS_MODES:
+        result = labeler.process_dataframe(frame, mode=mode)
+        pd.testing.assert_frame_equal(result[0], expected[0])
+
+
+def test_too_many_forms_is_rejected():
+    with pytest.raises(ValueError, match='剂型数量'):
+        PackFormLabeler(rules=rules_with_extra_forms(MAX_PACK_FORMS))
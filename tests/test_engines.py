@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""各匹配引擎与原始逐条正则匹配（legacy）的一致性"""
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import generate_dataframe
+from pack_form_labeler import PackFormLabeler
+
+ENGINES = ('compiled', 'automaton')
+
+# 中文关键词、大小写、单复数和词边界的边界情况
+EDGE_TITLES = [
+    '汤臣倍健 鱼油软胶囊 100粒', '维生素C咀嚼片 60片', '益生菌粉末冲剂 30袋', '儿童钙镁锌口服液',
+    'VITAMIN D3 SOFTGELS', 'Capsule', 'capsules and tablets', 'Encapsulated Tea Bags',
+    'Gummy Bears Gummies', 'Liquid Drops Tincture', 'oil', 'Fish Oil 1000mg', '', '   ',
+]
+
+
+@pytest.fixture(scope='module')
+def df():
+    return generate_dataframe(3000, seed=7)
+
+
+@pytest.fixture(scope='module')
+def legacy():
+    return PackFormLabeler(engine='legacy')
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_label_product_matches_legacy(df, legacy, engine):
+    labeler = PackFormLabeler(engine=engine)
+    for text in df['Product']:
+        assert labeler.label_product(text) == legacy.label_product(text)
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_process_dataframe_matches_legacy(df, legacy, engine):
+    expected = legacy.process_dataframe(df, mode='loop')
+    result = PackFormLabeler(engine=engine).process_dataframe(df, mode='loop')
+    pd.testing.assert_frame_equal(result[0], expected[0])
+    assert result[1:] == expected[1:]
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_edge_titles_match_legacy(legacy, engine):
+    labeler = PackFormLabeler(engine=engine)
+    for text in EDGE_TITLES:
+        assert labeler.label_product(text) == legacy.label_product(text), text
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""流式读取与pd.read_excel的一致性"""
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+from openpyxl.styles import Font
+
+from pack_form_excel import iter_excel_batches, read_sheet
+from pack_form_labeler import PackFormLabeler
+
+PRODUCTS = ['Fish Oil 1000mg Softgels', 'Kids Multivitamin Gummies', 'Vitamin C Tablets',
+            'Whey Protein Powder', 'Herbal Tea', 'Liquid Iron Drops']
+
+
+def write_workbook(path, rows=3000, trailing_empty=8, middle_empty=(10, 11)):
+    """rows行数据，中间有空行，末尾有只设置了格式的空行"""
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['Pack form', 'Product', 'Brand'])
+    for i in range(rows):
+        if i in middle_empty:
+            sheet.append([None, None, None])
+        else:
+            sheet.append([None if i % 3 else 'tablets', PRODUCTS[i % len(PRODUCTS)], f'B{i % 7}'])
+    for row in range(rows + 2, rows + 2 + trailing_empty):
+        for column in range(1, 4):
+            sheet.cell(row, column).font = Font(bold=True)
+    # 只有空字符串的行同样视为空
+    sheet.cell(rows + 2 + trailing_empty, 2).value = ''
+    workbook.save(path)
+    return path
+
+
+@pytest.fixture
+def workbook_path(tmp_path):
+    return str(write_workbook(tmp_path / 'input.xlsx'))
+
+
+@pytest.mark.parametrize('batch_size', [1000, 2999, 3000, 50000])
+def test_read_sheet_matches_read_excel(workbook_path, batch_size):
+    expected = pd.read_excel(workbook_path)
+    assert len(expected) == 3000
+    pd.testing.assert_frame_equal(read_sheet(workbook_path, batch_size=batch_size), expected,
+                                  check_index_type=False)
+
+
+def test_batches_drop_trailing_empty_rows(workbook_path):
+    batches = list(iter_excel_batches(workbook_path, batch_size=1000, usecols=['Pack form', 'Product']))
+    assert [len(batch) for batch in batches] == [1000, 1000, 1000]
+    assert batches[-1].index[-1] == 2999
+
+
+@pytest.mark.parametrize('usecols', [None, ['Product', 'Pack form']])
+def test_empty_runs_across_batches(tmp_path, usecols):
+    """跨越多个批次的连续空行按原行号补回，末尾大量空行不产生批次"""
+    path = write_workbook(tmp_path / 'gaps.xlsx', rows=200, trailing_empty=500,
+                          middle_empty=range(50, 75))
+    expected = pd.read_excel(path, usecols=usecols)
+    if usecols is not None:
+        expected = expected[usecols]
+    batches = list(iter_excel_batches(path, batch_size=7, usecols=usecols))
+    assert all(len(batch) == 7 for batch in batches[:-1])
+    pd.testing.assert_frame_equal(pd.concat(batches).astype(expected.dtypes.to_dict()), expected,
+                                  check_index_type=False)
+
+
+def test_streaming_matches_process_excel(workbook_path, tmp_path):
+    labeler = PackFormLabeler()
+    expected = labeler.process_excel(workbook_path, str(tmp_path / 'full.xlsx'), mode='dedup')
+    summary = labeler.process_excel_streaming(workbook_path, str(tmp_path / 'stream.xlsx'), batch_size=700)
+
+    assert summary['total_rows'] == len(expected) == 3000
+    assert summary['report'] == labeler.generate_standardization_report(expected)
+    pd.testing.assert_frame_equal(pd.read_excel(tmp_path / 'stream.xlsx'), pd.read_excel(tmp_path / 'full.xlsx'))
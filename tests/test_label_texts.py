@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""不依赖pandas的逐条接口：label_texts和standardize_values"""
+
+import itertools
+
+import pytest
+
+from benchmarks.synthetic import generate_dataframe
+from pack_form_labeler import PackFormLabeler
+
+
+@pytest.fixture(scope='module')
+def df():
+    return generate_dataframe(3000, seed=7)
+
+
+def test_label_texts_matches_label_product(df):
+    legacy = PackFormLabeler(engine='legacy')
+    results = list(PackFormLabeler().label_texts(df['Product'], batch_size=500))
+    assert len(results) == len(df)
+    for result in results:
+        form_count, pack_form, match_source = legacy.label_product(result.text)
+        assert (result.form_count, result.pack_form, result.match_source) == (form_count, pack_form, match_source)
+
+
+def test_label_texts_is_lazy():
+    titles = itertools.cycle(['Vitamin D3 Softgels', 'Kids Gummies', None, 42])
+    results = list(itertools.islice(PackFormLabeler().label_texts(titles, batch_size=3), 10))
+    assert [result.pack_form for result in results[:4]] == ['Softgel', 'Gummy', None, None]
+    assert len(results) == 10
+
+
+def test_standardize_values_matches_process_dataframe(df):
+    expected, _, _ = PackFormLabeler().process_dataframe(df, mode='loop')
+    existing = df['Pack form'].notna()
+    results = list(PackFormLabeler().standardize_values(df.loc[existing, 'Pack form']))
+    assert [result.standardized for result in results] == expected.loc[existing, 'Pack form'].tolist()
+    assert [result.changed for result in results] == expected.loc[existing, 'Standardization_Applied'].tolist()
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""只读取两列、不复制整个DataFrame的低内存模式与整表处理的一致性"""
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import generate_dataframe
+from pack_form_labeler import PackFormLabeler, label_file
+
+
+@pytest.mark.parametrize('mode', PackFormLabeler.PROCESS_MODES)
+def test_inplace_matches_copy(labeler, mode):
+    df = generate_dataframe(2000, seed=9)
+    expected = labeler.process_dataframe(df, mode=mode)
+    target = df.copy()
+    result = labeler.process_dataframe(target, mode=mode, inplace=True)
+    assert result[0] is target
+    pd.testing.assert_frame_equal(result[0], expected[0])
+    assert result[1:] == expected[1:]
+
+
+def test_label_file_low_memory_matches(labeler, input_file, reference, tmp_path):
+    output_file = tmp_path / 'labeled.csv'
+    report = label_file(labeler, input_file, str(output_file), output_format='csv', low_memory=True)
+    assert output_file.read_bytes() == reference[0]
+    assert report == reference[1]
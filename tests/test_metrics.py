@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""运行指标：实际耗时与各工作进程累计耗时分开统计"""
+
+import time
+
+from pack_form_metrics import RunMetrics, merge_metrics, write_prometheus
+
+
+def worker_metrics(seconds, rows):
+    """模拟一个工作进程的指标：一个阶段耗时seconds秒，处理rows行"""
+    metrics = RunMetrics()
+    metrics._add('detection', rows, seconds, seconds, None)
+    metrics.finish(seconds)
+    return metrics.as_dict()
+
+
+def test_elapsed_time_is_measured_around_the_run():
+    metrics = RunMetrics()
+    with metrics.stage('detection') as stage:
+        stage['rows'] = 100
+    time.sleep(0.01)
+    metrics.finish()
+    total = metrics.as_dict()['total']
+    assert total['elapsed_seconds'] >= total['worker_seconds'] + 0.01
+    assert total['rows'] == 100
+
+
+def test_parallel_workers_do_not_inflate_run_time(tmp_path):
+    # 两个工作进程各用2秒并行处理1000行，整批实际耗时2.5秒
+    metrics = merge_metrics([worker_metrics(2.0, 1000), worker_metrics(2.0, 1000)], elapsed_seconds=2.5)
+    assert metrics['total']['elapsed_seconds'] == 2.5
+    assert metrics['total']['worker_seconds'] == 4.0
+    assert metrics['total']['rows_per_sec'] == 800.0
+    # 阶段吞吐量是单个工作进程的吞吐量
+    assert metrics['stages'][0]['rows_per_sec'] == 500.0
+
+    path = tmp_path / 'run.prom'
+    write_prometheus(str(path), metrics, job='test')
+    samples = dict(line.rsplit(' ', 1) for line in path.read_text().splitlines() if not line.startswith('#'))
+    assert samples['pack_form_run_wall_seconds{job="test"}'] == '2.5'
+    assert samples['pack_form_run_worker_seconds{job="test"}'] == '4.0'
+    assert samples['pack_form_run_rows_per_second{job="test"}'] == '800.0'
+
+
+def test_sequential_runs_sum_elapsed_time():
+    metrics = merge_metrics([worker_metrics(1.0, 100), worker_metrics(3.0, 300)])
+    assert metrics['total']['elapsed_seconds'] == 4.0
+    assert metrics['stages'][0]['rows'] == 400
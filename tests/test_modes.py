@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""process_dataframe各处理模式与逐行处理（loop）的一致性"""
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import generate_dataframe
+from pack_form_labeler import PackFormLabeler
+
+MODES = ('vectorized', 'dedup')
+
+
+@pytest.fixture(scope='module')
+def df():
+    return generate_dataframe(3000, seed=7)
+
+
+def nullable_frame():
+    """convert_dtypes后的可空类型：Pack form为string类型，空值为pd.NA"""
+    df = generate_dataframe(1000, seed=11).convert_dtypes()
+    df.loc[[3, 50], 'Pack form'] = ''
+    df.loc[[4, 51], 'Product'] = pd.NA
+    assert isinstance(df['Pack form'].dtype, pd.StringDtype)
+    return df
+
+
+@pytest.mark.parametrize('engine', PackFormLabeler.ENGINES)
+@pytest.mark.parametrize('mode', MODES)
+def test_mode_matches_loop(df, engine, mode):
+    labeler = PackFormLabeler(engine=engine)
+    expected = labeler.process_dataframe(df, mode='loop')
+    result = labeler.process_dataframe(df, mode=mode)
+    pd.testing.assert_frame_equal(result[0], expected[0])
+    assert result[1:] == expected[1:]
+
+
+@pytest.mark.parametrize('mode', MODES)
+def test_nullable_dtypes_match_loop(mode):
+    df = nullable_frame()
+    labeler = PackFormLabeler()
+    expected = labeler.process_dataframe(df, mode='loop')
+    result = labeler.process_dataframe(df, mode=mode)
+    pd.testing.assert_frame_equal(result[0], expected[0])
+    assert result[1:] == expected[1:]
+
+
+def test_dedup_labels_each_title_once(df):
+    labeler = PackFormLabeler()
+    labeler.process_dataframe(df, mode='dedup')
+    first = labeler.cache_info()
+    empty_titles = df.loc[df['Pack form'].isna(), 'Product'].dropna()
+    assert first['misses'] == empty_titles.str.lower().nunique()
+
+    # 再次处理时所有标题都命中缓存
+    labeler.process_dataframe(df, mode='dedup')
+    second = labeler.cache_info()
+    assert second['misses'] == first['misses']
+    assert second['hits'] - first['hits'] == first['misses']
+
+
+@pytest.mark.parametrize('mode', PackFormLabeler.PROCESS_MODES)
+def test_multiprocess_matches_single_process(df, mode):
+    labeler = PackFormLabeler()
+    expected = labeler.process_dataframe(df, mode=mode)
+    progress = []
+    result = labeler.process_dataframe(df, mode=mode, workers=2, chunk_size=700,
+                                       progress=lambda done, total: progress.append((done, total)))
+    pd.testing.assert_frame_equal(result[0], expected[0])
+    assert result[1:] == expected[1:]
+    assert progress[-1] == (len(df), len(df))
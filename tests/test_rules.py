@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""规则包的校验和与热加载"""
+
+import json
+import os
+import shutil
+
+import pytest
+
+from pack_form_labeler import PackFormLabeler
+from pack_form_rules import DEFAULT_RULES_FILE, read_rule_pack, stamp_rule_pack
+
+
+@pytest.fixture
+def rules_path(tmp_path):
+    path = str(tmp_path / 'rules.json')
+    shutil.copy(DEFAULT_RULES_FILE, path)
+    return path
+
+
+def edit_rules(path, term, stamp=True):
+    """在标准化映射中加入 term -> Capsule，并把文件修改时间向后推一秒"""
+    with open(path, encoding='utf-8') as f:
+        rules = json.load(f)
+    rules['standardization_map'][term] = 'Capsule'
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(rules, f, ensure_ascii=False)
+    if stamp:
+        stamp_rule_pack(path, version='test')
+    mtime = os.path.getmtime(path) + 1
+    os.utime(path, (mtime, mtime))
+
+
+def test_reload_rules_if_changed(rules_path):
+    labeler = PackFormLabeler(rules=rules_path)
+    fingerprint = labeler.ruleset_fingerprint()
+    assert not labeler.reload_rules_if_changed()
+    assert labeler.standardize_pack_form('zzcaps') == 'zzcaps'
+
+    edit_rules(rules_path, 'zzcaps')
+    assert labeler.reload_rules_if_changed()
+    assert labeler.rules_version == 'test'
+    assert labeler.ruleset_fingerprint() != fingerprint
+    assert labeler.standardize_pack_form('zzcaps') == 'Capsule'
+    assert not labeler.reload_rules_if_changed()
+
+
+def test_checksum_mismatch_keeps_current_rules(rules_path):
+    labeler = PackFormLabeler(rules=rules_path)
+    fingerprint = labeler.ruleset_fingerprint()
+
+    # 修改规则表后未重新计算校验和
+    edit_rules(rules_path, 'zzcaps', stamp=False)
+    with pytest.raises(ValueError, match='校验和不一致'):
+        read_rule_pack(rules_path)
+    with pytest.raises(ValueError, match='校验和不一致'):
+        labeler.reload_rules_if_changed()
+    assert labeler.ruleset_fingerprint() == fingerprint
+    assert labeler.standardize_pack_form('zzcaps') == 'zzcaps'
+
+    stamp_rule_pack(rules_path)
+    assert labeler.reload_rules_if_changed()
+    assert labeler.standardize_pack_form('zzcaps') == 'Capsule'
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""打标服务的微批次合并和HTTP接口"""
+
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pack_form_service import LabelingService, MicroBatcher, serve
+
+
+def test_micro_batcher_coalesces_concurrent_requests():
+    batches = []
+
+    def handler(items):
+        batches.append(list(items))
+        return [item * 10 for item in items]
+
+    async def run():
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            batcher = MicroBatcher(handler, executor, max_batch=100, max_wait=0.05)
+            batcher.start()
+            try:
+                return await asyncio.gather(*(batcher.submit([i, i + 100]) for i in range(5)))
+            finally:
+                await batcher.stop()
+
+    results = asyncio.run(run())
+    assert results == [[i * 10, (i + 100) * 10] for i in range(5)]
+    assert batches == [[item for i in range(5) for item in (i, i + 100)]]
+
+
+def test_micro_batcher_respects_max_batch():
+    batches = []
+
+    def handler(items):
+        batches.append(len(items))
+        return items
+
+    async def run():
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            batcher = MicroBatcher(handler, executor, max_batch=4, max_wait=0.05)
+            batcher.start()
+            try:
+                return await asyncio.gather(*(batcher.submit([i, i]) for i in range(5)))
+            finally:
+                await batcher.stop()
+
+    assert asyncio.run(run()) == [[i, i] for i in range(5)]
+    # 单个请求的条目不拆分，每批最多4条
+    assert batches == [4, 4, 2]
+
+
+async def post(port, path, payload):
+    """发送一个POST请求，返回 (状态码, 响应JSON)"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = json.dumps(payload).encode('utf-8')
+    writer.write(f'POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n'
+                 f'Connection: close\r\n\r\n'.encode('latin-1') + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(body)
+
+
+def call_service(labeler, requests):
+    """启动服务并并发发送requests中的 (路径, 请求体)，返回各响应和服务统计"""
+    service = LabelingService(labeler, max_wait_ms=50, reload_rules=False)
+
+    async def run():
+        ready = asyncio.get_running_loop().create_future()
+        server = asyncio.create_task(serve(service, port=0, ready=ready.set_result))
+        _, port = await ready
+        try:
+            return await asyncio.gather(*(post(port, path, payload) for path, payload in requests))
+        finally:
+            server.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await server
+
+    return asyncio.run(run()), service.stats()
+
+
+def test_label_and_standardize_endpoints(labeler):
+    (label, single, standardize), stats = call_service(labeler, [
+        ('/label', {'texts': ['Vitamin C 500mg 60 Capsules', None, '']}),
+        ('/label', {'text': 'Kids Gummies'}),
+        ('/standardize', {'values': ['capsules', None, 'zzz']}),
+    ])
+    assert label[0] == 200
+    assert [result['pack_form'] for result in label[1]['results']] == ['Capsule', None, None]
+    assert label[1]['results'][1]['text'] is None
+    assert single == (200, {'result': dict(label[1]['results'][0], text='Kids Gummies', pack_form='Gummy',
+                                             match_source='gummies')})
+    assert standardize == (200, {'results': [
+        {'value': 'capsules', 'standardized': 'Capsule', 'changed': True},
+        {'value': None, 'standardized': None, 'changed': False},
+        {'value': 'zzz', 'standardized': 'zzz', 'changed': False},
+    ]})
+    # 两个/label请求合并为一个微批次
+    assert stats['batches']['label']['requests']['count'] == 1
+    assert stats['batches']['label']['items']['sum'] == 4
+
+
+def test_invalid_items_fail_only_their_request(labeler):
+    (bad_label, good_label, bad_standardize, good_standardize), stats = call_service(labeler, [
+        ('/label', {'texts': ['Fish Oil Softgels', 1]}),
+        ('/label', {'texts': ['Kids Gummies']}),
+        ('/standardize', {'values': [1]}),
+        ('/standardize', {'value': 'capsules'}),
+    ])
+    assert bad_label[0] == 400 and 'texts[1]' in bad_label[1]['error']
+    assert bad_standardize[0] == 400 and 'values[0]' in bad_standardize[1]['error']
+    assert good_label[0] == 200 and good_label[1]['results'][0]['pack_form'] == 'Gummy'
+    assert good_standardize == (200, {'result': {'value': 'capsules', 'standardized': 'Capsule', 'changed': True}})
+    assert stats['errors'] == 2
+
+
+def test_nan_results_are_serialized_as_null(labeler):
+    service = LabelingService(labeler, reload_rules=False)
+    assert service.standardize_batch([float('nan')]) == [{'value': None, 'standardized': None, 'changed': False}]
+    assert service.label_batch([float('nan')])[0]['text'] is None
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""打标统计的蓄水池抽样和加权合并"""
+
+import pandas as pd
+import pytest
+
+from pack_form_stats import LabelStats
+
+
+def processed(start, rows):
+    """rows行均已标准化的打标结果，行号从start开始"""
+    return pd.DataFrame({
+        'Pack form': ['Capsule'] * rows,
+        'Product': [f'product {i}' for i in range(start, start + rows)],
+        'Standardization_Applied': True,
+        'Is_Originally_Empty': False,
+    }, index=pd.RangeIndex(start, start + rows))
+
+
+def test_examples_are_deterministic_for_a_seed():
+    def run(seed):
+        stats = LabelStats(seed=seed)
+        for start in range(0, 1000, 100):
+            stats.update(processed(start, 100))
+        return stats.report()
+
+    assert run(7) == run(7)
+    assert run(7)['standardization_examples'] != run(8)['standardization_examples']
+    assert len(run(7)['standardization_examples']) == 10
+
+
+def test_merge_weights_examples_by_standardized_rows():
+    # 900行和100行两部分合并，示例来自小部分的比例应接近10%
+    small = 0
+    trials = 500
+    for seed in range(trials):
+        large_part = LabelStats(seed=seed).update(processed(0, 900))
+        small_part = LabelStats(seed=seed + trials).update(processed(900, 100))
+        merged = LabelStats(seed=seed).merge(large_part).merge(small_part)
+        examples = merged.report()['standardization_examples']
+        assert len(examples) == 10
+        small += sum(example['row'] > 900 for example in examples)
+    assert small / (trials * 10) == pytest.approx(0.1, abs=0.02)
+
+
+def test_merged_counts_match_single_pass():
+    single = LabelStats().update(processed(0, 250))
+    merged = LabelStats()
+    for start, rows in ((0, 50), (50, 150), (200, 50)):
+        merged.merge(LabelStats.from_report(LabelStats().update(processed(start, rows)).report()))
+    expected = single.report()
+    actual = merged.report()
+    for key in ('total_rows', 'standardization_applied', 'originally_empty', 'successfully_filled',
+                'final_empty', 'pack_form_distribution'):
+        assert actual[key] == expected[key]
+    assert len(actual['standardization_examples']) == 10
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""多工作表打标：汇总表与跳过的工作表"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import generate_dataframe
+from pack_form_excel import write_excel_sheets
+from pack_form_labeler import _init_worker, label_sheet, label_workbook
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    """两个可打标的工作表（其中一个名为Summary）和一个缺少Product列的工作表"""
+    path = str(tmp_path / 'workbook.xlsx')
+    write_excel_sheets([
+        ('Amazon', generate_dataframe(300, seed=1)),
+        ('Notes', pd.DataFrame({'Pack form': ['tablets'], 'Comment': ['x']})),
+        ('Summary', generate_dataframe(200, seed=2)),
+    ], path)
+    return path
+
+
+def test_summary_and_skipped_sheets(labeler, workbook, tmp_path):
+    output_file = str(tmp_path / 'labeled.xlsx')
+    report = label_workbook(labeler, workbook, output_file)
+    assert report['sheets'] == ['Amazon', 'Summary']
+    assert report['skipped_sheets'] == {'Notes': ['Product']}
+    assert report['total_rows'] == 500
+
+    output = pd.read_excel(output_file, sheet_name=None)
+    # 汇总表排在最前，与已有工作表重名时加序号
+    assert list(output) == ['Summary 1', 'Amazon', 'Summary']
+    summary = output['Summary 1'].set_index('Sheet')
+    assert list(summary.index) == ['Amazon', 'Summary', 'Notes', 'Total']
+    for sheet_name in ('Amazon', 'Summary'):
+        expected, sheet_report = label_sheet(labeler, workbook, sheet_name)
+        assert list(output[sheet_name].columns) == list(expected.columns)
+        assert output[sheet_name]['Pack form'].fillna('').tolist() == expected['Pack form'].fillna('').tolist()
+        assert summary.loc[sheet_name, 'Total_Rows'] == sheet_report['total_rows']
+        assert summary.loc[sheet_name, 'Successfully_Filled'] == sheet_report['successfully_filled']
+    assert summary.loc['Total', 'Total_Rows'] == 500
+    assert summary.loc['Total', 'Final_Empty'] == report['final_empty']
+    assert pd.isna(summary.loc['Notes', 'Total_Rows'])
+    assert 'Product' in summary.loc['Notes', 'Note']
+    forms = [column for column in summary.columns if column in report['pack_form_distribution']]
+    assert forms and all(summary.loc['Total', form] == report['pack_form_distribution'][form] for form in forms)
+
+
+def test_parallel_sheets_match_serial(labeler, workbook, tmp_path):
+    serial = label_workbook(labeler, workbook, str(tmp_path / 'serial.xlsx'))
+    with ProcessPoolExecutor(max_workers=2, initializer=_init_worker, initargs=(labeler,)) as executor:
+        parallel = label_workbook(labeler, workbook, str(tmp_path / 'parallel.xlsx'), executor=executor)
+    assert parallel == serial
+    for sheet_name in ('Summary 1', 'Amazon', 'Summary'):
+        pd.testing.assert_frame_equal(pd.read_excel(tmp_path / 'parallel.xlsx', sheet_name=sheet_name),
+                                      pd.read_excel(tmp_path / 'serial.xlsx', sheet_name=sheet_name))
+
+
+def test_workbook_without_label_sheets(labeler, tmp_path):
+    path = str(tmp_path / 'notes.xlsx')
+    write_excel_sheets([('Notes', pd.DataFrame({'Comment': ['x']}))], path)
+    with pytest.raises(ValueError, match='没有包含必要列的工作表'):
+        label_workbook(labeler, path, str(tmp_path / 'labeled.xlsx'))